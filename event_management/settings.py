@@ -95,7 +95,8 @@ WSGI_APPLICATION = 'event_management.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # DATABASE_PATH points a process at another SQLite file, e.g. for stress tests
+        'NAME': os.environ.get('DATABASE_PATH') or BASE_DIR / 'db.sqlite3',
     }
 }
 
@@ -114,6 +115,59 @@ if 'test' in sys.argv:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache) when
+# running more than one process so the waiting room sees a single queue.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='eventhub'),
+    }
+}
+
+
+# Seconds the cached home page feed is served before being rebuilt
+HOME_FEED_CACHE_SECONDS = config('HOME_FEED_CACHE_SECONDS', default=60, cast=int)
+
+# Hours after which a ticket sale counts half as much towards trending events
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=24, cast=int)
+
+# Live check-in stream: seconds between cache checks, and before clients reconnect
+CHECKIN_STREAM_POLL_SECONDS = config('CHECKIN_STREAM_POLL_SECONDS', default=1, cast=float)
+CHECKIN_STREAM_MAX_SECONDS = config('CHECKIN_STREAM_MAX_SECONDS', default=300, cast=int)
+
+# Key gate devices use to verify scan manifests (defaults to SECRET_KEY)
+CHECKIN_MANIFEST_KEY = config('CHECKIN_MANIFEST_KEY', default='')
+
+# Ticket QR codes: image format ('png' or 'svg'), seconds kept in the shared
+# cache, and renders kept in each process
+QR_CODE_FORMAT = config('QR_CODE_FORMAT', default='png')
+QR_CACHE_SECONDS = config('QR_CACHE_SECONDS', default=30 * 24 * 60 * 60, cast=int)
+QR_MEMORY_CACHE_SIZE = config('QR_MEMORY_CACHE_SIZE', default=512, cast=int)
+
+# PDF tickets: render processes, and seconds a download waits for a render
+# before answering 202 and asking the browser to retry
+PDF_RENDER_WORKERS = config('PDF_RENDER_WORKERS', default=2, cast=int)
+PDF_RENDER_WAIT_SECONDS = config('PDF_RENDER_WAIT_SECONDS', default=2, cast=float)
+
+# Email outbox (send_outbox worker): attempts before giving up, and the
+# first and longest wait between retries in seconds
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_RETRY_SECONDS = config('OUTBOX_RETRY_SECONDS', default=60, cast=int)
+OUTBOX_MAX_RETRY_SECONDS = config('OUTBOX_MAX_RETRY_SECONDS', default=6 * 60 * 60, cast=int)
+
+# Event notifications (send_event_notifications worker): users handled per
+# chunk and SMTP connection, and the most emails sent per second (0: no limit)
+NOTIFICATION_CHUNK_SIZE = config('NOTIFICATION_CHUNK_SIZE', default=500, cast=int)
+NOTIFICATION_RATE_PER_SECOND = config('NOTIFICATION_RATE_PER_SECOND', default=100, cast=float)
+# Attempts per recipient before giving up, and the wait between passes
+# that retry failed sends, in seconds
+NOTIFICATION_MAX_ATTEMPTS = config('NOTIFICATION_MAX_ATTEMPTS', default=3, cast=int)
+NOTIFICATION_RETRY_SECONDS = config('NOTIFICATION_RETRY_SECONDS', default=15 * 60, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -216,6 +270,25 @@ LOGOUT_REDIRECT_URL = 'home'
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# Stripe API client: base URL (empty for Stripe, or a local fake server),
+# connect and read timeouts in seconds, retries of failed calls, and
+# connections kept open per process
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+STRIPE_CONNECT_TIMEOUT = config('STRIPE_CONNECT_TIMEOUT', default=5, cast=float)
+STRIPE_READ_TIMEOUT = config('STRIPE_READ_TIMEOUT', default=30, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config('STRIPE_MAX_NETWORK_RETRIES', default=2, cast=int)
+STRIPE_HTTP_POOL_SIZE = config('STRIPE_HTTP_POOL_SIZE', default=10, cast=int)
+# Minutes after which reconcile_stripe_payments checks an unsettled payment
+STRIPE_RECONCILE_AFTER_MINUTES = config('STRIPE_RECONCILE_AFTER_MINUTES', default=10, cast=int)
+
+# Waiting room: how long an admitted buyer may stay in checkout (seconds)
+WAITING_ROOM_ADMISSION_WINDOW = config('WAITING_ROOM_ADMISSION_WINDOW', default=600, cast=int)
+
+# How long unpaid online orders hold their tickets before being released
+RESERVATION_HOLD_MINUTES = config('RESERVATION_HOLD_MINUTES', default=30, cast=int)
+
+# How long a waitlist offer holds its tickets for the promoted waiter
+WAITLIST_OFFER_MINUTES = config('WAITLIST_OFFER_MINUTES', default=60, cast=int)
 
 # Email configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
@@ -224,4 +297,7 @@ EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
-DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@eventhub.com')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@eventhub.com')
+
+# Public address of the site, used for links in emails
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
\ No newline at end of file
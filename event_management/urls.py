@@ -8,7 +8,7 @@ from django.contrib.auth import views as auth_views
 from events.site_views import (
     home, event_list, event_detail, my_events, create_event, edit_event, 
     cancel_event, event_dashboard, approve_event, admin_event_list, 
-    manage_categories, check_in_attendee
+    manage_categories, check_in_attendee, waiting_room, waiting_room_status
 )
 from users.auth_views import login_view, logout_view, profile_view, register_view, update_profile, update_profile_picture, change_password
 from users.admin_views import manage_user_roles, request_role_upgrade
@@ -29,6 +29,8 @@ urlpatterns = [
     path('events/<int:event_id>/dashboard/', event_dashboard, name='event_dashboard'),
     path('events/<int:event_id>/check-in/', check_in_attendee, name='check_in_attendee'),
     path('events/<int:event_id>/approve/', approve_event, name='approve_event'),
+    path('events/<int:event_id>/queue/', waiting_room, name='waiting_room'),
+    path('events/<int:event_id>/queue/status/', waiting_room_status, name='waiting_room_status'),
     
     # Admin event management
     path('admin/events/', admin_event_list, name='admin_event_list'),
@@ -51,10 +53,14 @@ urlpatterns = [
     path('my-tickets/', ticket_views.my_tickets, name='my_tickets'),
     path('ticket/<uuid:ticket_id>/', ticket_views.ticket_detail, name='ticket_detail'),
     path('ticket/<uuid:ticket_id>/download/', ticket_views.download_ticket, name='download_ticket'),
+    path('ticket/order/<int:payment_id>/download/', ticket_views.download_order_tickets, name='download_order_tickets'),
+    path('ticket/export/<int:event_id>/', ticket_views.export_event_tickets, name='export_event_tickets'),
     path('ticket/<uuid:ticket_id>/transfer/', ticket_views.transfer_ticket, name='transfer_ticket'),
     path('ticket/check-in/<uuid:ticket_id>/', ticket_views.check_in_ticket, name='check_in_ticket'),
     path('ticket/scan/', ticket_views.scan_ticket, name='scan_ticket'),
     path('ticket/stats/<int:event_id>/', ticket_views.ticket_stats, name='ticket_stats'),
+    path('ticket/stats/<int:event_id>/stream/', ticket_views.check_in_stream, name='check_in_stream'),
+    path('ticket/manifest/<int:event_id>/', ticket_views.scan_manifest, name='scan_manifest'),
     
     # Password reset
     path('password_reset/', auth_views.PasswordResetView.as_view(), name='password_reset'),
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Event, EventCategory
+from .models import Event, EventCategory, EventNotification, EventSummary
 
 admin.site.register(Event)
-admin.site.register(EventCategory)
\ No newline at end of file
+admin.site.register(EventCategory)
+admin.site.register(EventNotification)
+admin.site.register(EventSummary)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class EventsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'events'
+    
+    def ready(self):
+        import events.signals
+        
+        post_migrate.connect(events.signals.repair_search_index, sender=self)
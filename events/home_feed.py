@@ -0,0 +1,77 @@
+# events/home_feed.py
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Event, EventCategory
+from .trending import get_trending_events
+
+CACHE_KEY = 'events:home_feed'
+LOCK_KEY = 'events:home_feed:refreshing'
+
+
+def get_refresh_interval():
+    """Seconds a cached home feed is served before it is rebuilt"""
+    return getattr(settings, 'HOME_FEED_CACHE_SECONDS', 60)
+
+
+def build_home_feed():
+    """
+    Run the home page queries and return the evaluated results
+    
+    Returns:
+        dict: featured_events, trending_events and categories as lists
+    """
+    today = timezone.now()
+    upcoming_date = today + timedelta(days=30)
+    
+    # Get upcoming published events (next 30 days)
+    featured_events = Event.objects.filter(
+        status='published',
+        start_date__gte=today,
+        start_date__lte=upcoming_date
+    ).select_related('category').order_by('start_date')[:6]
+    
+    # Get trending events (recent ticket sales, decayed by age)
+    trending_events = get_trending_events(limit=3, min_tickets=1)
+    
+    # Get categories for filtering
+    categories = EventCategory.objects.all()
+    
+    return {
+        'featured_events': list(featured_events),
+        'trending_events': list(trending_events),
+        'categories': list(categories),
+    }
+
+
+def get_home_feed():
+    """
+    Return the home page payload from the cache, rebuilding it when stale
+    
+    Entries outlive their refresh interval so that once it passes, one request
+    rebuilds the feed while concurrent requests keep serving the stale copy.
+    """
+    cached = cache.get(CACHE_KEY)
+    now = time.time()
+    
+    if cached is not None:
+        refresh_at, feed = cached
+        if now < refresh_at or not cache.add(LOCK_KEY, True, timeout=30):
+            return feed
+    
+    try:
+        feed = build_home_feed()
+        interval = get_refresh_interval()
+        cache.set(CACHE_KEY, (now + interval, feed), timeout=interval * 10)
+    finally:
+        cache.delete(LOCK_KEY)
+    
+    return feed
+
+
+def invalidate_home_feed():
+    """Drop the cached home feed so the next request rebuilds it"""
+    cache.delete(CACHE_KEY)
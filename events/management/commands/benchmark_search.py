@@ -0,0 +1,97 @@
+# events/management/commands/benchmark_search.py
+import random
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from events.models import Event
+from events.search import search_events
+
+WORDS = (
+    'music jazz rock festival conference python django workshop startup pitch '
+    'night market food wine tasting art gallery opening charity run marathon '
+    'yoga retreat comedy theatre film screening book launch poetry science '
+    'robotics hackathon networking career fair summit keynote panel live '
+    'acoustic orchestra symphony opera ballet dance salsa tango craft beer'
+).split()
+
+CITIES = (
+    'London', 'Paris', 'Berlin', 'Madrid', 'Lisbon', 'Dublin', 'Amsterdam',
+    'New York', 'Chicago', 'Toronto', 'Sydney', 'Tokyo', 'Nairobi', 'Lagos',
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains filtering with the full-text search index on generated events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000, help='Number of events to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+        parser.add_argument('--queries', nargs='*', default=['jazz', 'python workshop', 'wine tasting', 'hackathon lisbon'])
+
+    def _time(self, queryset, repeat):
+        """Best time to load a first page of results plus the total count, as the list views do"""
+        best = None
+        count = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.values_list('pk', flat=True)[:20])
+            count = queryset.count()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, count
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        total = options['events']
+        now = timezone.now()
+
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            organizer = User.objects.create_user(username='search-benchmark', password=None)
+
+            self.stdout.write(f"Generating {total} events...")
+            started = time.perf_counter()
+            # Pad the vocabulary with filler words so terms are spread like real text
+            filler = [f"{rng.choice(WORDS)[:3]}{n}" for n in range(5000)]
+            batch = []
+            for i in range(total):
+                batch.append(Event(
+                    title=' '.join(rng.choices(WORDS, k=3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=5) + rng.choices(filler, k=75)),
+                    organizer=organizer,
+                    location=rng.choice(CITIES),
+                    start_date=now + timedelta(days=i % 365),
+                    end_date=now + timedelta(days=i % 365, hours=2),
+                    status='published',
+                ))
+                if len(batch) == 1000:
+                    Event.objects.bulk_create(batch)
+                    batch = []
+            Event.objects.bulk_create(batch)
+            self.stdout.write(f"Inserted (and indexed) in {time.perf_counter() - started:.1f}s")
+
+            base = Event.objects.filter(status='published').order_by('start_date')
+            for query in options['queries']:
+                scan = base
+                for term in query.split():
+                    scan = scan.filter(
+                        Q(title__icontains=term) |
+                        Q(description__icontains=term) |
+                        Q(location__icontains=term)
+                    )
+                scan_time, scan_count = self._time(scan, options['repeat'])
+                index_time, index_count = self._time(search_events(base, query), options['repeat'])
+
+                self.stdout.write(
+                    f"'{query}': icontains {scan_time * 1000:.1f}ms ({scan_count} hits), "
+                    f"full-text {index_time * 1000:.1f}ms ({index_count} hits), "
+                    f"{scan_time / index_time:.1f}x"
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished, generated events rolled back."))
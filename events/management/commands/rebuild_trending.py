@@ -0,0 +1,14 @@
+# events/management/commands/rebuild_trending.py
+from django.core.management.base import BaseCommand
+from events.trending import rebuild_sales_rollup
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly ticket sales rollup used for trending events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Number of days of sales to rebuild')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding trending sales rollup...")
+        written = rebuild_sales_rollup(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt trending rollup, {written} hourly bucket(s) written."))
@@ -0,0 +1,26 @@
+# events/management/commands/send_event_notifications.py
+import time
+from django.core.management.base import BaseCommand
+from events.notifications import send_event_notifications
+
+class Command(BaseCommand):
+    help = 'Email ticket holders about cancelled events, in rate-limited chunks that resume after a restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='Users handled per chunk and SMTP connection')
+        parser.add_argument('--rate', type=float, default=None, help='Maximum emails per second (0 for no limit)')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and check for notifications every N seconds (0 runs once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            finished, sent = send_event_notifications(chunk_size=options['chunk_size'], rate=options['rate'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Finished {finished} notification(s), {sent} email(s) sent."
+            ))
+            
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+# events/management/commands/simulate_waiting_room.py
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from events.models import Event
+from events import waiting_room
+
+class Command(BaseCommand):
+    help = 'Load-test the waiting room by queueing many simulated buyers for an event'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('--buyers', type=int, default=5000, help='Number of simulated buyers')
+        parser.add_argument('--workers', type=int, default=32, help='Concurrent threads issuing tokens')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist")
+        
+        buyers = options['buyers']
+        now = time.time()
+        
+        self.stdout.write(f"Queueing {buyers} buyers for '{event.title}' at {event.admission_rate}/s...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            tokens = list(pool.map(lambda user_id: waiting_room.issue_token(event, user_id, now=now), range(buyers)))
+        issue_time = time.perf_counter() - started
+        
+        # Every status poll only checks the token, measure how cheap that is
+        started = time.perf_counter()
+        per_second = Counter()
+        for token in tokens:
+            waiting_room.get_status(token, event.id, now=now)
+            per_second[waiting_room.read_token(token, event.id)['s']] += 1
+        poll_time = time.perf_counter() - started
+        
+        busiest = max(per_second.values())
+        self.stdout.write(f"Issued {buyers} tokens in {issue_time:.2f}s ({buyers / issue_time:.0f}/s)")
+        self.stdout.write(f"Polled {buyers} statuses in {poll_time:.2f}s ({buyers / poll_time:.0f}/s)")
+        self.stdout.write(f"Admission spread over {len(per_second)}s, busiest second admits {busiest}")
+        
+        if busiest > max(event.admission_rate, 1):
+            raise CommandError("Admission rate exceeded")
+        self.stdout.write(self.style.SUCCESS("Admission rate respected."))
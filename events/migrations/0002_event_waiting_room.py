@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='admission_rate',
+            field=models.PositiveIntegerField(default=10, help_text='Buyers admitted to checkout per second when high demand'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='is_high_demand',
+            field=models.BooleanField(default=False, help_text='Send buyers through the waiting room before checkout'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_waiting_room'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSalesHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_index', models.PositiveIntegerField()),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_hours', to='events.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour_index', 'event'], name='event_sales_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'hour_index'), name='unique_event_sales_hour')],
+            },
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The SQL is spelled out here rather than imported from events.search, so
+# this migration keeps doing what it did when it was written
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_event_fts USING fts5(
+        title, description, location,
+        content='events_event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    "INSERT INTO events_event_fts(events_event_fts, rank) VALUES('rank', 'bm25(10.0, 1.0, 5.0)')",
+    """
+    CREATE TRIGGER IF NOT EXISTS events_event_fts_insert AFTER INSERT ON events_event BEGIN
+        INSERT INTO events_event_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_event_fts_delete AFTER DELETE ON events_event BEGIN
+        INSERT INTO events_event_fts(events_event_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_event_fts_update
+    AFTER UPDATE OF title, description, location ON events_event BEGIN
+        INSERT INTO events_event_fts(events_event_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO events_event_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+    # Index the events that existed before the triggers did
+    "INSERT INTO events_event_fts(events_event_fts) VALUES('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS events_event_fts_insert",
+    "DROP TRIGGER IF EXISTS events_event_fts_delete",
+    "DROP TRIGGER IF EXISTS events_event_fts_update",
+    "DROP TABLE IF EXISTS events_event_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX IF NOT EXISTS events_event_search_idx ON events_event USING GIN (
+        to_tsvector('english', coalesce(events_event.title, '') || ' ' ||
+            coalesce(events_event.description, '') || ' ' || coalesce(events_event.location, ''))
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS events_event_location_search_idx ON events_event USING GIN (
+        to_tsvector('simple', coalesce(events_event.location, ''))
+    )
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS events_event_location_search_idx",
+    "DROP INDEX IF EXISTS events_event_search_idx",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_eventsaleshour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSearchDocument',
+            fields=[
+                ('event', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='events.event')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('location', models.TextField()),
+                ('document', models.TextField(db_column='events_event_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'events_event_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q, Sum
+
+BATCH_SIZE = 500
+
+
+def build_event_summaries(apps, schema_editor):
+    # Same figures as events.summary.build_summaries(), on the historical models
+    Event = apps.get_model('events', 'Event')
+    EventSummary = apps.get_model('events', 'EventSummary')
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketType = apps.get_model('tickets', 'TicketType')
+
+    last_id = 0
+    while True:
+        events = list(
+            Event.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'max_attendees')[:BATCH_SIZE]
+        )
+        if not events:
+            break
+        last_id = events[-1][0]
+        event_ids = [pk for pk, _ in events]
+
+        ticket_counts = {
+            row['event_id']: row
+            for row in Ticket.objects.filter(event_id__in=event_ids).order_by().values('event_id').annotate(
+                sold=Count('pk', filter=Q(status__in=('pending', 'confirmed', 'used'))),
+                confirmed=Count('pk', filter=Q(status__in=('confirmed', 'used'))),
+                checked_in=Count('pk', filter=Q(checked_in=True)),
+            )
+        }
+        type_figures = {
+            row['event_id']: row
+            for row in TicketType.objects.filter(event_id__in=event_ids).order_by().values('event_id').annotate(
+                min_price=Min('price'),
+                max_price=Max('price'),
+                quantity=Sum('quantity_available'),
+                unlimited=Count('pk', filter=Q(quantity_available=0)),
+            )
+        }
+
+        summaries = []
+        for event_id, max_attendees in events:
+            counts = ticket_counts.get(event_id, {})
+            types = type_figures.get(event_id, {})
+            sold = counts.get('sold', 0)
+            limits = [max_attendees] if max_attendees else []
+            if types and not types['unlimited']:
+                limits.append(types['quantity'])
+            remaining = max(min(limits) - sold, 0) if limits else None
+            summaries.append(EventSummary(
+                event_id=event_id,
+                sold=sold,
+                confirmed=counts.get('confirmed', 0),
+                checked_in=counts.get('checked_in', 0),
+                min_price=types.get('min_price'),
+                max_price=types.get('max_price'),
+                remaining=remaining,
+                sold_out=remaining == 0,
+            ))
+        EventSummary.objects.bulk_create(summaries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_eventnotification'),
+        ('tickets', '0007_alter_ticket_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSummary',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='events.event')),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('confirmed', models.PositiveIntegerField(default=0)),
+                ('checked_in', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('remaining', models.PositiveIntegerField(blank=True, null=True)),
+                ('sold_out', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_event_summaries, migrations.RunPython.noop),
+    ]
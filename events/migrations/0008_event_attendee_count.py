@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_attendees(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Ticket = apps.get_model('tickets', 'Ticket')
+
+    active_tickets = Ticket.objects.filter(
+        event=OuterRef('pk'),
+        status__in=('pending', 'confirmed', 'used')
+    ).order_by().values('event').annotate(total=Count('pk')).values('total')
+    Event.objects.update(attendee_count=Coalesce(Subquery(active_tickets), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_eventsummary'),
+        ('tickets', '0007_alter_ticket_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='attendee_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_attendees, migrations.RunPython.noop),
+    ]
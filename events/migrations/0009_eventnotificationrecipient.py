@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_recipients(apps, schema_editor):
+    # Unfinished notifications keep the holders they would have reached:
+    # tickets of the event cancelled since the notification was queued
+    EventNotification = apps.get_model('events', 'EventNotification')
+    EventNotificationRecipient = apps.get_model('events', 'EventNotificationRecipient')
+    Ticket = apps.get_model('tickets', 'Ticket')
+
+    for notification in EventNotification.objects.exclude(status='done'):
+        user_ids = Ticket.objects.filter(
+            event_id=notification.event_id,
+            status='cancelled',
+            updated_at__gte=notification.created_at
+        ).exclude(user__email='').order_by('user_id').values_list('user_id', flat=True).distinct()
+        EventNotificationRecipient.objects.bulk_create(
+            [EventNotificationRecipient(notification=notification, user_id=user_id) for user_id in user_ids]
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_attendee_count'),
+        ('tickets', '0007_alter_ticket_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventNotificationRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='events.eventnotification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['notification', 'status', 'user'], name='notification_recipient_idx')],
+                'constraints': [models.UniqueConstraint(fields=('notification', 'user'), name='unique_notification_recipient')],
+            },
+        ),
+        migrations.RunPython(record_recipients, migrations.RunPython.noop),
+    ]
@@ -32,11 +32,178 @@ class Event(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     max_attendees = models.PositiveIntegerField(default=0)  # 0 means unlimited
+    attendee_count = models.PositiveIntegerField(default=0, editable=False)  # Non-cancelled tickets, see tickets.inventory
     banner_image = models.ImageField(upload_to='event_banners', blank=True)
+    is_high_demand = models.BooleanField(default=False, help_text="Send buyers through the waiting room before checkout")
+    admission_rate = models.PositiveIntegerField(default=10, help_text="Buyers admitted to checkout per second when high demand")
     
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        # attendee_count is only moved by conditional UPDATEs in
+        # tickets.inventory; never write back a stale in-memory value
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'attendee_count'
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def is_past_event(self):
-        return self.end_date < timezone.now()
\ No newline at end of file
+        return self.end_date < timezone.now()
+    
+    @property
+    def places_remaining(self):
+        """Places left under max_attendees, or None when the event is unlimited"""
+        if self.max_attendees == 0:
+            return None
+        return max(self.max_attendees - self.attendee_count, 0)
+    
+    class Meta:
+        indexes = [
+            # Public listings: published events ordered by start date
+            models.Index(fields=['status', 'start_date'], name='event_status_start_idx'),
+        ]
+
+class EventSalesHour(models.Model):
+    """Hourly rollup of confirmed ticket sales, used for trending scores"""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='sales_hours')
+    hour_index = models.PositiveIntegerField()  # Hours since the Unix epoch
+    tickets_sold = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.event.title} @ hour {self.hour_index}: {self.tickets_sold}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'hour_index'], name='unique_event_sales_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour_index', 'event'], name='event_sales_hour_idx'),
+        ]
+
+class EventSearchDocument(models.Model):
+    """
+    Row of the SQLite FTS5 index over events, see events/search.py
+
+    The table is created by migration and kept in sync by triggers, so it is
+    never written through the ORM. It does not exist on other databases.
+    """
+    event = models.OneToOneField(
+        Event, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_document'
+    )
+    title = models.TextField()
+    description = models.TextField()
+    location = models.TextField()
+    # FTS5 hidden columns: the table-named column takes MATCH queries and
+    # rank holds the bm25 score of the match (lower is better)
+    document = models.TextField(db_column='events_event_fts')
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'events_event_fts'
+
+class EventNotification(models.Model):
+    """
+    A message to every affected ticket holder of an event, see events/notifications.py
+
+    The worker sends it to its recipients in chunks ordered by user id and
+    records its progress here after each chunk, so an interrupted run
+    resumes where it stopped.
+    """
+    KIND_CHOICES = (
+        ('cancelled', 'Event Cancelled'),
+    )
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('done', 'Done'),
+    )
+    
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Highest user id already handled
+    last_user_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # A worker holds the notification until then
+    locked_until = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} notice for {self.event.title} ({self.status})"
+
+class EventNotificationRecipient(models.Model):
+    """
+    A user an EventNotification must reach, recorded when it is queued
+
+    Sends that fail stay pending and are retried on a later pass until
+    they have failed NOTIFICATION_MAX_ATTEMPTS times.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    notification = models.ForeignKey(EventNotification, on_delete=models.CASCADE, related_name='recipients')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_notifications')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user.username} for notification {self.notification_id} ({self.status})"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'user'], name='unique_notification_recipient'),
+        ]
+        indexes = [
+            # Recipients still to be emailed, in user id order
+            models.Index(fields=['notification', 'status', 'user'], name='notification_recipient_idx'),
+        ]
+
+class EventSummary(models.Model):
+    """
+    Ticket figures of an event for listing cards and detail pages, see events/summary.py
+
+    Moved by the purchase, payment and check-in paths as they change
+    tickets, so pages read one row instead of counting tickets.
+    """
+    event = models.OneToOneField(Event, primary_key=True, on_delete=models.CASCADE, related_name='summary')
+    # Tickets holding a place: pending, confirmed or used
+    sold = models.PositiveIntegerField(default=0)
+    # Paid tickets: confirmed or used
+    confirmed = models.PositiveIntegerField(default=0)
+    checked_in = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Places left, null when the event is unlimited
+    remaining = models.PositiveIntegerField(null=True, blank=True)
+    sold_out = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Summary of {self.event.title}: {self.sold} sold"
+    
+    @property
+    def capacity(self):
+        """Total places, or None when unlimited"""
+        if self.remaining is None:
+            return None
+        return self.sold + self.remaining
+    
+    @property
+    def capacity_percentage(self):
+        capacity = self.capacity
+        if not capacity:
+            return 0
+        return min(int(self.sold / capacity * 100), 100)
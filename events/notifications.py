@@ -0,0 +1,236 @@
+# events/notifications.py
+#
+# Fan-out of event-wide notices (e.g. a cancellation) to ticket holders.
+# Cancelling only records an EventNotification and its recipients; the
+# send_event_notifications worker walks the recipients in user id order,
+# one chunk at a time, with one SMTP connection per chunk and a cap on
+# emails per second. Progress is saved after every chunk so a restarted
+# worker picks up where it stopped, and failed sends are retried on a
+# later pass.
+import time
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+import logging
+
+from .models import EventNotification, EventNotificationRecipient
+from tickets.models import Ticket
+
+logger = logging.getLogger(__name__)
+
+# How long a worker holds a notification between progress updates
+LEASE_SECONDS = 5 * 60
+
+# Recipient rows read and inserted per batch when a notice is queued
+RECIPIENT_BATCH_SIZE = 1000
+
+TEMPLATES = {
+    'cancelled': 'events/emails/event_cancelled',
+}
+
+
+def queue_cancellation_notice(event):
+    """
+    Record that the holders of an event's tickets must be told it was cancelled
+
+    Call it right before releasing the tickets, in the same transaction:
+    the users holding live tickets at that point are stored as the
+    recipients, one row per user however many tickets they held. The
+    user ids are streamed and inserted in batches, so a large event never
+    builds the whole list in memory.
+
+    Args:
+        event: The cancelled Event
+
+    Returns:
+        The EventNotification object
+    """
+    notification = EventNotification.objects.create(event=event, kind='cancelled')
+    user_ids = (
+        Ticket.objects.filter(event=event).exclude(status='cancelled').exclude(user__email='')
+        .order_by('user_id').values_list('user_id', flat=True).distinct()
+        .iterator(chunk_size=RECIPIENT_BATCH_SIZE)
+    )
+    while True:
+        batch = list(islice(user_ids, RECIPIENT_BATCH_SIZE))
+        if not batch:
+            break
+        EventNotificationRecipient.objects.bulk_create(
+            [EventNotificationRecipient(notification=notification, user_id=user_id) for user_id in batch],
+            batch_size=RECIPIENT_BATCH_SIZE
+        )
+    return notification
+
+
+def get_recipients(notification):
+    """Recipients still to be emailed, ordered by user id"""
+    return notification.recipients.filter(status='pending').order_by('user_id')
+
+
+def _render(notification):
+    event = notification.event
+    site_url = settings.SITE_URL.rstrip('/')
+    context = {
+        'event': event,
+        'site_url': site_url,
+        'events_url': f"{site_url}{reverse('event_list')}",
+    }
+    template = TEMPLATES[notification.kind]
+    subject = f"{event.title} has been cancelled"
+    return (
+        subject,
+        render_to_string(f"{template}.txt", context),
+        render_to_string(f"{template}.html", context),
+    )
+
+
+def _throttle(started, sent, rate):
+    # Sleep just enough to stay at or under rate emails per second
+    if rate:
+        delay = sent / rate - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def send_notification(notification, chunk_size=None, rate=None):
+    """
+    Send a notification to its remaining recipients
+
+    Each recipient whose email fails stays pending until it has failed
+    NOTIFICATION_MAX_ATTEMPTS times; the notification is then handed back
+    for another pass after NOTIFICATION_RETRY_SECONDS.
+
+    Args:
+        notification: A claimed EventNotification
+        chunk_size: Users handled per chunk and SMTP connection (NOTIFICATION_CHUNK_SIZE by default)
+        rate: Maximum emails per second (NOTIFICATION_RATE_PER_SECOND by default, 0 for no limit)
+
+    Returns:
+        tuple: (emails sent by this call, True if nothing is left to retry)
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'NOTIFICATION_CHUNK_SIZE', 500)
+    if rate is None:
+        rate = getattr(settings, 'NOTIFICATION_RATE_PER_SECOND', 100)
+    max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 3)
+
+    recipients = get_recipients(notification)
+    started = time.monotonic()
+    total_sent = 0
+
+    while True:
+        chunk = list(
+            recipients.filter(user_id__gt=notification.last_user_id)
+            .values_list('pk', 'user_id', 'user__email')[:chunk_size]
+        )
+        if not chunk:
+            break
+
+        # The message is the same for every holder; render it once per chunk
+        subject, text, html = _render(notification)
+
+        sent_ids = []
+        failed_ids = []
+        last_error = ''
+        with get_connection() as connection:
+            for pk, _, email in chunk:
+                message = EmailMultiAlternatives(
+                    subject=subject,
+                    body=text,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[email],
+                    connection=connection,
+                )
+                message.attach_alternative(html, 'text/html')
+                try:
+                    connection.send_messages([message])
+                    sent_ids.append(pk)
+                except Exception as e:
+                    failed_ids.append(pk)
+                    last_error = str(e)[:2000]
+                    logger.warning(f"Notification {notification.pk} to {email} failed: {e}")
+                _throttle(started, total_sent + len(sent_ids) + len(failed_ids), rate)
+
+        EventNotificationRecipient.objects.filter(pk__in=sent_ids).update(
+            status='sent', attempts=F('attempts') + 1
+        )
+        EventNotificationRecipient.objects.filter(pk__in=failed_ids).update(attempts=F('attempts') + 1)
+        EventNotificationRecipient.objects.filter(pk__in=failed_ids, attempts__gte=max_attempts).update(
+            status='failed'
+        )
+
+        notification.last_user_id = chunk[-1][1]
+        total_sent += len(sent_ids)
+        EventNotification.objects.filter(pk=notification.pk).update(
+            last_user_id=notification.last_user_id,
+            sent_count=F('sent_count') + len(sent_ids),
+            failed_count=F('failed_count') + len(failed_ids),
+            last_error=last_error or F('last_error'),
+            locked_until=timezone.now() + timedelta(seconds=LEASE_SECONDS),
+        )
+
+    if recipients.exists():
+        # Failed sends left to retry: start over from the first of them later
+        retry_seconds = getattr(settings, 'NOTIFICATION_RETRY_SECONDS', 15 * 60)
+        EventNotification.objects.filter(pk=notification.pk).update(
+            status='pending', last_user_id=0, locked_until=timezone.now() + timedelta(seconds=retry_seconds)
+        )
+        return total_sent, False
+
+    EventNotification.objects.filter(pk=notification.pk).update(
+        status='done', locked_until=None, finished_at=timezone.now()
+    )
+    return total_sent, True
+
+
+def send_event_notifications(chunk_size=None, rate=None):
+    """
+    Send every notification that is due, claiming each one first
+
+    A notification whose worker died is claimed again once its lease has
+    run out and resumes after the last completed chunk; one with failed
+    sends to retry is claimed again once its retry delay has passed.
+
+    Args:
+        chunk_size: Users handled per chunk and SMTP connection (NOTIFICATION_CHUNK_SIZE by default)
+        rate: Maximum emails per second (NOTIFICATION_RATE_PER_SECOND by default, 0 for no limit)
+
+    Returns:
+        tuple: (notifications finished, emails sent)
+    """
+    finished = total_sent = 0
+
+    while True:
+        now = timezone.now()
+        available = EventNotification.objects.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            status__in=('pending', 'sending')
+        )
+        notification = available.order_by('created_at').first()
+        if notification is None:
+            break
+
+        # Another worker may have claimed it in the meantime
+        if not available.filter(pk=notification.pk).update(
+            status='sending', locked_until=now + timedelta(seconds=LEASE_SECONDS)
+        ):
+            continue
+
+        notification.refresh_from_db()
+        try:
+            sent, done = send_notification(notification, chunk_size=chunk_size, rate=rate)
+        except Exception as e:
+            # e.g. the mail server is down; keep the progress and retry later
+            logger.error(f"Notification {notification.pk} interrupted: {e}")
+            EventNotification.objects.filter(pk=notification.pk).update(last_error=str(e)[:2000])
+            break
+        total_sent += sent
+        if done:
+            finished += 1
+
+    return finished, total_sent
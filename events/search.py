@@ -0,0 +1,229 @@
+# events/search.py
+#
+# Full-text search over events. On SQLite the events_event_fts FTS5 table
+# (kept in sync with events_event by triggers) is joined in through
+# EventSearchDocument; on PostgreSQL the GIN-indexed tsvector expressions from
+# the same migration are used. Other backends fall back to icontains filters.
+import re
+from django.db import connection as default_connection
+from django.db.models import F, FloatField, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import EventSearchDocument
+
+FTS_TABLE = 'events_event_fts'
+
+# Fields covered by the index, and the ones a location search is limited to
+DOCUMENT_FIELDS = ('title', 'description', 'location')
+LOCATION_FIELDS = ('location',)
+
+# SQLite rebuilds a table when altering it, which drops its triggers, so
+# these are re-applied after every migrate (see EventsConfig.ready)
+SQLITE_TABLE = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    title, description, location,
+    content='events_event', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+# Column weights for bm25(): title, description, location
+SQLITE_RANK = "INSERT INTO %s(%s, rank) VALUES('rank', 'bm25(10.0, 1.0, 5.0)')" % (FTS_TABLE, FTS_TABLE)
+
+SQLITE_TRIGGERS = {
+    'events_event_fts_insert': f"""
+    CREATE TRIGGER events_event_fts_insert AFTER INSERT ON events_event BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+    'events_event_fts_delete': f"""
+    CREATE TRIGGER events_event_fts_delete AFTER DELETE ON events_event BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END
+    """,
+    'events_event_fts_update': f"""
+    CREATE TRIGGER events_event_fts_update
+    AFTER UPDATE OF title, description, location ON events_event BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END
+    """,
+}
+
+SQLITE_REVERSE = [
+    *(f"DROP TRIGGER IF EXISTS {name}" for name in SQLITE_TRIGGERS),
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+PG_DOCUMENT = (
+    "to_tsvector('english', coalesce(events_event.title, '') || ' ' || "
+    "coalesce(events_event.description, '') || ' ' || coalesce(events_event.location, ''))"
+)
+PG_LOCATION = "to_tsvector('simple', coalesce(events_event.location, ''))"
+
+
+@EventSearchDocument._meta.get_field('document').register_lookup
+class Match(Lookup):
+    """document__match=<fts5 query> compiles to the FTS5 MATCH operator"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+def get_terms(query):
+    """Split a user query into lower-cased word terms"""
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def _fts5_query(terms, fields):
+    # Every term must match, as a prefix, in one of the given columns
+    expression = ' AND '.join(f'"{term}"*' for term in terms)
+    if fields == DOCUMENT_FIELDS:
+        return expression
+    return '{%s} : (%s)' % (' '.join(fields), expression)
+
+
+def _tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _pg_parts(fields):
+    if fields == LOCATION_FIELDS:
+        return PG_LOCATION, 'simple'
+    return PG_DOCUMENT, 'english'
+
+
+def search_filter(query, fields=DOCUMENT_FIELDS):
+    """
+    Build a filter matching events whose indexed text contains every term
+
+    Args:
+        query: The raw search string
+        fields: DOCUMENT_FIELDS, or LOCATION_FIELDS for location-only search
+
+    Returns:
+        Q: Filter for an Event queryset (matches nothing for an empty query)
+    """
+    terms = get_terms(query)
+    if not terms:
+        return Q(pk__in=[])
+
+    if default_connection.vendor == 'sqlite':
+        return Q(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [_fts5_query(terms, fields)]
+        ))
+
+    if default_connection.vendor == 'postgresql':
+        document, config = _pg_parts(fields)
+        return Q(pk__in=RawSQL(
+            f"SELECT events_event.id FROM events_event "
+            f"WHERE {document} @@ to_tsquery('{config}', %s)",
+            [_tsquery(terms)]
+        ))
+
+    condition = Q()
+    for term in terms:
+        term_match = Q()
+        for field in fields:
+            term_match |= Q(**{f'{field}__icontains': term})
+        condition &= term_match
+    return condition
+
+
+def _rank_expression(terms, fields):
+    if default_connection.vendor == 'postgresql':
+        document, config = _pg_parts(fields)
+        return RawSQL(
+            f"ts_rank({document}, to_tsquery('{config}', %s))",
+            [_tsquery(terms)],
+            output_field=FloatField()
+        )
+
+    return Value(0.0, output_field=FloatField())
+
+
+def search_events(queryset, query, fields=DOCUMENT_FIELDS, rank=True):
+    """
+    Filter an Event queryset by a full-text query
+
+    Args:
+        queryset: Event queryset to search within
+        query: The raw search string
+        fields: DOCUMENT_FIELDS, or LOCATION_FIELDS for location-only search
+        rank: Annotate search_rank and order best matches first, keeping the
+              queryset's existing ordering as the tie-breaker
+
+    Returns:
+        QuerySet: The matching events
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+
+    if default_connection.vendor == 'sqlite':
+        # Join the FTS table so the match runs once and rank is read per row
+        queryset = queryset.filter(search_document__document__match=_fts5_query(terms, fields))
+        rank_expression = -F('search_document__rank')
+    else:
+        queryset = queryset.filter(search_filter(query, fields))
+        rank_expression = _rank_expression(terms, fields)
+
+    if rank:
+        queryset = queryset.annotate(
+            search_rank=rank_expression
+        ).order_by(F('search_rank').desc(nulls_last=True), *ordering)
+
+    return queryset
+
+
+def rebuild_search_index(connection=None):
+    """Repopulate the SQLite FTS table from events_event (no-op elsewhere)"""
+    connection = connection or default_connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+
+
+def ensure_search_index(connection=None):
+    """
+    Create the SQLite FTS table and its sync triggers if any are missing
+
+    The index is rebuilt whenever something had to be recreated, since
+    writes made while a trigger was missing never reached it.
+
+    Returns:
+        bool: True if the index had to be repaired
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'sqlite':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        if 'events_event' not in existing:
+            return False
+
+        statements = [] if FTS_TABLE in existing else [SQLITE_TABLE, SQLITE_RANK]
+        statements += [sql for name, sql in SQLITE_TRIGGERS.items() if name not in existing]
+
+        for statement in statements:
+            cursor.execute(statement)
+
+    if statements:
+        rebuild_search_index(connection)
+    return bool(statements)
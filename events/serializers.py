@@ -17,6 +17,6 @@ class EventSerializer(serializers.ModelSerializer):
             'id', 'title', 'description', 'category', 'category_name',
             'organizer', 'organizer_username', 'location', 'start_date', 
             'end_date', 'created_at', 'updated_at', 'status', 
-            'max_attendees', 'banner_image'
+            'max_attendees', 'banner_image', 'is_high_demand', 'admission_rate'
         ]
         read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
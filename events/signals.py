@@ -0,0 +1,31 @@
+# events/signals.py
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Event, EventCategory, EventSummary
+from .home_feed import invalidate_home_feed
+from .search import ensure_search_index
+from .summary import refresh_event_limits
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventCategory)
+@receiver(post_delete, sender=EventCategory)
+def refresh_home_feed(sender, **kwargs):
+    """Rebuild the cached home page when events or categories change"""
+    invalidate_home_feed()
+
+@receiver(post_save, sender=Event)
+def refresh_event_summary(sender, instance, created, **kwargs):
+    """Create the summary of a new event, or update its places when the capacity may have changed"""
+    if created:
+        # No ticket types or tickets yet
+        EventSummary.objects.create(event=instance, remaining=instance.max_attendees or None)
+    else:
+        refresh_event_limits([instance.id])
+
+
+def repair_search_index(sender, using='default', **kwargs):
+    """Re-create SQLite search triggers dropped by table rebuilds during migrate"""
+    ensure_search_index(connections[using])
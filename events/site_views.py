@@ -1,55 +1,41 @@
 # events/site_views.py
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q, Count
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponseForbidden
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from .models import Event, EventCategory
 from .forms import EventForm
-from tickets.models import TicketType, Ticket
+from . import waiting_room as queue
+from .home_feed import get_home_feed
+from .notifications import queue_cancellation_notice
+from .search import LOCATION_FIELDS, search_events, search_filter
+from tickets.models import TicketType, Ticket, WaitlistEntry
+from tickets.checkin import check_in_ticket_code
+from tickets.inventory import release_tickets
+from tickets.stats import get_event_ticket_stats, get_recent_attendees
+from tickets.waitlist import LIVE_STATUSES, get_available
 from payments.models import Payment
 
 def home(request):
     """
     View for the home page showing featured events
     """
-    # Get upcoming published events (next 30 days)
-    today = timezone.now()
-    upcoming_date = today + timezone.timedelta(days=30)
-    
-    featured_events = Event.objects.filter(
-        status='published',
-        start_date__gte=today,
-        start_date__lte=upcoming_date
-    ).order_by('start_date')[:6]
-    
-    # Get trending events (most tickets sold in last 7 days)
-    trending_events = Event.objects.filter(
-        status='published',
-        start_date__gte=today
-    ).annotate(
-        ticket_count=Count('ticket_types__tickets')
-    ).order_by('-ticket_count')[:3]
-    
-    # Get categories for filtering
-    categories = EventCategory.objects.all()
-    
-    return render(request, 'home.html', {
-        'featured_events': featured_events,
-        'trending_events': trending_events,
-        'categories': categories,
-    })
+    # Featured, trending and categories are served from a periodically rebuilt cache entry
+    return render(request, 'home.html', get_home_feed())
 
 def event_list(request):
     """
     View for listing all events with filters
     """
     # Base queryset
-    events = Event.objects.filter(status='published').order_by('start_date')
+    events = Event.objects.filter(status='published').select_related('category', 'summary').order_by('start_date')
     
     # Apply filters if provided
     category_id = request.GET.get('category')
@@ -61,11 +47,8 @@ def event_list(request):
         events = events.filter(category_id=category_id)
     
     if search_query:
-        events = events.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(location__icontains=search_query)
-        )
+        # Full-text index lookup, best matches first
+        events = search_events(events, search_query)
     
     if date_filter:
         today = timezone.now()
@@ -101,7 +84,7 @@ def event_list(request):
             )
     
     if location_filter:
-        events = events.filter(location__icontains=location_filter)
+        events = search_events(events, location_filter, fields=LOCATION_FIELDS, rank=False)
     
     # Pagination
     paginator = Paginator(events, 9)  # 9 events per page
@@ -124,14 +107,17 @@ def event_detail(request, event_id):
     """
     View for showing event details and available tickets
     """
-    event = get_object_or_404(Event, id=event_id)
+    event = get_object_or_404(Event.objects.select_related('summary'), id=event_id)
     
     # If event is a draft, only allow organizer to view it
     if event.status == 'draft' and (not request.user.is_authenticated or request.user != event.organizer):
         messages.error(request, "This event is not yet published.")
         return redirect('event_list')
     
-    ticket_types = TicketType.objects.filter(event=event)
+    ticket_types = list(event.ticket_types.all())
+    for ticket_type in ticket_types:
+        # Limited by the type's stock and the event's places alike
+        ticket_type.tickets_left = get_available(ticket_type)
     
     # Check if the user is the organizer
     is_organizer = request.user.is_authenticated and request.user == event.organizer
@@ -143,20 +129,25 @@ def event_detail(request, event_id):
     if request.user.is_authenticated:
         user_tickets = Ticket.objects.filter(
             user=request.user,
-            ticket_type__event=event
+            event=event
         ).select_related('ticket_type')
         
         has_tickets = user_tickets.exists()
+        
+        # Show the user's place on the waitlist of sold-out ticket types
+        waitlist_entries = {
+            entry.ticket_type_id: entry
+            for entry in WaitlistEntry.objects.filter(
+                user=request.user,
+                ticket_type__event=event,
+                status__in=LIVE_STATUSES
+            )
+        }
+        for ticket_type in ticket_types:
+            ticket_type.waitlist_entry = waitlist_entries.get(ticket_type.id)
     
-    # Calculate the percentage of capacity filled
-    if event.max_attendees > 0:
-        attendee_count = Ticket.objects.filter(
-            ticket_type__event=event, 
-            status__in=['confirmed', 'used']
-        ).count()
-        capacity_percentage = min(int((attendee_count / event.max_attendees) * 100), 100)
-    else:
-        capacity_percentage = 0
+    # Ticket figures come from the summary row instead of counting tickets
+    summary = getattr(event, 'summary', None)
     
     # Get similar events
     similar_events = Event.objects.filter(
@@ -171,10 +162,49 @@ def event_detail(request, event_id):
         'is_organizer': is_organizer,
         'has_tickets': has_tickets,
         'user_tickets': user_tickets,
-        'capacity_percentage': capacity_percentage,
+        'summary': summary,
         'similar_events': similar_events,
     })
 
+@login_required
+def waiting_room(request, event_id):
+    """
+    Waiting room for high-demand events; joins the queue on first visit
+    """
+    event = get_object_or_404(Event, id=event_id, status='published')
+    
+    if not event.is_high_demand:
+        return redirect('event_detail', event_id=event.id)
+    
+    token = queue.get_session_token(request, event.id)
+    status = queue.get_status(token, event.id, user_id=request.user.id)
+    
+    # Issue a fresh place in the queue if there is no usable token
+    if status['status'] in ('invalid', 'expired'):
+        try:
+            token = queue.issue_token(event, request.user.id)
+        except queue.WaitingRoomUnavailable:
+            messages.error(request, "The waiting room is unavailable right now. Please try again in a moment.")
+            return redirect('event_detail', event_id=event.id)
+        queue.store_session_token(request, event.id, token)
+        status = queue.get_status(token, event.id, user_id=request.user.id)
+    
+    return render(request, 'events/waiting_room.html', {
+        'event': event,
+        'queue_token': token,
+        'queue_status': status,
+    })
+
+def waiting_room_status(request, event_id):
+    """
+    Cheap polling endpoint for the waiting room (no database access)
+    """
+    status = queue.get_status(request.GET.get('token'), event_id)
+    response = JsonResponse(status)
+    if 'retry_after' in status:
+        response['Retry-After'] = status['retry_after']
+    return response
+
 @login_required
 def my_events(request):
     """
@@ -184,7 +214,7 @@ def my_events(request):
     filter_status = request.GET.get('status', 'all')
     
     # Base queryset
-    organized_events = Event.objects.filter(organizer=request.user)
+    organized_events = Event.objects.filter(organizer=request.user).select_related('summary')
     
     # Apply status filter if provided
     if filter_status and filter_status != 'all':
@@ -195,13 +225,13 @@ def my_events(request):
     
     # Get tickets purchased by the user
     tickets = Ticket.objects.filter(user=request.user).select_related(
-        'ticket_type__event'
-    ).order_by('ticket_type__event__start_date')
+        'ticket_type', 'event'
+    ).order_by('event__start_date')
     
     # Group tickets by event
     attended_events = {}
     for ticket in tickets:
-        event = ticket.ticket_type.event
+        event = ticket.event
         if event.id not in attended_events:
             attended_events[event.id] = {
                 'event': event,
@@ -418,20 +448,22 @@ def cancel_event(request, event_id):
         return redirect('event_detail', event_id=event.id)
     
     if request.method == 'POST':
-        # Update event status to cancelled
-        event.status = 'cancelled'
-        event.save()
-        
-        # Get all tickets for this event
-        tickets = Ticket.objects.filter(
-            ticket_type__event=event,
-            status__in=['pending', 'confirmed']
-        )
-        
-        # Update ticket status to cancelled
-        tickets.update(status='cancelled')
-        
-        # Notify users - in a real system, you would send emails here
+        with transaction.atomic():
+            # Update event status to cancelled
+            event.status = 'cancelled'
+            event.save()
+            
+            # Holders are emailed by the send_event_notifications worker
+            queue_cancellation_notice(event)
+            
+            # Get all tickets for this event
+            tickets = Ticket.objects.filter(
+                event=event,
+                status__in=['pending', 'confirmed']
+            )
+            
+            # Cancel the tickets and return their stock
+            release_tickets(tickets)
         
         messages.success(request, f"'{event.title}' has been cancelled.")
         return redirect('my_events')
@@ -450,15 +482,16 @@ def event_dashboard(request, event_id):
         messages.error(request, "You don't have permission to access this dashboard.")
         return redirect('event_detail', event_id=event.id)
     
-    # Get ticket sales data
-    ticket_types = TicketType.objects.filter(event=event)
+    # Ticket counts and revenue by status and type, in one grouped query
+    stats = get_event_ticket_stats(event)
+    ticket_types = stats['ticket_types']
+    totals = stats['totals']
     
-    # Statistics
-    total_tickets = Ticket.objects.filter(ticket_type__event=event).count()
-    confirmed_tickets = Ticket.objects.filter(ticket_type__event=event, status='confirmed').count()
-    pending_tickets = Ticket.objects.filter(ticket_type__event=event, status='pending').count()
-    cancelled_tickets = Ticket.objects.filter(ticket_type__event=event, status='cancelled').count()
-    used_tickets = Ticket.objects.filter(ticket_type__event=event, status='used').count()
+    total_tickets = totals['total']
+    confirmed_tickets = totals['confirmed']
+    pending_tickets = totals['pending']
+    cancelled_tickets = totals['cancelled']
+    used_tickets = totals['used']
     
     # Create data for pie chart
     ticket_status_data = {
@@ -468,23 +501,19 @@ def event_dashboard(request, event_id):
     }
     
     # Ticket sales by type
-    ticket_sales_by_type = []
-    for ticket_type in ticket_types:
-        sold = Ticket.objects.filter(ticket_type=ticket_type).count()
-        available = ticket_type.quantity_available - sold if ticket_type.quantity_available > 0 else 'Unlimited'
-        
-        ticket_sales_by_type.append({
+    ticket_sales_by_type = [
+        {
             'name': ticket_type.name,
             'price': ticket_type.price,
-            'sold': sold,
-            'available': available,
-            'revenue': sold * ticket_type.price
-        })
+            'sold': ticket_type.sold,
+            'available': ticket_type.available,
+            'revenue': ticket_type.revenue
+        }
+        for ticket_type in ticket_types
+    ]
     
     # Get recent attendees
-    recent_attendees = Ticket.objects.filter(
-        ticket_type__event=event
-    ).select_related('user').order_by('-purchase_date')[:10]
+    recent_attendees = get_recent_attendees(event)
     
     return render(request, 'events/event_dashboard.html', {
         'event': event,
@@ -496,6 +525,7 @@ def event_dashboard(request, event_id):
         'used_tickets': used_tickets,
         'ticket_status_data': ticket_status_data,
         'ticket_sales_by_type': ticket_sales_by_type,
+        'total_revenue': totals['revenue'],
         'recent_attendees': recent_attendees,
     })
 
@@ -513,44 +543,38 @@ def check_in_attendee(request, event_id):
     if request.method == 'POST':
         ticket_code = request.POST.get('ticket_code')
         
-        try:
-            # Look up ticket by code
-            ticket = Ticket.objects.get(
-                ticket_code=ticket_code,
-                ticket_type__event=event
-            )
-            
-            # Check if ticket is valid for check-in
-            if ticket.status == 'confirmed':
-                ticket.status = 'used'
-                ticket.checked_in = True
-                ticket.checked_in_time = timezone.now()
-                ticket.save()
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': f"Successfully checked in: {ticket.user.username}",
-                    'attendee_name': f"{ticket.user.first_name} {ticket.user.last_name}".strip() or ticket.user.username,
-                    'ticket_type': ticket.ticket_type.name
-                })
-            elif ticket.status == 'used':
-                return JsonResponse({
-                    'success': False,
-                    'message': "Ticket has already been used.",
-                    'attendee_name': f"{ticket.user.first_name} {ticket.user.last_name}".strip() or ticket.user.username,
-                    'ticket_type': ticket.ticket_type.name,
-                    'checked_in_time': ticket.checked_in_time.strftime("%Y-%m-%d %H:%M:%S")
-                })
-            else:
-                return JsonResponse({
-                    'success': False,
-                    'message': f"Invalid ticket status: {ticket.get_status_display()}"
-                })
-        except Ticket.DoesNotExist:
+        # Gate devices work from the scan manifest and sync their scans in
+        # batches; this is the manual path for codes they could not settle
+        result = check_in_ticket_code(ticket_code or '', event_id=event.id)
+        
+        if result['result'] in ('not_found', 'wrong_event'):
             return JsonResponse({
                 'success': False,
                 'message': "Invalid ticket code or ticket not for this event."
             })
+        
+        if result['result'] == 'checked_in':
+            return JsonResponse({
+                'success': True,
+                'message': f"Successfully checked in: {result['user']}",
+                'attendee_name': result['attendee'],
+                'ticket_type': result['ticket_type']
+            })
+        
+        if result['result'] == 'already_checked_in':
+            checked_in_time = datetime.fromisoformat(result['checked_in_time']) if result['checked_in_time'] else None
+            return JsonResponse({
+                'success': False,
+                'message': "Ticket has already been used.",
+                'attendee_name': result['attendee'],
+                'ticket_type': result['ticket_type'],
+                'checked_in_time': checked_in_time.strftime("%Y-%m-%d %H:%M:%S") if checked_in_time else None
+            })
+        
+        return JsonResponse({
+            'success': False,
+            'message': f"Invalid ticket status: {dict(Ticket.STATUS_CHOICES).get(result['status'], result['status'])}"
+        })
     
     return render(request, 'events/check_in.html', {
         'event': event,
@@ -708,7 +732,7 @@ def admin_event_list(request):
     category_filter = request.GET.get('category', '')
     search_query = request.GET.get('q', '')
     
-    events = Event.objects.all().order_by('-created_at')
+    events = Event.objects.select_related('summary').order_by('-created_at')
     
     # Apply filters
     if status_filter:
@@ -719,9 +743,8 @@ def admin_event_list(request):
         
     if search_query:
         events = events.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(organizer__username__icontains=search_query)
+            search_filter(search_query) |
+            Q(organizer__in=User.objects.filter(username__icontains=search_query))
         )
     
     # Pagination
@@ -0,0 +1,284 @@
+# events/summary.py
+#
+# The EventSummary read model. Listing cards and event pages read an
+# event's ticket figures from its summary row instead of counting tickets.
+# The purchase, payment, check-in and waitlist paths move the row by the
+# tickets they changed with adjust_event_summaries(), one UPDATE per event
+# next to their stock counter UPDATEs. Edits to an event or its ticket
+# types recompute its prices and places with refresh_event_limits(), which
+# counts no tickets. refresh_event_summaries() recounts everything and is
+# left to the reconcile_inventory repair command.
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, PositiveIntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Event, EventSummary
+from tickets.models import Ticket, TicketType, WaitlistEntry
+
+# Tickets holding a place (tickets.inventory.ACTIVE_STATUSES)
+SOLD_STATUSES = ('pending', 'confirmed', 'used')
+CONFIRMED_STATUSES = ('confirmed', 'used')
+
+SUMMARY_FIELDS = [
+    'sold', 'confirmed', 'checked_in', 'min_price', 'max_price', 'remaining', 'sold_out', 'updated_at',
+]
+
+
+def _type_figures(event_ids):
+    """Prices and stock limits of the events' ticket types, by event id"""
+    return {
+        row['event_id']: row
+        for row in TicketType.objects.filter(event_id__in=event_ids).order_by().values('event_id').annotate(
+            min_price=Min('price'),
+            max_price=Max('price'),
+            quantity=Sum('quantity_available'),
+            unlimited=Count('pk', filter=Q(quantity_available=0)),
+        )
+    }
+
+
+def _offered(event_ids):
+    """Stock held by open waitlist offers, by event id"""
+    return dict(
+        WaitlistEntry.objects.filter(ticket_type__event_id__in=event_ids, status='offered')
+        .order_by().values('ticket_type__event_id').annotate(total=Sum('quantity'))
+        .values_list('ticket_type__event_id', 'total')
+    )
+
+
+def _capacity(max_attendees, types):
+    """Places an event can hold, or None when it is unlimited"""
+    # The event cap and the ticket type quantities both limit places;
+    # 0 means unlimited for either
+    limits = []
+    if max_attendees:
+        limits.append(max_attendees)
+    if types and not types['unlimited']:
+        limits.append(types['quantity'])
+    return min(limits) if limits else None
+
+
+def build_summaries(events):
+    """
+    Compute the summaries of some events from their tickets, ticket types
+    and open waitlist offers
+
+    Args:
+        events: (event id, max_attendees) pairs of the events to summarize
+
+    Returns:
+        list: Unsaved EventSummary instances, one per event
+    """
+    event_ids = [event_id for event_id, _ in events]
+    ticket_counts = {
+        row['event_id']: row
+        for row in Ticket.objects.filter(event_id__in=event_ids).order_by().values('event_id').annotate(
+            sold=Count('pk', filter=Q(status__in=SOLD_STATUSES)),
+            confirmed=Count('pk', filter=Q(status__in=CONFIRMED_STATUSES)),
+            checked_in=Count('pk', filter=Q(checked_in=True)),
+        )
+    }
+    type_figures = _type_figures(event_ids)
+    # Open waitlist offers hold places that are not tickets yet
+    offered = _offered(event_ids)
+
+    summaries = []
+    for event_id, max_attendees in events:
+        counts = ticket_counts.get(event_id, {})
+        types = type_figures.get(event_id, {})
+        sold = counts.get('sold', 0)
+        held = sold + offered.get(event_id, 0)
+
+        capacity = _capacity(max_attendees, types)
+        remaining = max(capacity - held, 0) if capacity is not None else None
+
+        summaries.append(EventSummary(
+            event_id=event_id,
+            sold=sold,
+            confirmed=counts.get('confirmed', 0),
+            checked_in=counts.get('checked_in', 0),
+            min_price=types.get('min_price'),
+            max_price=types.get('max_price'),
+            remaining=remaining,
+            sold_out=remaining == 0,
+        ))
+
+    return summaries
+
+
+def get_ticket_change(before, after):
+    """
+    Summary deltas for one ticket going from one state to another
+
+    Args:
+        before: (status, checked_in) as stored, or None for a new ticket
+        after: (status, checked_in) now, or None for a deleted ticket
+
+    Returns:
+        dict: Deltas for sold, confirmed and checked_in
+    """
+    change = {'sold': 0, 'confirmed': 0, 'checked_in': 0}
+    for state, sign in ((after, 1), (before, -1)):
+        if state is None:
+            continue
+        status, checked_in = state
+        change['sold'] += sign * (status in SOLD_STATUSES)
+        change['confirmed'] += sign * (status in CONFIRMED_STATUSES)
+        change['checked_in'] += sign * bool(checked_in)
+    return change
+
+
+def _shift(field, change):
+    """Move a counter by change, never below zero"""
+    if change >= 0:
+        return F(field) + change
+    return Greatest(F(field) + change, Value(0))
+
+
+def adjust_event_summaries(changes):
+    """
+    Move the summaries of some events by the tickets a caller just changed
+
+    One UPDATE per event, in event id order; call it in the transaction
+    that moved the stock counters, right after them. Places left move with
+    the tickets sold and the stock held by waitlist offers.
+
+    Args:
+        changes: Event id -> deltas for sold, confirmed, checked_in and
+                 offered (units held by open waitlist offers)
+
+    Returns:
+        int: Number of summaries updated
+    """
+    updated = 0
+    for event_id in sorted(changes):
+        change = changes[event_id]
+        held = change.get('sold', 0) + change.get('offered', 0)
+
+        fields = {
+            name: _shift(name, change[name])
+            for name in ('sold', 'confirmed', 'checked_in') if change.get(name)
+        }
+        if held:
+            # sold_out first: it must see places left before this change
+            fields['sold_out'] = Case(
+                When(remaining__isnull=True, then=Value(False)),
+                When(remaining__gt=held, then=Value(False)),
+                default=Value(True),
+            )
+            fields['remaining'] = Case(
+                When(remaining__gt=held, then=F('remaining') - held),
+                When(remaining__isnull=False, then=Value(0)),
+                default=None,
+                output_field=PositiveIntegerField(),
+            )
+        if not fields:
+            continue
+
+        updated += EventSummary.objects.filter(event_id=event_id).update(updated_at=timezone.now(), **fields)
+
+    return updated
+
+
+def refresh_event_limits(event_ids):
+    """
+    Recompute the prices and places left of events whose cap or ticket types changed
+
+    Reads the ticket types and open offers but no tickets: the places held
+    are the summary's own sold figure plus the offers.
+
+    Args:
+        event_ids: Ids of the edited events
+
+    Returns:
+        int: Number of summaries updated
+    """
+    event_ids = sorted({event_id for event_id in event_ids if event_id is not None})
+    if not event_ids:
+        return 0
+
+    events = Event.objects.filter(pk__in=event_ids).order_by('pk').values_list('pk', 'max_attendees')
+    type_figures = _type_figures(event_ids)
+    offered = _offered(event_ids)
+
+    updated = 0
+    for event_id, max_attendees in events:
+        types = type_figures.get(event_id, {})
+        capacity = _capacity(max_attendees, types)
+        fields = {'min_price': types.get('min_price'), 'max_price': types.get('max_price')}
+        if capacity is None:
+            fields.update(remaining=None, sold_out=False)
+        else:
+            # Places not held by waitlist offers, shared by the tickets sold
+            places = capacity - offered.get(event_id, 0)
+            fields.update(
+                remaining=Greatest(Value(places) - F('sold'), Value(0)),
+                sold_out=Case(When(sold__gte=places, then=Value(True)), default=Value(False)),
+            )
+        updated += EventSummary.objects.filter(event_id=event_id).update(updated_at=timezone.now(), **fields)
+
+    return updated
+
+
+def refresh_event_summaries(event_ids):
+    """
+    Recount and store the summaries of the given events
+
+    Repairs summaries that drifted from the tickets, see
+    rebuild_event_summaries(). The event rows are locked first, so
+    concurrent refreshes of an event run one after the other and the last
+    one sees every committed ticket.
+
+    Args:
+        event_ids: Ids of the events whose tickets or ticket types changed
+
+    Returns:
+        int: Number of summaries written
+    """
+    event_ids = sorted({event_id for event_id in event_ids if event_id is not None})
+    if not event_ids:
+        return 0
+
+    with transaction.atomic(savepoint=False):
+        events = list(
+            Event.objects.select_for_update()
+            .filter(pk__in=event_ids)
+            .order_by('pk')
+            .values_list('pk', 'max_attendees')
+        )
+        summaries = build_summaries(events)
+        EventSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['event'],
+            update_fields=SUMMARY_FIELDS,
+        )
+
+    return len(summaries)
+
+
+def rebuild_event_summaries(events=None, batch_size=500):
+    """
+    Recount the summaries of many events, e.g. after a bulk import
+
+    Args:
+        events: Optional Event queryset to limit the rebuild
+        batch_size: Events refreshed per transaction
+
+    Returns:
+        int: Number of summaries written
+    """
+    if events is None:
+        events = Event.objects.all()
+
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(events.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        written += refresh_event_summaries(batch)
+
+    return written
@@ -4,6 +4,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from events.models import Event, EventCategory
+from events.trending import record_ticket_sales
 from django.utils import timezone
 from datetime import timedelta
 
@@ -112,4 +113,33 @@ class EventAPITest(APITestCase):
         
         # Should be forbidden
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(Event.objects.get(id=other_event.id).title, "Other User's Event")
\ No newline at end of file
+        self.assertEqual(Event.objects.get(id=other_event.id).title, "Other User's Event")
+    
+    def test_trending_events(self):
+        upcoming = Event.objects.create(
+            title="Upcoming Event",
+            description="Selling fast",
+            category=self.category,
+            organizer=self.user,
+            location="Test Location",
+            start_date=self.future,
+            end_date=self.future + timedelta(days=1),
+            status="published"
+        )
+        record_ticket_sales(upcoming.id, 3)
+        
+        url = reverse('event-trending')
+        response = self.client.get(url, {'limit': 5})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['id'], upcoming.id)
+        self.assertEqual(response.data[0]['ticket_count'], 3)
+    
+    def test_search_events(self):
+        url = reverse('event-list')
+        response = self.client.get(url, {'search': 'pre-existing'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([item['id'] for item in results], [self.event.id])
@@ -1,9 +1,24 @@
 # events/tests/test_models.py
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
-from events.models import Event, EventCategory
+from events.models import Event, EventCategory, EventNotification, EventSalesHour, EventSummary
+from events.notifications import queue_cancellation_notice, send_event_notifications
+from events.trending import get_trending_events, hour_index, rebuild_sales_rollup, record_ticket_sales
+from tickets.checkin import check_in_tickets
+from tickets.inventory import confirm_tickets, release_tickets
+from tickets.models import Ticket, TicketType
+from tickets.purchase import process_ticket_purchase
 from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
 class EventCategoryModelTest(TestCase):
     def setUp(self):
@@ -69,4 +84,492 @@ class EventModelTest(TestCase):
             status="completed"
         )
         
-        self.assertTrue(past_event.is_past_event)
\ No newline at end of file
+        self.assertTrue(past_event.is_past_event)
+
+class TrendingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpassword"
+        )
+        
+        self.category = EventCategory.objects.create(
+            name="Conference",
+            description="Professional conferences"
+        )
+        
+        self.now = timezone.now()
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test Description",
+            category=self.category,
+            organizer=self.user,
+            location="Test Location",
+            start_date=self.now + timedelta(days=7),
+            end_date=self.now + timedelta(days=8),
+            status="published"
+        )
+        
+        self.other_event = Event.objects.create(
+            title="Other Event",
+            description="Other Description",
+            category=self.category,
+            organizer=self.user,
+            location="Other Location",
+            start_date=self.now + timedelta(days=7),
+            end_date=self.now + timedelta(days=8),
+            status="published"
+        )
+    
+    def test_record_ticket_sales_accumulates_per_hour(self):
+        record_ticket_sales(self.event.id, 2)
+        record_ticket_sales(self.event.id, 3)
+        
+        bucket = EventSalesHour.objects.get(event=self.event)
+        self.assertEqual(bucket.tickets_sold, 5)
+        self.assertEqual(bucket.hour_index, hour_index())
+    
+    def test_recent_sales_outrank_older_sales(self):
+        # More tickets, but two days (two half-lives) ago
+        record_ticket_sales(self.event.id, 10, when=self.now - timedelta(hours=48))
+        record_ticket_sales(self.other_event.id, 4)
+        
+        trending = get_trending_events(min_tickets=1)
+        
+        self.assertEqual([e.id for e in trending], [self.other_event.id, self.event.id])
+        self.assertEqual(trending[1].ticket_count, 10)
+        self.assertAlmostEqual(trending[1].trending_score, 2.5, places=1)
+    
+    def test_sales_outside_window_ignored(self):
+        record_ticket_sales(self.event.id, 10, when=self.now - timedelta(days=8))
+        
+        self.assertEqual(get_trending_events(min_tickets=1), [])
+    
+    def test_confirm_tickets_records_sales(self):
+        ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('10.00'),
+            quantity_available=10
+        )
+        for _ in range(3):
+            Ticket.objects.create(ticket_type=ticket_type, user=self.user, status='pending')
+        
+        tickets = Ticket.objects.filter(ticket_type=ticket_type)
+        self.assertEqual(confirm_tickets(tickets), 3)
+        # Already confirmed tickets are not counted twice
+        self.assertEqual(confirm_tickets(tickets), 0)
+        
+        self.assertEqual(EventSalesHour.objects.get(event=self.event).tickets_sold, 3)
+    
+    def test_rebuild_sales_rollup(self):
+        ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('10.00'),
+            quantity_available=10
+        )
+        for _ in range(2):
+            Ticket.objects.create(ticket_type=ticket_type, user=self.user, status='confirmed')
+        Ticket.objects.create(ticket_type=ticket_type, user=self.user, status='pending')
+        
+        self.assertEqual(rebuild_sales_rollup(), 1)
+        
+        trending = get_trending_events(min_tickets=1)
+        self.assertEqual(trending[0].ticket_count, 2)
+
+class EventNotificationTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(
+            username="organizer",
+            email="organizer@example.com",
+            password="testpassword"
+        )
+        
+        self.event = Event.objects.create(
+            title="Cancelled Concert",
+            description="Test description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('10.00'),
+            quantity_available=100
+        )
+        
+        self.holders = []
+        for i in range(5):
+            user = User.objects.create_user(
+                username=f"holder{i}",
+                email=f"holder{i}@example.com",
+                password="testpassword"
+            )
+            Ticket.objects.create(ticket_type=self.ticket_type, user=user, status='confirmed')
+            self.holders.append(user)
+    
+    def _cancel(self):
+        notification = queue_cancellation_notice(self.event)
+        release_tickets(Ticket.objects.filter(ticket_type__event=self.event))
+        return notification
+    
+    def test_one_email_per_holder(self):
+        """Test that a holder of several tickets is emailed once"""
+        Ticket.objects.create(ticket_type=self.ticket_type, user=self.holders[0], status='confirmed')
+        notification = self._cancel()
+        
+        self.assertEqual(send_event_notifications(chunk_size=2, rate=0), (1, 5))
+        
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(u.email for u in self.holders))
+        self.assertIn('Cancelled Concert', mail.outbox[0].subject)
+        
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'done')
+        self.assertEqual(notification.sent_count, 5)
+        self.assertEqual(notification.last_user_id, self.holders[-1].pk)
+        self.assertIsNotNone(notification.finished_at)
+        
+        # Nothing left to send
+        self.assertEqual(send_event_notifications(rate=0), (0, 0))
+        self.assertEqual(len(mail.outbox), 5)
+    
+    def test_earlier_cancellations_not_notified(self):
+        """Test that tickets cancelled before the event was are left out"""
+        release_tickets(Ticket.objects.filter(user=self.holders[0]))
+        Ticket.objects.filter(user=self.holders[0]).update(updated_at=timezone.now() - timedelta(days=1))
+        self._cancel()
+        
+        send_event_notifications(rate=0)
+        
+        self.assertNotIn(self.holders[0].email, [m.to[0] for m in mail.outbox])
+        self.assertEqual(len(mail.outbox), 4)
+    
+    def test_recipients_inserted_in_batches(self):
+        """Test that queuing a notice streams its recipients in batches"""
+        with patch('events.notifications.RECIPIENT_BATCH_SIZE', 2):
+            with CaptureQueriesContext(connection) as queries:
+                notification = queue_cancellation_notice(self.event)
+        
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO "events_eventnotificationrecipient"')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            sorted(notification.recipients.values_list('user_id', flat=True)), [user.pk for user in self.holders]
+        )
+    
+    def test_later_cancellations_not_notified(self):
+        """Test that tickets cancelled after the notice was queued, for other reasons, are left out"""
+        latecomer = User.objects.create_user(username="latecomer", email="late@example.com", password="testpassword")
+        self._cancel()
+        ticket = Ticket.objects.create(ticket_type=self.ticket_type, user=latecomer, status='pending')
+        release_tickets(Ticket.objects.filter(pk=ticket.pk))
+        
+        send_event_notifications(rate=0)
+        
+        self.assertNotIn(latecomer.email, [m.to[0] for m in mail.outbox])
+        self.assertEqual(len(mail.outbox), 5)
+    
+    def _failing_for(self, email, times):
+        # Connections whose sends to email fail the first times attempts
+        failures = []
+        def flaky_connection(*args, **kwargs):
+            real = get_connection(*args, **kwargs)
+            send_messages = real.send_messages
+            def flaky_send(messages):
+                if messages[0].to == [email] and len(failures) < times:
+                    failures.append(1)
+                    raise ConnectionError("Mailbox unavailable")
+                return send_messages(messages)
+            real.send_messages = flaky_send
+            return real
+        return patch('events.notifications.get_connection', side_effect=flaky_connection)
+    
+    def test_failed_sends_are_retried(self):
+        """Test that a failed send is retried on a later pass, once its delay has passed"""
+        notification = self._cancel()
+        
+        with self._failing_for(self.holders[2].email, times=1):
+            self.assertEqual(send_event_notifications(chunk_size=2, rate=0), (0, 4))
+            
+            notification.refresh_from_db()
+            self.assertEqual(notification.status, 'pending')
+            self.assertEqual(notification.failed_count, 1)
+            self.assertGreater(notification.locked_until, timezone.now())
+            self.assertEqual(send_event_notifications(rate=0), (0, 0))
+            
+            EventNotification.objects.filter(pk=notification.pk).update(locked_until=timezone.now())
+            self.assertEqual(send_event_notifications(chunk_size=2, rate=0), (1, 1))
+        
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(u.email for u in self.holders))
+        self.assertFalse(notification.recipients.exclude(status='sent').exists())
+    
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        """Test that a recipient whose sends keep failing is marked failed"""
+        notification = self._cancel()
+        
+        with self._failing_for(self.holders[0].email, times=2):
+            send_event_notifications(rate=0)
+            EventNotification.objects.filter(pk=notification.pk).update(locked_until=timezone.now())
+            self.assertEqual(send_event_notifications(rate=0), (1, 0))
+        
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'done')
+        self.assertEqual(notification.failed_count, 2)
+        self.assertEqual(notification.recipients.get(user=self.holders[0]).status, 'failed')
+    
+    def test_resumes_after_interruption(self):
+        """Test that a worker that stopped mid-way resumes after the last chunk"""
+        notification = self._cancel()
+        
+        connections = []
+        def flaky_connection(*args, **kwargs):
+            connections.append(1)
+            if len(connections) == 2:
+                raise ConnectionError("SMTP server went away")
+            return get_connection(*args, **kwargs)
+        
+        with patch('events.notifications.get_connection', side_effect=flaky_connection):
+            finished, _ = send_event_notifications(chunk_size=2, rate=0)
+        self.assertEqual(finished, 0)
+        self.assertEqual(len(mail.outbox), 2)
+        
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sending')
+        self.assertEqual(notification.last_user_id, self.holders[1].pk)
+        self.assertIn('went away', notification.last_error)
+        
+        # The lease runs out and another run picks the notification up
+        EventNotification.objects.filter(pk=notification.pk).update(locked_until=timezone.now())
+        self.assertEqual(send_event_notifications(chunk_size=2, rate=0), (1, 3))
+        
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(u.email for u in self.holders))
+    
+    def test_claimed_notification_skipped(self):
+        """Test that a notification held by another worker is not sent twice"""
+        notification = self._cancel()
+        EventNotification.objects.filter(pk=notification.pk).update(
+            status='sending', locked_until=timezone.now() + timedelta(minutes=5)
+        )
+        
+        self.assertEqual(send_event_notifications(rate=0), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_rate_limit(self):
+        """Test that sending is paced to the configured rate"""
+        self._cancel()
+        
+        with patch('events.notifications.time.sleep') as sleep:
+            send_event_notifications(rate=2)
+        
+        # Sleeping is mocked, so the last delay is the whole run: 5 emails at 2 per second
+        self.assertEqual(sleep.call_count, 5)
+        self.assertAlmostEqual(sleep.call_args_list[-1].args[0], 2.5, delta=0.5)
+    
+    def test_send_event_notifications_command(self):
+        self._cancel()
+        
+        out = StringIO()
+        call_command('send_event_notifications', '--rate', '0', stdout=out)
+        
+        self.assertIn('1 notification(s), 5 email(s) sent', out.getvalue())
+
+
+class EventSummaryTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(
+            username="organizer",
+            email="organizer@example.com",
+            password="testpassword"
+        )
+        
+        self.buyer = User.objects.create_user(
+            username="buyer",
+            email="buyer@example.com",
+            password="testpassword"
+        )
+        
+        self.event = Event.objects.create(
+            title="Summary Concert",
+            description="Test description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published",
+            max_attendees=10
+        )
+        
+        self.general = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('25.00'),
+            quantity_available=0
+        )
+        
+        self.vip = TicketType.objects.create(
+            event=self.event,
+            name="VIP",
+            price=Decimal('80.00'),
+            quantity_available=5
+        )
+    
+    def _summary(self):
+        return EventSummary.objects.get(event=self.event)
+    
+    def test_new_event_gets_a_summary(self):
+        event = Event.objects.create(
+            title="Empty Event",
+            description="Test description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2)
+        )
+        
+        summary = EventSummary.objects.get(event=event)
+        self.assertEqual(summary.sold, 0)
+        self.assertIsNone(summary.min_price)
+        self.assertIsNone(summary.remaining)
+        self.assertFalse(summary.sold_out)
+    
+    def test_prices_and_capacity(self):
+        summary = self._summary()
+        self.assertEqual(summary.min_price, Decimal('25.00'))
+        self.assertEqual(summary.max_price, Decimal('80.00'))
+        # General is unlimited, so the event cap is the only limit
+        self.assertEqual(summary.remaining, 10)
+        
+        self.general.quantity_available = 2
+        self.general.save()
+        # 2 General + 5 VIP is below the cap of 10
+        self.assertEqual(self._summary().remaining, 7)
+    
+    def test_follows_purchase_payment_and_check_in(self):
+        payment, tickets = process_ticket_purchase(self.buyer, {self.vip.id: 3}, 'credit_card')
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in), (3, 0, 0))
+        self.assertEqual(summary.remaining, 7)
+        
+        confirm_tickets(payment.tickets.all())
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in), (3, 3, 0))
+        
+        check_in_tickets([(tickets[0].ticket_code, None)], event_id=self.event.id)
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in), (3, 3, 1))
+        
+        release_tickets(Ticket.objects.filter(pk=tickets[1].pk))
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in), (2, 2, 1))
+        self.assertEqual(summary.remaining, 8)
+    
+    def test_sold_out(self):
+        self.event.max_attendees = 3
+        self.event.save()
+        
+        process_ticket_purchase(self.buyer, {self.general.id: 3}, 'credit_card')
+        
+        summary = self._summary()
+        self.assertEqual(summary.remaining, 0)
+        self.assertTrue(summary.sold_out)
+        self.assertEqual(summary.capacity_percentage, 100)
+        
+        release_tickets(Ticket.objects.filter(pk=Ticket.objects.filter(event=self.event).first().pk))
+        summary = self._summary()
+        self.assertEqual(summary.remaining, 1)
+        self.assertFalse(summary.sold_out)
+    
+    def test_hot_paths_update_the_summary_in_place(self):
+        """Test that purchases and check-ins move the summary with one UPDATE and count no tickets"""
+        def summary_queries(queries):
+            return [query['sql'] for query in queries.captured_queries if 'events_eventsummary' in query['sql']]
+        
+        with CaptureQueriesContext(connection) as purchase:
+            payment, tickets = process_ticket_purchase(self.buyer, {self.vip.id: 2}, 'credit_card')
+        confirm_tickets(payment.tickets.all())
+        with CaptureQueriesContext(connection) as check_in:
+            check_in_tickets([(tickets[0].ticket_code, None)], event_id=self.event.id)
+        
+        for queries in (purchase, check_in):
+            self.assertEqual(len(summary_queries(queries)), 1)
+            self.assertTrue(summary_queries(queries)[0].startswith('UPDATE'))
+            self.assertFalse(
+                [query['sql'] for query in queries.captured_queries if 'COUNT' in query['sql'] and 'tickets_ticket"' in query['sql']]
+            )
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in, summary.remaining), (2, 2, 1, 8))
+    
+    def test_follows_single_ticket_saves(self):
+        ticket = Ticket.objects.create(ticket_type=self.general, user=self.buyer, status='confirmed')
+        self.assertEqual((self._summary().sold, self._summary().confirmed), (1, 1))
+        
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        ticket.status = 'used'
+        ticket.checked_in = True
+        ticket.save()
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in), (1, 1, 1))
+        
+        ticket.status = 'cancelled'
+        ticket.save()
+        summary = self._summary()
+        self.assertEqual((summary.sold, summary.confirmed, summary.checked_in, summary.remaining), (0, 0, 1, 10))
+    
+    def test_moving_a_ticket_type_refreshes_both_events(self):
+        process_ticket_purchase(self.buyer, {self.vip.id: 4}, 'credit_card')
+        other = Event.objects.create(
+            title="Other Concert",
+            description="Test description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.vip.event = other
+        self.vip.save()
+        
+        self.assertEqual(self._summary().sold, 0)
+        self.assertEqual(EventSummary.objects.get(event=other).sold, 4)
+    
+    def test_deleting_tickets_refreshes_once(self):
+        process_ticket_purchase(self.buyer, {self.vip.id: 4}, 'credit_card')
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Ticket.objects.filter(event=self.event).delete()
+        
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._summary().sold, 0)
+    
+    def test_reconcile_rebuilds_drifted_summaries(self):
+        process_ticket_purchase(self.buyer, {self.vip.id: 2}, 'credit_card')
+        EventSummary.objects.filter(event=self.event).update(sold=0, remaining=10)
+        
+        call_command('reconcile_inventory', stdout=StringIO())
+        
+        summary = self._summary()
+        self.assertEqual(summary.sold, 2)
+        self.assertEqual(summary.remaining, 8)
+    
+    def test_event_detail_reads_the_summary(self):
+        process_ticket_purchase(self.buyer, {self.vip.id: 4}, 'credit_card')
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event_detail', args=[self.event.id]))
+        
+        self.assertEqual(response.context['summary'].sold, 4)
+        self.assertContains(response, '4 / 10 spots filled')
+        self.assertFalse(
+            [query['sql'] for query in queries.captured_queries if 'COUNT' in query['sql'] and 'tickets_ticket"' in query['sql']]
+        )
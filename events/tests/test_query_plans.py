@@ -0,0 +1,147 @@
+# events/tests/test_query_plans.py
+import re
+import unittest
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from events.models import Event, EventCategory
+from tickets.models import TicketType, Ticket
+from payments.models import Payment
+
+# Tables large enough in production that a full scan is a regression
+WATCHED_TABLES = {
+    Event._meta.db_table,
+    Ticket._meta.db_table,
+    Payment._meta.db_table,
+}
+
+# "SCAN <table>" without "USING ... INDEX" reads every row
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Query plans are checked with SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTest(TestCase):
+    """Run EXPLAIN on the queries behind the busiest views and fail on full table scans"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='staffpass123',
+            is_staff=True
+        )
+        
+        self.category = EventCategory.objects.create(name="Music", description="Music events")
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test Description",
+            category=self.category,
+            organizer=self.staff,
+            location="Test Venue",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=Decimal('50.00'),
+            quantity_available=100
+        )
+        
+        self.ticket = Ticket.objects.create(
+            ticket_type=self.ticket_type,
+            user=self.staff,
+            status='confirmed'
+        )
+        
+        self.payment = Payment.objects.create(
+            user=self.staff,
+            amount=Decimal('50.00'),
+            payment_method='offline',
+            payment_status='processing',
+            stripe_payment_intent='pi_test'
+        )
+        self.payment.tickets.add(self.ticket)
+        
+        self.client.force_login(self.staff)
+    
+    def get_full_scans(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[3] for row in cursor.fetchall()]
+        
+        return [
+            match.group(1) for match in map(FULL_SCAN.match, plan)
+            if match and match.group(1) in WATCHED_TABLES
+        ]
+    
+    def assertNoFullScans(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        
+        for query in queries.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            scans = self.get_full_scans(query['sql'])
+            self.assertFalse(scans, f"{url} scans {', '.join(scans)}:\n{query['sql']}")
+    
+    def assertQuerySetUsesIndex(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        scans = self.get_full_scans(sql, params)
+        self.assertFalse(scans, f"Query scans {', '.join(scans)}:\n{sql}")
+    
+    def test_event_list(self):
+        self.assertNoFullScans(reverse('event_list'))
+        self.assertNoFullScans(reverse('event_list'), {'category': self.category.id})
+        self.assertNoFullScans(reverse('event_list'), {'date': 'this-week'})
+        self.assertNoFullScans(reverse('event_list'), {'q': 'test'})
+    
+    def test_home(self):
+        self.assertNoFullScans(reverse('home'))
+    
+    def test_my_tickets(self):
+        self.assertNoFullScans(reverse('my_tickets'))
+    
+    def test_scan_ticket_recent_scans(self):
+        self.assertNoFullScans(reverse('scan_ticket'))
+    
+    def test_admin_payment_list(self):
+        self.assertNoFullScans(reverse('admin_payment_list'))
+    
+    def test_ticket_stats(self):
+        self.assertNoFullScans(reverse('ticket_stats', args=[self.event.id]))
+    
+    def test_scan_manifest(self):
+        self.assertNoFullScans(reverse('scan_manifest', args=[self.event.id]))
+        self.assertNoFullScans(reverse('scan_manifest', args=[self.event.id]), {'since': 1700000000000})
+    
+    def test_event_detail(self):
+        self.assertNoFullScans(reverse('event_detail', args=[self.event.id]))
+    
+    def test_event_tickets_by_status(self):
+        self.assertQuerySetUsesIndex(
+            Ticket.objects.filter(event=self.event, status__in=['confirmed', 'used'])
+        )
+    
+    def test_event_api_search(self):
+        self.assertNoFullScans(reverse('event-list'), {'search': 'test'})
+    
+    def test_ticket_status_by_type(self):
+        self.assertQuerySetUsesIndex(
+            Ticket.objects.filter(ticket_type=self.ticket_type, status='pending')
+        )
+    
+    def test_stripe_webhook_lookup(self):
+        self.assertQuerySetUsesIndex(
+            Payment.objects.filter(stripe_payment_intent='pi_test')
+        )
@@ -1,10 +1,20 @@
 # events/tests/test_views.py
 from django.test import TestCase, Client
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+import time
 from events.models import Event, EventCategory
+from events import waiting_room
+from events.search import ensure_search_index, search_events
+from events.trending import record_ticket_sales
 from tickets.models import TicketType, Ticket
 from payments.models import Payment
 
@@ -194,6 +204,10 @@ class EventViewsTestCase(TestCase):
         self.assertEqual(self.event.status, 'cancelled')
         self.assertEqual(ticket.status, 'cancelled')
         self.assertEqual(response.status_code, 302)
+        
+        # Holders are emailed later by the worker, not by the request
+        self.assertEqual(self.event.notifications.get().status, 'pending')
+        self.assertEqual(len(mail.outbox), 0)
     
     def test_my_events_view(self):
         """Test my events page"""
@@ -359,6 +373,84 @@ class EventSearchTest(TestCase):
         for event in response.context['page_obj']:
             self.assertEqual(event.location, 'Stadium')
     
+    def test_search_matches_prefixes_and_all_terms(self):
+        """Test full-text search matches word prefixes and requires every term"""
+        response = self.client.get(reverse('event_list'), {'q': 'spo even'})
+        self.assertEqual(response.status_code, 200)
+        
+        titles = [event.title for event in response.context['page_obj']]
+        self.assertEqual(len(titles), 3)
+        self.assertTrue(all(title.startswith('Sports') for title in titles))
+    
+    def test_search_ranks_title_matches_first(self):
+        """Test events matching in the title outrank description-only matches"""
+        Event.objects.create(
+            title="Quiet Evening",
+            description="Not a stadium gig, just a quiz",
+            category=self.category2,
+            organizer=self.user,
+            location="Library",
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(hours=2),
+            status="published"
+        )
+        quiz = Event.objects.create(
+            title="Quiz Night",
+            description="Teams of four",
+            category=self.category2,
+            organizer=self.user,
+            location="Pub",
+            start_date=timezone.now() + timedelta(days=3),
+            end_date=timezone.now() + timedelta(days=3, hours=2),
+            status="published"
+        )
+        
+        response = self.client.get(reverse('event_list'), {'q': 'quiz'})
+        
+        results = list(response.context['page_obj'])
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], quiz)
+    
+    def test_search_index_follows_updates_and_deletes(self):
+        """Test the search index is kept in sync with event rows"""
+        event = Event.objects.get(title="Music Event 0")
+        event.title = "Renamed Gala"
+        event.save()
+        
+        self.assertEqual(list(search_events(Event.objects.all(), 'gala')), [event])
+        
+        event.delete()
+        self.assertFalse(search_events(Event.objects.all(), 'gala').exists())
+    
+    def test_location_filter_only_searches_location(self):
+        """Test the location filter ignores matches in other fields"""
+        response = self.client.get(reverse('event_list'), {'location': 'music'})
+        self.assertEqual(len(response.context['page_obj']), 5)
+        
+        response = self.client.get(reverse('event_list'), {'location': 'sports'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+    
+    def test_ensure_search_index_restores_dropped_triggers(self):
+        """Test the index is repaired when a table rebuild dropped its triggers"""
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER events_event_fts_insert")
+        
+        Event.objects.create(
+            title="Unindexed Event",
+            description="Created while the trigger was missing",
+            category=self.category1,
+            organizer=self.user,
+            location="Nowhere",
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(hours=2),
+            status="published"
+        )
+        self.assertFalse(search_events(Event.objects.all(), 'unindexed').exists())
+        
+        self.assertTrue(ensure_search_index())
+        self.assertTrue(search_events(Event.objects.all(), 'unindexed').exists())
+        self.assertFalse(ensure_search_index())
+    
     def test_filter_by_category(self):
         """Test filtering events by category"""
         response = self.client.get(reverse('event_list'), {'category': self.category1.id})
@@ -388,4 +480,197 @@ class EventSearchTest(TestCase):
         
         # Check pagination exists
         self.assertTrue(response.context['page_obj'].has_next())
-        self.assertEqual(len(response.context['page_obj']), 9)  # 9 events per page
\ No newline at end of file
+        self.assertEqual(len(response.context['page_obj']), 9)  # 9 events per page
+
+class WaitingRoomTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='organizerpass123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Stadium Tour",
+            description="A very popular concert",
+            organizer=self.organizer,
+            location="Stadium",
+            start_date=timezone.now() + timedelta(days=30),
+            end_date=timezone.now() + timedelta(days=31),
+            status="published",
+            is_high_demand=True,
+            admission_rate=2
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="Floor",
+            price=90.00,
+            quantity_available=100
+        )
+    
+    def test_admission_rate_per_second(self):
+        """Test that no more than admission_rate buyers share an admission second"""
+        now = 1_000_000
+        slots = [
+            waiting_room.read_token(waiting_room.issue_token(self.event, user_id, now=now), self.event.id)['s']
+            for user_id in range(7)
+        ]
+        
+        self.assertEqual(slots, [now, now, now + 1, now + 1, now + 2, now + 2, now + 3])
+    
+    def test_token_status(self):
+        """Test waiting, admitted and expired states of a token"""
+        now = 1_000_000
+        for user_id in range(4):
+            token = waiting_room.issue_token(self.event, user_id, now=now)
+        
+        waiting = waiting_room.get_status(token, self.event.id, now=now)
+        self.assertEqual(waiting['status'], 'waiting')
+        self.assertEqual(waiting['position'], 2)
+        
+        self.assertEqual(waiting_room.get_status(token, self.event.id, now=now + 1)['status'], 'admitted')
+        self.assertEqual(waiting_room.get_status(token, self.event.id, now=now + 10_000)['status'], 'expired')
+    
+    def test_forged_or_foreign_token_invalid(self):
+        """Test that tampered tokens and tokens of other users are rejected"""
+        token = waiting_room.issue_token(self.event, self.user.id)
+        
+        self.assertEqual(waiting_room.get_status(token + 'x', self.event.id)['status'], 'invalid')
+        self.assertEqual(waiting_room.get_status(token, self.event.id + 1)['status'], 'invalid')
+        self.assertEqual(waiting_room.get_status(token, self.event.id, user_id=self.organizer.id)['status'], 'invalid')
+    
+    def test_lost_counters_give_up(self):
+        """Test that issuing a token stops retrying when the cache keeps losing the counter"""
+        with patch('events.waiting_room.cache.incr', side_effect=ValueError) as incr:
+            with self.assertRaises(waiting_room.WaitingRoomUnavailable):
+                waiting_room.issue_token(self.event, self.user.id)
+            self.assertEqual(incr.call_count, waiting_room.MAX_INCR_ATTEMPTS)
+            
+            self.client.login(username='testuser', password='testpassword123')
+            response = self.client.get(reverse('waiting_room', args=[self.event.id]))
+        self.assertRedirects(response, reverse('event_detail', args=[self.event.id]), fetch_redirect_response=False)
+    
+    def test_checkout_requires_admission(self):
+        """Test that buyers are sent to the waiting room until admitted"""
+        self.client.login(username='testuser', password='testpassword123')
+        
+        checkout_data = {
+            'event_id': self.event.id,
+            'ticket_quantities[{}]'.format(self.ticket_type.id): '1',
+        }
+        
+        now = time.time()
+        with patch('events.waiting_room.time.time', return_value=now):
+            # Fill the current second so the next buyer has to wait
+            waiting_room.issue_token(self.event, 1000)
+            waiting_room.issue_token(self.event, 1001)
+            
+            response = self.client.post(reverse('create_payment'), checkout_data)
+            self.assertRedirects(response, reverse('waiting_room', args=[self.event.id]), fetch_redirect_response=False)
+            
+            response = self.client.get(reverse('waiting_room', args=[self.event.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['queue_status']['status'], 'waiting')
+        
+        self.assertFalse(Payment.objects.filter(user=self.user).exists())
+        
+        # Once the admission second arrives, checkout goes through
+        with patch('events.waiting_room.time.time', return_value=now + 2):
+            response = self.client.post(reverse('create_payment'), checkout_data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Payment.objects.filter(user=self.user).exists())
+    
+    def test_status_endpoint(self):
+        """Test the polling endpoint"""
+        token = waiting_room.issue_token(self.event, self.user.id)
+        
+        response = self.client.get(reverse('waiting_room_status', args=[self.event.id]), {'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'admitted')
+    
+    def test_simulate_waiting_room_command(self):
+        """Test the waiting room load-test command"""
+        out = StringIO()
+        call_command('simulate_waiting_room', self.event.id, buyers=50, workers=4, stdout=out)
+        
+        self.assertIn('busiest second admits 2', out.getvalue())
+        self.assertIn('Admission rate respected', out.getvalue())
+
+
+class HomeFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='organizerpass123'
+        )
+        
+        self.category = EventCategory.objects.create(
+            name="Festival",
+            description="Outdoor festivals"
+        )
+        
+        self.event = Event.objects.create(
+            title="Summer Festival",
+            description="Music all weekend",
+            category=self.category,
+            organizer=self.organizer,
+            location="Park",
+            start_date=timezone.now() + timedelta(days=3),
+            end_date=timezone.now() + timedelta(days=4),
+            status="published"
+        )
+    
+    def test_cached_home_page_runs_no_queries(self):
+        """Test that a warm home page is rendered without hitting the database"""
+        self.client.get(reverse('home'))
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        
+        self.assertContains(response, 'Summer Festival')
+        self.assertContains(response, 'Festival')
+    
+    def test_trending_events_shown(self):
+        """Test that events with recent sales are listed as trending"""
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'Trending Now')
+        
+        cache.clear()
+        record_ticket_sales(self.event.id, 3)
+        response = self.client.get(reverse('home'))
+        
+        self.assertContains(response, 'Trending Now')
+        self.assertContains(response, '3 tickets sold recently')
+    
+    def test_event_changes_refresh_feed(self):
+        """Test that saving an event invalidates the cached feed"""
+        self.client.get(reverse('home'))
+        
+        self.event.title = "Winter Festival"
+        self.event.save()
+        
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Winter Festival')
+    
+    def test_stale_feed_is_rebuilt(self):
+        """Test that the feed is rebuilt once its refresh interval has passed"""
+        self.client.get(reverse('home'))
+        Event.objects.filter(pk=self.event.pk).update(title="Autumn Festival")
+        
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'Autumn Festival')
+        
+        with patch('events.home_feed.time.time', return_value=time.time() + 3600):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Autumn Festival')
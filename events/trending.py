@@ -0,0 +1,133 @@
+# events/trending.py
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Sum, Value, ExpressionWrapper
+from django.db.models.functions import Power, TruncHour
+from django.utils import timezone
+
+from .models import Event, EventSalesHour
+
+
+def get_half_life_hours():
+    """Hours after which a sale counts half as much towards trending"""
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+
+
+def hour_index(when=None):
+    """Number of whole hours between the Unix epoch and a datetime"""
+    when = when or timezone.now()
+    return int(when.timestamp() // 3600)
+
+
+def record_ticket_sales(event_id, quantity, when=None):
+    """
+    Add confirmed ticket sales to the event's hourly rollup
+
+    Args:
+        event_id: ID of the event the tickets belong to
+        quantity: Number of tickets confirmed
+        when: Time of the sale (defaults to now)
+    """
+    if quantity <= 0:
+        return
+
+    index = hour_index(when)
+    bucket = EventSalesHour.objects.filter(event_id=event_id, hour_index=index)
+
+    if bucket.update(tickets_sold=F('tickets_sold') + quantity):
+        return
+
+    try:
+        with transaction.atomic():
+            EventSalesHour.objects.create(event_id=event_id, hour_index=index, tickets_sold=quantity)
+    except IntegrityError:
+        # Another request created the bucket first
+        bucket.update(tickets_sold=F('tickets_sold') + quantity)
+
+
+def get_trending_events(days=7, min_tickets=5, limit=10, half_life_hours=None):
+    """
+    Get upcoming published events ranked by time-decayed ticket sales
+
+    Each hourly bucket in the window is weighted by 0.5 ** (age / half_life),
+    so the ranking reads at most days * 24 rollup rows per event and never
+    touches the ticket table.
+
+    Returns:
+        list: Events with trending_score and ticket_count (sales in the window)
+    """
+    half_life = float(half_life_hours or get_half_life_hours())
+    current = hour_index()
+
+    weight = Power(
+        Value(0.5),
+        ExpressionWrapper((Value(current) - F('hour_index')) / Value(half_life), output_field=FloatField())
+    )
+
+    scores = EventSalesHour.objects.filter(
+        hour_index__gt=current - days * 24,
+        event__status='published',
+        event__start_date__gte=timezone.now()
+    ).values('event_id').annotate(
+        ticket_count=Sum('tickets_sold'),
+        trending_score=Sum(
+            ExpressionWrapper(F('tickets_sold') * weight, output_field=FloatField())
+        )
+    ).filter(
+        ticket_count__gte=min_tickets
+    ).order_by('-trending_score', 'event_id')
+
+    if limit:
+        scores = scores[:limit]
+    scores = list(scores)
+
+    events = Event.objects.select_related('category').in_bulk([row['event_id'] for row in scores])
+
+    trending = []
+    for row in scores:
+        event = events[row['event_id']]
+        event.ticket_count = row['ticket_count']
+        event.trending_score = row['trending_score']
+        trending.append(event)
+
+    return trending
+
+
+def rebuild_sales_rollup(days=7):
+    """
+    Rebuild the hourly rollup from confirmed ticket rows
+
+    Purchase dates stand in for confirmation times. Buckets older than the
+    window are deleted.
+
+    Returns:
+        int: Number of buckets written
+    """
+    from tickets.models import Ticket
+
+    since = timezone.now() - timedelta(days=days)
+
+    rows = Ticket.objects.filter(
+        status__in=['confirmed', 'used'],
+        purchase_date__gte=since
+    ).annotate(
+        hour=TruncHour('purchase_date')
+    ).values('event_id', 'hour').annotate(
+        total=Count('pk')
+    ).order_by()
+
+    buckets = [
+        EventSalesHour(
+            event_id=row['event_id'],
+            hour_index=hour_index(row['hour']),
+            tickets_sold=row['total']
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        EventSalesHour.objects.all().delete()
+        EventSalesHour.objects.bulk_create(buckets, batch_size=1000)
+
+    return len(buckets)
@@ -2,6 +2,8 @@
 from django.utils import timezone
 from datetime import timedelta
 from .models import Event
+from .search import LOCATION_FIELDS, search_events
+from .trending import get_trending_events as get_trending
 
 def get_upcoming_events(days=30, limit=None):
     """
@@ -21,35 +23,24 @@ def get_upcoming_events(days=30, limit=None):
     
     return events
 
-def get_trending_events(days=7, min_tickets=5):
+def get_trending_events(days=7, min_tickets=5, limit=None):
     """
-    Get trending events based on ticket sales
+    Get trending events based on recent ticket sales
+
+    Reads the hourly sales rollup (see events.trending) instead of counting
+    ticket rows.
     """
-    from django.db.models import Count
-    
-    today = timezone.now()
-    recent_date = today - timedelta(days=days)
-    
-    trending_events = Event.objects.filter(
-        status='published',
-        start_date__gte=today
-    ).annotate(
-        ticket_count=Count('ticket_types__tickets')
-    ).filter(
-        ticket_count__gte=min_tickets,
-        tickets__purchase_date__gte=recent_date
-    ).order_by('-ticket_count')
-    
-    return trending_events
+    return get_trending(days=days, min_tickets=min_tickets, limit=limit)
 
 def get_events_by_location(location_query, limit=None):
     """
     Search events by location
     """
-    events = Event.objects.filter(
-        status='published',
-        location__icontains=location_query,
-        start_date__gte=timezone.now()
+    events = search_events(
+        Event.objects.filter(status='published', start_date__gte=timezone.now()),
+        location_query,
+        fields=LOCATION_FIELDS,
+        rank=False
     ).order_by('start_date')
     
     if limit:
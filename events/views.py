@@ -2,8 +2,15 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from .models import Event, EventCategory
+from tickets.models import Ticket
+from tickets.inventory import release_tickets
+from .notifications import queue_cancellation_notice
+from .search import search_events
+from .trending import get_trending_events
 from .serializers import EventSerializer, EventCategorySerializer
 from .permissions import IsOrganizerOrReadOnly, IsOrganizerOrStaff, CanCreateEvent, CanManageEventCategory
 
@@ -15,6 +22,20 @@ class EventCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = EventCategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, CanManageEventCategory]
 
+class EventSearchFilter(filters.SearchFilter):
+    """
+    ?search= backed by the event full-text index instead of icontains scans
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        
+        # Keep an explicit ?ordering= in charge, otherwise rank best matches first
+        rank = not request.query_params.get(api_settings.ORDERING_PARAM)
+        return search_events(queryset, query, rank=rank)
+
+
 class EventViewSet(viewsets.ModelViewSet):
     """
     API endpoint for events
@@ -22,7 +43,7 @@ class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOrganizerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, EventSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'status', 'start_date', 'location']
     search_fields = ['title', 'description', 'location']
     ordering_fields = ['start_date', 'created_at']
@@ -46,14 +67,36 @@ class EventViewSet(viewsets.ModelViewSet):
         Cancel an event
         """
         event = self.get_object()
-        event.status = 'cancelled'
-        event.save()
-        
-        # Cancel all associated tickets
-        for ticket_type in event.ticket_types.all():
-            ticket_type.tickets.all().update(status='cancelled')
+        with transaction.atomic():
+            event.status = 'cancelled'
+            event.save()
+            
+            # Holders are emailed by the send_event_notifications worker
+            queue_cancellation_notice(event)
+            
+            # Cancel all associated tickets and return their stock
+            release_tickets(Ticket.objects.filter(event=event))
         
         return Response({'status': 'event cancelled'})
+    
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        List upcoming events ranked by recent ticket sales
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        events = get_trending_events(limit=max(limit, 1), min_tickets=1)
+        serializer = self.get_serializer(events, many=True)
+        
+        data = serializer.data
+        for item, event in zip(data, events):
+            item['ticket_count'] = event.ticket_count
+            item['trending_score'] = round(event.trending_score, 2)
+        return Response(data)
         
     def get_queryset(self):
         queryset = Event.objects.all()
@@ -0,0 +1,149 @@
+# events/waiting_room.py
+#
+# Admission queue for high-demand on-sales. Each buyer gets a signed token
+# naming the second at which they may enter checkout. Seconds are handed out
+# with atomic cache increments, at most event.admission_rate tokens per
+# second, so the cache holds one counter per second rather than one entry per
+# buyer, and status polls never touch the database.
+import math
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+TOKEN_SALT = 'events.waiting_room'
+SESSION_KEY = 'waiting_room_tokens'
+
+# Keep admission counters around a little after their second has passed
+SLOT_GRACE_SECONDS = 60
+
+# Times an admission counter may vanish under incr() before giving up
+MAX_INCR_ATTEMPTS = 3
+
+
+class WaitingRoomUnavailable(RuntimeError):
+    """Raised when the cache keeps losing the admission counters"""
+
+
+def _slot_key(event_id, second):
+    return f"waiting_room:{event_id}:slot:{second}"
+
+
+def _cursor_key(event_id):
+    return f"waiting_room:{event_id}:cursor"
+
+
+def get_admission_window():
+    """Seconds an admitted buyer may spend in checkout"""
+    return getattr(settings, 'WAITING_ROOM_ADMISSION_WINDOW', 600)
+
+
+def issue_token(event, user_id, now=None):
+    """
+    Queue a buyer for an event
+
+    Args:
+        event: The high-demand Event
+        user_id: ID of the buyer the token is bound to
+        now: Optional reference time (seconds since epoch)
+
+    Returns:
+        str: Signed queue token
+
+    Raises:
+        WaitingRoomUnavailable: If the cache cannot keep an admission counter
+    """
+    now = int(now if now is not None else time.time())
+    rate = max(event.admission_rate, 1)
+
+    # Skip seconds we already know are full
+    second = max(now, cache.get(_cursor_key(event.id), 0))
+
+    attempts = 0
+    while True:
+        key = _slot_key(event.id, second)
+        timeout = second - now + SLOT_GRACE_SECONDS
+        cache.add(key, 0, timeout=timeout)
+        try:
+            admitted = cache.incr(key)
+        except ValueError:
+            # The counter expired or was evicted between add() and incr()
+            attempts += 1
+            if attempts >= MAX_INCR_ATTEMPTS:
+                raise WaitingRoomUnavailable(
+                    f"Admission counter for event {event.id} keeps disappearing from the cache"
+                )
+            continue
+
+        if admitted <= rate:
+            break
+
+        second += 1
+        cache.set(_cursor_key(event.id), second, timeout=second - now + SLOT_GRACE_SECONDS)
+
+    return signing.dumps({'e': event.id, 'u': user_id, 's': second, 'r': rate}, salt=TOKEN_SALT)
+
+
+def read_token(token, event_id):
+    """Return the token payload, or None if it is forged or for another event"""
+    if not token:
+        return None
+
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+
+    if data.get('e') != event_id:
+        return None
+    return data
+
+
+def get_status(token, event_id, user_id=None, now=None):
+    """
+    Describe where a token stands in the queue
+
+    Returns:
+        dict: 'status' is one of waiting, admitted, expired or invalid.
+              Waiting buyers also get an estimated wait and position.
+    """
+    data = read_token(token, event_id)
+    if data is None or (user_id is not None and data['u'] != user_id):
+        return {'status': 'invalid'}
+
+    now = now if now is not None else time.time()
+    wait = data['s'] - now
+
+    if wait > 0:
+        return {
+            'status': 'waiting',
+            'estimated_wait': math.ceil(wait),
+            'position': math.ceil(wait * data['r']),
+            'retry_after': min(math.ceil(wait), 5),
+        }
+
+    if now > data['s'] + get_admission_window():
+        return {'status': 'expired'}
+
+    return {'status': 'admitted'}
+
+
+def get_session_token(request, event_id):
+    """Queue token stored in the session for an event"""
+    return request.session.get(SESSION_KEY, {}).get(str(event_id))
+
+
+def store_session_token(request, event_id, token):
+    tokens = request.session.get(SESSION_KEY, {})
+    tokens[str(event_id)] = token
+    request.session[SESSION_KEY] = tokens
+
+
+def is_admitted(request, event):
+    """Check whether the current user may enter checkout for an event"""
+    if not event.is_high_demand:
+        return True
+
+    token = request.POST.get('queue_token') or get_session_token(request, event.id)
+    status = get_status(token, event.id, user_id=request.user.id)
+    return status['status'] == 'admitted'
@@ -1,5 +1,8 @@
 # payments/admin.py
 from django.contrib import admin
-from .models import Payment
+from .models import OutboxEmail, Payment, ReservationHold, WebhookEvent
 
-admin.site.register(Payment)
\ No newline at end of file
+admin.site.register(Payment)
+admin.site.register(ReservationHold)
+admin.site.register(OutboxEmail)
+admin.site.register(WebhookEvent)
@@ -0,0 +1,267 @@
+# payments/fake_stripe.py
+#
+# A local stand-in for the parts of the Stripe API the site uses, served
+# over real HTTP from a background thread. Point STRIPE_API_BASE at it to
+# exercise or load-test the payment flow without the network: sessions are
+# kept in memory, idempotency keys are honoured like Stripe does, and the
+# checkout URL it returns marks the session paid and redirects back to the
+# site's success URL.
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def decode_form(body):
+    """
+    Decode Stripe's form encoding (line_items[0][quantity]=2) into dicts and lists
+
+    Args:
+        body: The url-encoded request body
+
+    Returns:
+        dict: The decoded parameters
+    """
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = key.replace(']', '').split('[')
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return _as_lists(params)
+
+
+def _as_lists(value):
+    if not isinstance(value, dict):
+        return value
+    if value and all(key.isdigit() for key in value):
+        return [_as_lists(value[key]) for key in sorted(value, key=int)]
+    return {key: _as_lists(item) for key, item in value.items()}
+
+
+def _new_id(prefix):
+    return f"{prefix}_test_{secrets.token_hex(12)}"
+
+
+class FakeStripeServer:
+    """
+    In-process fake of the Stripe API
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on (0 picks a free one)
+        latency: Seconds added to every API response, to mimic the network
+
+    Usage:
+        with FakeStripeServer() as fake:
+            with override_settings(STRIPE_API_BASE=fake.url):
+                ...
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0):
+        self.latency = latency
+        self.sessions = {}
+        self.payment_intents = {}
+        self.refunds = {}
+        # Responses already given, by idempotency key
+        self.idempotent_responses = {}
+        # (method, path, idempotency key) of every API call, for assertions
+        self.requests = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=500):
+        """Answer the next count API calls with an error status, e.g. to test retries"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def complete_session(self, session_id):
+        """Mark a checkout session paid, as if the buyer entered a card"""
+        with self._lock:
+            session = self.sessions[session_id]
+            if session['payment_status'] != 'paid':
+                intent = self._create_payment_intent({
+                    'amount': session['amount_total'],
+                    'currency': session['currency'],
+                    'metadata': session['metadata'],
+                })
+                intent['status'] = 'succeeded'
+                session.update(status='complete', payment_status='paid', payment_intent=intent['id'])
+            return session
+
+    def expire_session(self, session_id):
+        """Expire an unpaid checkout session, as if the buyer walked away"""
+        with self._lock:
+            session = self.sessions[session_id]
+            if session['payment_status'] != 'paid':
+                session.update(status='expired', url=None)
+            return session
+
+    # API objects
+
+    def _create_session(self, params):
+        session_id = _new_id('cs')
+        line_items = params.get('line_items', [])
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'url': f"{self.url}/pay/{session_id}",
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'mode': params.get('mode'),
+            'client_reference_id': params.get('client_reference_id'),
+            'customer_email': params.get('customer_email'),
+            'metadata': params.get('metadata', {}),
+            'success_url': params.get('success_url'),
+            'cancel_url': params.get('cancel_url'),
+            'expires_at': int(params['expires_at']) if 'expires_at' in params else int(time.time()) + 24 * 60 * 60,
+            'currency': line_items[0]['price_data']['currency'] if line_items else 'usd',
+            'amount_total': sum(
+                int(item['price_data']['unit_amount']) * int(item['quantity']) for item in line_items
+            ),
+            'payment_intent': None,
+        }
+        self.sessions[session_id] = session
+        return session
+
+    def _create_payment_intent(self, params):
+        intent_id = _new_id('pi')
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': int(params['amount']),
+            'currency': params.get('currency', 'usd'),
+            'metadata': params.get('metadata', {}),
+            'status': 'requires_payment_method',
+            'client_secret': f"{intent_id}_secret_{secrets.token_hex(8)}",
+        }
+        self.payment_intents[intent_id] = intent
+        return intent
+
+    def _create_refund(self, params):
+        intent = self.payment_intents.get(params.get('payment_intent'))
+        if intent is None:
+            return None
+        refund = {
+            'id': _new_id('re'),
+            'object': 'refund',
+            'payment_intent': intent['id'],
+            'amount': intent['amount'],
+            'reason': params.get('reason'),
+            'status': 'succeeded',
+        }
+        self.refunds[refund['id']] = refund
+        return refund
+
+    def _handle(self, method, path, params, idempotency_key):
+        """Answer an API call; returns (status, body)"""
+        if self._failures:
+            return self._failures.pop(0), {'error': {'type': 'api_error', 'message': 'Injected failure'}}
+
+        if method == 'POST' and idempotency_key in self.idempotent_responses:
+            return self.idempotent_responses[idempotency_key]
+
+        parts = path.strip('/').split('/')
+        result = None
+        if method == 'POST' and parts == ['v1', 'checkout', 'sessions']:
+            result = self._create_session(params)
+        elif method == 'GET' and parts[:3] == ['v1', 'checkout', 'sessions'] and len(parts) == 4:
+            result = self.sessions.get(parts[3])
+        elif method == 'POST' and parts == ['v1', 'payment_intents']:
+            result = self._create_payment_intent(params)
+        elif method == 'POST' and parts == ['v1', 'refunds']:
+            result = self._create_refund(params)
+        elif method == 'GET' and parts[:2] == ['v1', 'payment_methods'] and len(parts) == 3:
+            result = {
+                'id': parts[2],
+                'object': 'payment_method',
+                'type': 'card',
+                'card': {'brand': 'visa', 'last4': '4242', 'exp_month': 12, 'exp_year': 2030},
+            }
+
+        if result is None:
+            response = 404, {'error': {'type': 'invalid_request_error', 'message': f"No such resource: {path}"}}
+        else:
+            response = 200, result
+        if method == 'POST' and idempotency_key:
+            self.idempotent_responses[idempotency_key] = response
+        return response
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _api(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                url = urlsplit(self.path)
+                body = self.rfile.read(length).decode() if length else url.query
+                key = self.headers.get('Idempotency-Key')
+
+                if fake.latency:
+                    time.sleep(fake.latency)
+                with fake._lock:
+                    fake.requests.append((method, url.path, key))
+                    status, payload = fake._handle(method, url.path, decode_form(body), key)
+                self._respond(status, payload)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.startswith('/pay/'):
+                    # The hosted checkout page: pay at once and go back to the site
+                    session_id = url.path.rsplit('/', 1)[-1]
+                    if session_id not in fake.sessions:
+                        return self._respond(404, {'error': {'message': 'No such session'}})
+                    session = fake.complete_session(session_id)
+                    success_url = session['success_url'].replace('{CHECKOUT_SESSION_ID}', session_id)
+                    self.send_response(303)
+                    self.send_header('Location', success_url)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self._api('GET')
+
+            def do_POST(self):
+                self._api('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,95 @@
+# payments/gateway.py
+#
+# Stripe API access. The process shares one StripeGateway whose client
+# sends every call through a pooled requests session, so calls reuse open
+# connections instead of paying a TLS handshake each time. Every call has a
+# connect and read timeout, and the SDK retries network errors and
+# 409/429/5xx answers with the same idempotency key. Set STRIPE_API_BASE to
+# the fake server in payments/fake_stripe.py to run payments offline.
+import threading
+import uuid
+import requests
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+_gateway = None
+_lock = threading.Lock()
+
+
+class StripeGateway:
+    """
+    Thin wrapper around the Stripe calls the site makes
+
+    Args:
+        api_key: Stripe secret key
+        api_base: Base URL of the API (Stripe's by default)
+        connect_timeout: Seconds to wait for a connection
+        read_timeout: Seconds to wait for a response
+        max_retries: Retries of a call after a network error or retryable status
+        pool_size: Connections kept open to the API
+    """
+
+    def __init__(self, api_key, api_base=None, connect_timeout=5, read_timeout=30, max_retries=2, pool_size=10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.client = stripe.StripeClient(
+            api_key,
+            base_addresses={'api': api_base} if api_base else {},
+            max_network_retries=max_retries,
+            http_client=stripe.RequestsClient(timeout=(connect_timeout, read_timeout), session=self.session),
+        )
+
+    def _options(self, idempotency_key):
+        # Retries of a POST must reuse its key so Stripe applies it once
+        return {'idempotency_key': idempotency_key or str(uuid.uuid4())}
+
+    def create_checkout_session(self, params, idempotency_key=None):
+        return self.client.checkout.sessions.create(params=params, options=self._options(idempotency_key))
+
+    def retrieve_checkout_session(self, session_id):
+        return self.client.checkout.sessions.retrieve(session_id)
+
+    def create_payment_intent(self, params, idempotency_key=None):
+        return self.client.payment_intents.create(params=params, options=self._options(idempotency_key))
+
+    def create_refund(self, params, idempotency_key=None):
+        return self.client.refunds.create(params=params, options=self._options(idempotency_key))
+
+    def retrieve_payment_method(self, payment_method_id):
+        return self.client.payment_methods.retrieve(payment_method_id)
+
+    def close(self):
+        self.session.close()
+
+
+def get_gateway():
+    """The process-wide gateway, built from the STRIPE_* settings on first use"""
+    global _gateway
+    with _lock:
+        if _gateway is None:
+            _gateway = StripeGateway(
+                settings.STRIPE_SECRET_KEY,
+                api_base=getattr(settings, 'STRIPE_API_BASE', '') or None,
+                connect_timeout=getattr(settings, 'STRIPE_CONNECT_TIMEOUT', 5),
+                read_timeout=getattr(settings, 'STRIPE_READ_TIMEOUT', 30),
+                max_retries=getattr(settings, 'STRIPE_MAX_NETWORK_RETRIES', 2),
+                pool_size=getattr(settings, 'STRIPE_HTTP_POOL_SIZE', 10),
+            )
+        return _gateway
+
+
+@receiver(setting_changed)
+def _reset_gateway(setting, **kwargs):
+    # Rebuild the gateway when tests override a Stripe setting
+    global _gateway
+    if setting.startswith('STRIPE_'):
+        with _lock:
+            if _gateway is not None:
+                _gateway.close()
+            _gateway = None
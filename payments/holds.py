@@ -0,0 +1,111 @@
+# payments/holds.py
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from .models import Payment, ReservationHold
+from tickets.models import Ticket
+from tickets.inventory import release_tickets
+
+logger = logging.getLogger(__name__)
+
+
+def get_hold_duration(minutes=None):
+    """Return the hold TTL as a timedelta"""
+    if minutes is None:
+        minutes = getattr(settings, 'RESERVATION_HOLD_MINUTES', 30)
+    return timedelta(minutes=minutes)
+
+
+def place_hold(payment, minutes=None):
+    """
+    Start the reservation hold for a pending payment's tickets
+
+    Args:
+        payment: The pending Payment object
+        minutes: Optional TTL override in minutes
+
+    Returns:
+        The ReservationHold object
+    """
+    hold, _ = ReservationHold.objects.update_or_create(
+        payment=payment,
+        defaults={'expires_at': timezone.now() + get_hold_duration(minutes)},
+    )
+    return hold
+
+
+def extend_hold(payment, minutes=None):
+    """
+    Push back the expiry of a payment's hold, never shortening it
+
+    Returns:
+        The new expiry datetime, or None if the payment has no hold
+    """
+    expires_at = timezone.now() + get_hold_duration(minutes)
+    ReservationHold.objects.filter(
+        payment=payment,
+        expires_at__lt=expires_at
+    ).update(expires_at=expires_at)
+
+    return ReservationHold.objects.filter(payment=payment).values_list(
+        'expires_at', flat=True
+    ).first()
+
+
+def release_expired_holds(batch_size=500, now=None):
+    """
+    Release the stock of pending payments whose hold has expired
+
+    Walks the expires_at index one batch at a time. Payments still pending
+    are cancelled and their tickets released; holds on payments that moved on
+    (completed, offline processing, ...) are simply dropped.
+
+    Args:
+        batch_size: Maximum number of holds handled per batch
+        now: Reference time (defaults to timezone.now())
+
+    Returns:
+        tuple: (holds processed, payments cancelled)
+    """
+    now = now or timezone.now()
+    processed = 0
+    cancelled = 0
+
+    while True:
+        batch = list(
+            ReservationHold.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', 'payment_id')[:batch_size]
+        )
+        if not batch:
+            break
+
+        hold_ids = [hold_id for hold_id, _ in batch]
+        payment_ids = [payment_id for _, payment_id in batch]
+
+        with transaction.atomic():
+            pending_ids = list(
+                Payment.objects.select_for_update()
+                .filter(pk__in=payment_ids, payment_status='pending')
+                .values_list('pk', flat=True)
+            )
+
+            if pending_ids:
+                Payment.objects.filter(pk__in=pending_ids).update(payment_status='cancelled')
+                release_tickets(Ticket.objects.filter(payments__in=pending_ids))
+
+            ReservationHold.objects.filter(pk__in=hold_ids).delete()
+
+        processed += len(hold_ids)
+        cancelled += len(pending_ids)
+
+        if len(batch) < batch_size:
+            break
+
+    if cancelled:
+        logger.info(f"Released {cancelled} expired reservation holds")
+
+    return processed, cancelled
@@ -0,0 +1,33 @@
+# payments/management/commands/process_webhook_events.py
+import time
+from django.core.management.base import BaseCommand
+from payments.webhooks import process_webhook_events, retry_failed_webhook_events
+
+class Command(BaseCommand):
+    help = 'Handle stored Stripe webhook events in the order Stripe created them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events handled per batch')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and check for events every N seconds (0 runs once)'
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='Queue failed events again first')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            queued = retry_failed_webhook_events()
+            self.stdout.write(f"Queued {queued} failed event(s) again.")
+        
+        while True:
+            processed, failed = process_webhook_events(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Processed {processed} webhook event(s), {failed} failed."
+            ))
+            
+            # Drain a backlog before sleeping
+            if processed + failed == options['batch_size']:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
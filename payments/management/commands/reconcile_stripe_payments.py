@@ -0,0 +1,34 @@
+# payments/management/commands/reconcile_stripe_payments.py
+import time
+from django.core.management.base import BaseCommand
+from payments.reconcile import reconcile_stripe_payments
+
+class Command(BaseCommand):
+    help = 'Settle stale pending Stripe payments from their checkout sessions, e.g. after lost webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=None,
+            help='Check payments left unsettled for longer than this'
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Payments looked up per batch')
+        parser.add_argument('--workers', type=int, default=None, help='Concurrent Stripe lookups')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and reconcile every N seconds (0 runs once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            checked, completed, cancelled = reconcile_stripe_payments(
+                stale_minutes=options['stale_minutes'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Checked {checked} payment(s): {completed} completed, {cancelled} cancelled."
+            ))
+            
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
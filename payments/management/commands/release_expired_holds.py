@@ -0,0 +1,25 @@
+# payments/management/commands/release_expired_holds.py
+import time
+from django.core.management.base import BaseCommand
+from payments.holds import release_expired_holds
+
+class Command(BaseCommand):
+    help = 'Cancel pending payments whose reservation hold expired and release their tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Holds processed per batch')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and sweep every N seconds (0 runs once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed, cancelled = release_expired_holds(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Processed {processed} expired hold(s), released {cancelled} pending payment(s)."
+            ))
+            
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+# payments/management/commands/run_fake_stripe.py
+import time
+from django.core.management.base import BaseCommand
+from payments.fake_stripe import FakeStripeServer
+
+class Command(BaseCommand):
+    help = 'Serve a local fake of the Stripe API for offline development and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+        parser.add_argument('--port', type=int, default=12111, help='Port to listen on')
+        parser.add_argument('--latency', type=float, default=0, help='Seconds added to every API response')
+
+    def handle(self, *args, **options):
+        fake = FakeStripeServer(host=options['host'], port=options['port'], latency=options['latency'])
+        fake.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Stripe API listening on {fake.url}; run the site with STRIPE_API_BASE={fake.url}"
+        ))
+        
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake.stop()
+            self.stdout.write(
+                f"Served {len(fake.requests)} request(s), {len(fake.sessions)} checkout session(s)."
+            )
@@ -0,0 +1,28 @@
+# payments/management/commands/send_outbox.py
+import time
+from django.core.management.base import BaseCommand
+from payments.outbox import send_outbox
+
+class Command(BaseCommand):
+    help = 'Send queued payment emails over one SMTP connection per batch, retrying failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Emails sent per batch')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and send every N seconds (0 runs once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_outbox(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {sent} email(s), {failed} failed."
+            ))
+            
+            # Drain a backlog before sleeping
+            if sent + failed == options['batch_size']:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_payment_stripe_customer_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_hold', to='payments.payment')),
+            ],
+        ),
+    ]
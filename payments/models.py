@@ -1,6 +1,7 @@
 # payments/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from tickets.models import Ticket
 import uuid
 
@@ -35,4 +36,102 @@ class Payment(models.Model):
     approval_date = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
-        return f"Payment {self.transaction_id} - {self.user.username}"
\ No newline at end of file
+        return f"Payment {self.transaction_id} - {self.user.username}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        payment = super().from_db(db, field_names, values)
+        # The stored status, so post_save can tell a real status change from a resave
+        payment._saved_status = values[field_names.index('payment_status')] if 'payment_status' in field_names else None
+        return payment
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_status = self.payment_status
+    
+    class Meta:
+        indexes = [
+            # Offline payments awaiting approval
+            models.Index(fields=['payment_method', 'payment_status'], name='payment_method_status_idx'),
+            # Stripe webhook lookups
+            models.Index(fields=['stripe_payment_intent'], name='payment_intent_idx'),
+            # Admin payment list, newest first
+            models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ]
+
+class ReservationHold(models.Model):
+    """Time-limited claim on the stock held by a pending payment's tickets"""
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='reservation_hold')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Hold for payment {self.payment_id} until {self.expires_at}"
+
+class OutboxEmail(models.Model):
+    """An email about a payment, waiting to be sent by the outbox worker"""
+    KIND_CHOICES = (
+        ('order_confirmation', 'Order Confirmation'),
+    )
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='emails')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set while a worker is sending the email
+    claim_token = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for payment {self.payment_id} ({self.status})"
+    
+    class Meta:
+        constraints = [
+            # Each payment gets each kind of email once
+            models.UniqueConstraint(fields=['payment', 'kind'], name='outbox_email_once'),
+        ]
+        indexes = [
+            # Due emails, oldest first
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+class WebhookEvent(models.Model):
+    """
+    A Stripe webhook event, stored on receipt and handled by the
+    process_webhook_events worker, see payments/webhooks.py
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    )
+    
+    # Stripe's event id; a redelivered event is not stored twice
+    stripe_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    # The raw request body, so an event can be replayed exactly as received
+    payload = models.TextField()
+    # When Stripe created the event; events are handled in this order
+    occurred_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"{self.type} {self.stripe_id} ({self.status})"
+    
+    class Meta:
+        indexes = [
+            # Pending events, in the order Stripe created them
+            models.Index(fields=['status', 'occurred_at'], name='webhook_event_due_idx'),
+        ]
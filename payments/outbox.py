@@ -0,0 +1,194 @@
+# payments/outbox.py
+#
+# Transactional outbox for payment emails. The payment completion paths
+# only insert an OutboxEmail row next to the status change; the send_outbox
+# worker renders and delivers due emails over a single SMTP connection and
+# retries failures with exponential backoff.
+import random
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+import logging
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold a claimed email before another may retry it
+CLAIM_SECONDS = 5 * 60
+
+
+def queue_order_confirmation(payment):
+    """
+    Queue the confirmation email for a completed payment
+
+    Called by the payment completion paths after confirm_tickets(), inside
+    their transaction, so the email is queued exactly when the payment is.
+    Queuing the same payment again does nothing.
+
+    Args:
+        payment: The completed Payment object
+
+    Returns:
+        The OutboxEmail object
+    """
+    email, _ = OutboxEmail.objects.get_or_create(payment=payment, kind='order_confirmation')
+    return email
+
+
+def queue_order_confirmations(payment_ids):
+    """
+    Queue the confirmation emails of many completed payments in one INSERT
+
+    Payments that already have one queued are skipped.
+
+    Args:
+        payment_ids: Ids of completed payments
+    """
+    OutboxEmail.objects.bulk_create(
+        [OutboxEmail(payment_id=payment_id, kind='order_confirmation') for payment_id in payment_ids],
+        ignore_conflicts=True
+    )
+
+
+def get_retry_delay(attempts):
+    """Backoff before the next attempt: doubling from OUTBOX_RETRY_SECONDS, capped, with jitter"""
+    base = getattr(settings, 'OUTBOX_RETRY_SECONDS', 60)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'OUTBOX_MAX_RETRY_SECONDS', 6 * 60 * 60))
+    return timedelta(seconds=delay + random.uniform(0, base))
+
+
+def build_order_confirmation(email):
+    """
+    Render one email listing every confirmed ticket of the payment
+
+    Returns:
+        EmailMultiAlternatives, or None if there is nothing to send
+    """
+    payment = email.payment
+    user = payment.user
+    tickets = list(
+        payment.tickets.filter(user=user, status__in=('confirmed', 'used'))
+        .select_related('ticket_type__event')
+        .order_by('ticket_type__event__start_date', 'ticket_type__name', 'pk')
+    )
+    if not tickets or not user.email:
+        return None
+
+    site_url = settings.SITE_URL.rstrip('/')
+    events = list({ticket.ticket_type.event.pk: ticket.ticket_type.event for ticket in tickets}.values())
+    context = {
+        'user': user,
+        'payment': payment,
+        'tickets': tickets,
+        'events': events,
+        'site_url': site_url,
+        'my_tickets_url': f"{site_url}{reverse('my_tickets')}",
+    }
+
+    if len(events) == 1:
+        subject = f"Your tickets for {events[0].title} are confirmed!"
+    else:
+        subject = f"Your {len(tickets)} tickets are confirmed!"
+
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=render_to_string('tickets/emails/order_confirmed.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+    message.attach_alternative(render_to_string('tickets/emails/order_confirmed.html', context), 'text/html')
+    return message
+
+
+BUILDERS = {
+    'order_confirmation': build_order_confirmation,
+}
+
+
+def _schedule_retry(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    email.claim_token = None
+    if email.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8):
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.pk} after {email.attempts} attempts: {error}")
+    else:
+        email.next_attempt_at = now + get_retry_delay(email.attempts)
+        logger.warning(f"Email {email.pk} failed (attempt {email.attempts}), retrying: {error}")
+    email.save(update_fields=['attempts', 'last_error', 'claim_token', 'status', 'next_attempt_at'])
+
+
+def send_outbox(batch_size=100, now=None):
+    """
+    Send due outbox emails over one SMTP connection
+
+    Due emails are claimed with a conditional UPDATE that also pushes back
+    their next attempt, so several workers can run side by side and an
+    email claimed by a worker that died is picked up again later.
+
+    Args:
+        batch_size: Maximum number of emails to send
+        now: Optional current time (defaults to timezone.now())
+
+    Returns:
+        tuple: (sent, failed) counts for this batch
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4()
+
+    due_ids = list(
+        OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not due_ids:
+        return 0, 0
+
+    OutboxEmail.objects.filter(
+        pk__in=due_ids,
+        status='pending',
+        next_attempt_at__lte=now
+    ).update(claim_token=token, next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS))
+
+    emails = list(OutboxEmail.objects.filter(claim_token=token).select_related('payment__user'))
+    if not emails:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            _schedule_retry(email, e, now)
+        return 0, len(emails)
+
+    sent_ids = []
+    skipped_ids = []
+    failed = 0
+    try:
+        for email in emails:
+            try:
+                message = BUILDERS[email.kind](email)
+                if message is None:
+                    skipped_ids.append(email.pk)
+                    continue
+                message.connection = connection
+                connection.send_messages([message])
+            except Exception as e:
+                _schedule_retry(email, e, now)
+                failed += 1
+            else:
+                sent_ids.append(email.pk)
+    finally:
+        connection.close()
+
+    OutboxEmail.objects.filter(pk__in=sent_ids).update(status='sent', sent_at=timezone.now(), claim_token=None)
+    OutboxEmail.objects.filter(pk__in=skipped_ids).update(
+        status='failed', claim_token=None, last_error='No confirmed tickets or no email address'
+    )
+    return len(sent_ids), failed + len(skipped_ids)
@@ -3,15 +3,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponseBadRequest
-from django.db import transaction
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
 
 from .models import Payment
-from tickets.models import Ticket, TicketType
+from tickets.inventory import release_tickets
+from tickets.purchase import process_ticket_purchase
 from events.models import Event
-import uuid
+from events import waiting_room
 import json
 
 @login_required
@@ -23,6 +23,11 @@ def create_payment(request):
     event_id = request.POST.get('event_id')
     event = get_object_or_404(Event, id=event_id, status='published')
     
+    # High-demand events only let admitted buyers through to checkout
+    if not waiting_room.is_admitted(request, event):
+        messages.info(request, "This event is in high demand. Please wait for your turn to check out.")
+        return redirect('waiting_room', event_id=event.id)
+    
     # Parse ticket quantities from the form
     ticket_selections = {}
     for key, value in request.POST.items():
@@ -35,48 +40,15 @@ def create_payment(request):
         return redirect('event_detail', event_id=event_id)
     
     try:
-        with transaction.atomic():
-            # Calculate total amount and validate availability
-            total_amount = 0
-            tickets_to_create = []
-            
-            for ticket_type_id, quantity in ticket_selections.items():
-                ticket_type = get_object_or_404(TicketType, id=ticket_type_id)
-                
-                # Validate availability
-                if ticket_type.quantity_available > 0:
-                    sold_tickets = ticket_type.tickets.count()
-                    remaining = ticket_type.quantity_available - sold_tickets
-                    
-                    if quantity > remaining:
-                        messages.error(request, f"Only {remaining} tickets available for {ticket_type.name}.")
-                        return redirect('event_detail', event_id=event_id)
-                
-                total_amount += ticket_type.price * quantity
-                tickets_to_create.append((ticket_type, quantity))
-            
-            # Create payment
-            payment = Payment.objects.create(
-                user=request.user,
-                amount=total_amount,
-                payment_method='pending',  # Will be selected in checkout
-                payment_status='pending'
-            )
-            
-            # Create tickets and link to payment
-            for ticket_type, quantity in tickets_to_create:
-                for _ in range(quantity):
-                    ticket = Ticket.objects.create(
-                        ticket_type=ticket_type,
-                        user=request.user,
-                        status='pending',
-                        ticket_code=uuid.uuid4()
-                    )
-                    payment.tickets.add(ticket)
-            
-            # Redirect to payment selection page
-            return redirect('select_payment_method', payment_id=payment.id)
-            
+        # Create payment and tickets; payment method will be selected in checkout
+        payment, _ = process_ticket_purchase(request.user, ticket_selections, 'pending')
+        
+        # Redirect to payment selection page
+        return redirect('select_payment_method', payment_id=payment.id)
+    
+    except ValueError as e:
+        messages.error(request, f"{e}.")
+        return redirect('event_detail', event_id=event_id)
     except Exception as e:
         messages.error(request, f"Error creating payment: {str(e)}")
         return redirect('event_detail', event_id=event_id)
@@ -188,12 +160,10 @@ def payment_success(request, payment_id):
     
     # Update payment status
     if payment.payment_status == 'pending':
+        # Saving the completed payment confirms its tickets, see tickets/signals.py
         payment.payment_status = 'completed'
         payment.save()
         
-        # Update all tickets to confirmed
-        payment.tickets.update(status='confirmed')
-        
         messages.success(request, "Payment successful! Your tickets have been confirmed.")
     
     return render(request, 'payments/payment_success.html', {
@@ -210,8 +180,8 @@ def payment_cancel(request, payment_id):
         payment.payment_status = 'cancelled'
         payment.save()
         
-        # Update all tickets to cancelled
-        payment.tickets.update(status='cancelled')
+        # Cancel all tickets and return their stock
+        release_tickets(payment.tickets.all())
         
         messages.warning(request, "Payment was cancelled. Your tickets have been cancelled.")
     
@@ -239,7 +209,9 @@ def admin_approve_payment(request, payment_id):
     
     payment = get_object_or_404(Payment, id=payment_id)
     
-    if request.method == 'POST':
+    if request.method == 'POST' and payment.payment_status in ('completed', 'refunded'):
+        messages.error(request, f"Payment {payment.transaction_id} has already been {payment.payment_status}.")
+    elif request.method == 'POST':
         action = request.POST.get('action')
         
         if action == 'approve':
@@ -247,18 +219,16 @@ def admin_approve_payment(request, payment_id):
             payment.is_offline_approved = True
             payment.approved_by = request.user
             payment.approval_date = timezone.now()
+            # Saving the completed payment confirms its tickets, see tickets/signals.py
             payment.save()
             
-            # Update tickets to confirmed
-            payment.tickets.update(status='confirmed')
-            
             messages.success(request, f"Payment {payment.transaction_id} has been approved.")
         elif action == 'reject':
             payment.payment_status = 'failed'
             payment.save()
             
-            # Update tickets to cancelled
-            payment.tickets.update(status='cancelled')
+            # Cancel tickets and return their stock
+            release_tickets(payment.tickets.all())
             
             messages.warning(request, f"Payment {payment.transaction_id} has been rejected.")
     
@@ -295,12 +265,13 @@ def validate_stripe_payment(request):
             payment_id = data.get('payment_id')
             
             payment = get_object_or_404(Payment, id=payment_id, user=request.user)
+            if payment.payment_status in ('completed', 'refunded'):
+                raise ValueError(f"Payment has already been {payment.payment_status}")
             
             # Here you would verify with Stripe API
             # For now, we'll simulate success
             payment.payment_status = 'completed'
             payment.save()
-            payment.tickets.update(status='confirmed')
             
             return JsonResponse({
                 'success': True,
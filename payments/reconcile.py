@@ -0,0 +1,137 @@
+# payments/reconcile.py
+#
+# Catch-up for Stripe payments whose webhook never arrived. Stale unsettled
+# payments with a checkout session are looked up on Stripe a batch at a
+# time, several sessions at once over the gateway's connection pool, and
+# the outcomes of a batch are written back with a few bulk statements.
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from .gateway import get_gateway
+from .models import Payment
+from .outbox import queue_order_confirmations
+from tickets.inventory import confirm_tickets, release_tickets
+from tickets.models import Ticket
+
+logger = logging.getLogger(__name__)
+
+# Payments that may still be paid or abandoned on Stripe
+UNSETTLED_STATUSES = ('pending', 'processing')
+
+
+def _fetch_session(session_id):
+    try:
+        return get_gateway().retrieve_checkout_session(session_id)
+    except stripe.error.StripeError as e:
+        logger.warning(f"Could not retrieve checkout session {session_id}: {e}")
+        return None
+
+
+def apply_session_outcomes(paid, expired):
+    """
+    Settle payments in bulk from what Stripe reported
+
+    Payments that were settled meanwhile (e.g. by the webhook worker) are
+    left alone.
+
+    Args:
+        paid: Dict of payment id to Stripe payment intent id, for paid sessions
+        expired: Payment ids whose session expired unpaid
+
+    Returns:
+        tuple: (payments completed, payments cancelled)
+    """
+    with transaction.atomic():
+        completed_ids = list(
+            Payment.objects.select_for_update()
+            .filter(pk__in=list(paid), payment_status__in=UNSETTLED_STATUSES)
+            .values_list('pk', flat=True)
+        )
+        if completed_ids:
+            Payment.objects.bulk_update(
+                [
+                    Payment(pk=pk, payment_status='completed', stripe_payment_intent=paid[pk])
+                    for pk in completed_ids
+                ],
+                ['payment_status', 'stripe_payment_intent']
+            )
+            confirm_tickets(Ticket.objects.filter(payments__in=completed_ids))
+            queue_order_confirmations(completed_ids)
+
+        cancelled_ids = list(
+            Payment.objects.select_for_update()
+            .filter(pk__in=expired, payment_status__in=UNSETTLED_STATUSES)
+            .values_list('pk', flat=True)
+        )
+        if cancelled_ids:
+            Payment.objects.filter(pk__in=cancelled_ids).update(payment_status='cancelled')
+            release_tickets(Ticket.objects.filter(payments__in=cancelled_ids))
+
+    return len(completed_ids), len(cancelled_ids)
+
+
+def reconcile_stripe_payments(stale_minutes=None, batch_size=100, workers=None, now=None):
+    """
+    Settle stale Stripe payments from the state of their checkout sessions
+
+    Args:
+        stale_minutes: Age after which an unsettled payment is checked
+            (STRIPE_RECONCILE_AFTER_MINUTES by default)
+        batch_size: Payments looked up per batch
+        workers: Concurrent Stripe lookups (STRIPE_HTTP_POOL_SIZE by default)
+        now: Reference time (defaults to timezone.now())
+
+    Returns:
+        tuple: (payments checked, completed, cancelled)
+    """
+    now = now or timezone.now()
+    if stale_minutes is None:
+        stale_minutes = getattr(settings, 'STRIPE_RECONCILE_AFTER_MINUTES', 10)
+    if workers is None:
+        workers = getattr(settings, 'STRIPE_HTTP_POOL_SIZE', 10)
+
+    stale = Payment.objects.filter(
+        payment_status__in=UNSETTLED_STATUSES,
+        payment_date__lte=now - timedelta(minutes=stale_minutes),
+        stripe_session_id__gt=''
+    )
+
+    checked = completed = cancelled = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(
+                stale.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'stripe_session_id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            paid = {}
+            expired = []
+            sessions = pool.map(_fetch_session, [session_id for _, session_id in batch])
+            for (payment_id, _), session in zip(batch, sessions):
+                if session is None:
+                    continue
+                if session.get('payment_status') == 'paid':
+                    paid[payment_id] = session.get('payment_intent')
+                elif session.get('status') == 'expired':
+                    expired.append(payment_id)
+
+            batch_completed, batch_cancelled = apply_session_outcomes(paid, expired)
+            checked += len(batch)
+            completed += batch_completed
+            cancelled += batch_cancelled
+
+            if len(batch) < batch_size:
+                break
+
+    if completed or cancelled:
+        logger.info(f"Reconciled Stripe payments: {completed} completed, {cancelled} cancelled")
+
+    return checked, completed, cancelled
@@ -1,7 +1,11 @@
 # payments/stripe_utils.py
+import math
 import stripe
 from django.conf import settings
+from django.db.models import Count
+from .gateway import get_gateway
 from .models import Payment
+from .holds import extend_hold
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,6 +13,51 @@ logger = logging.getLogger(__name__)
 # Configure Stripe with your API key
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Shortest lifetime Stripe accepts for a checkout session
+STRIPE_MIN_SESSION_MINUTES = 30
+
+# Extra time on top of it so request latency cannot take expires_at under the minimum
+STRIPE_SESSION_MARGIN_MINUTES = 5
+
+def build_line_items(payment):
+    """
+    Stripe line items for a payment, one per ticket type, from one grouped query
+    
+    Args:
+        payment: The Payment object
+        
+    Returns:
+        list: Line items for a checkout session
+    """
+    groups = (
+        payment.tickets.order_by('ticket_type_id')
+        .values(
+            'ticket_type_id', 'ticket_type__name', 'ticket_type__description', 'ticket_type__price',
+            'event_id', 'event__title'
+        )
+        .annotate(quantity=Count('pk'))
+    )
+    
+    line_items = []
+    for group in groups:
+        event_title = group['event__title']
+        line_items.append({
+            'price_data': {
+                'currency': 'usd',
+                'product_data': {
+                    'name': f"{event_title} - {group['ticket_type__name']}",
+                    'description': group['ticket_type__description'] or f"Ticket for {event_title}",
+                    'metadata': {
+                        'event_id': str(group['event_id']),
+                        'ticket_type_id': str(group['ticket_type_id']),
+                    }
+                },
+                'unit_amount': int(group['ticket_type__price'] * 100),  # Convert to cents
+            },
+            'quantity': group['quantity'],
+        })
+    return line_items
+
 def create_checkout_session(payment, success_url, cancel_url):
     """
     Create a Stripe checkout session for a payment
@@ -22,57 +71,37 @@ def create_checkout_session(payment, success_url, cancel_url):
         The checkout session URL or None if failed
     """
     try:
-        # Get tickets from the payment
-        line_items = []
-        
-        # Group tickets by type for better display
-        ticket_groups = {}
-        for ticket in payment.tickets.all():
-            ticket_type = ticket.ticket_type
-            if ticket_type.id not in ticket_groups:
-                ticket_groups[ticket_type.id] = {
-                    'ticket_type': ticket_type,
-                    'count': 0
-                }
-            ticket_groups[ticket_type.id]['count'] += 1
-        
-        # Create line items for Stripe
-        for group in ticket_groups.values():
-            ticket_type = group['ticket_type']
-            line_items.append({
-                'price_data': {
-                    'currency': 'usd',
-                    'product_data': {
-                        'name': f"{ticket_type.event.title} - {ticket_type.name}",
-                        'description': ticket_type.description or f"Ticket for {ticket_type.event.title}",
-                        'metadata': {
-                            'event_id': str(ticket_type.event.id),
-                            'ticket_type_id': str(ticket_type.id),
-                        }
-                    },
-                    'unit_amount': int(ticket_type.price * 100),  # Convert to cents
-                },
-                'quantity': group['count'],
-            })
-        
-        # Create checkout session
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=line_items,
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            client_reference_id=str(payment.id),
-            metadata={
+        line_items = build_line_items(payment)
+        
+        # Keep the reservation hold alive for as long as the session can be paid
+        # (Stripe sessions must stay open for at least 30 minutes)
+        hold_expires_at = extend_hold(
+            payment,
+            minutes=max(settings.RESERVATION_HOLD_MINUTES, STRIPE_MIN_SESSION_MINUTES + STRIPE_SESSION_MARGIN_MINUTES)
+        )
+        session_options = {}
+        if hold_expires_at:
+            session_options['expires_at'] = math.ceil(hold_expires_at.timestamp())
+        
+        # Create checkout session; a retry of the same request gets the same session
+        checkout_session = get_gateway().create_checkout_session({
+            'payment_method_types': ['card'],
+            'line_items': line_items,
+            'mode': 'payment',
+            'success_url': success_url,
+            'cancel_url': cancel_url,
+            'client_reference_id': str(payment.id),
+            'metadata': {
                 'payment_id': str(payment.id),
-                'user_id': str(payment.user.id),
+                'user_id': str(payment.user_id),
             },
-            customer_email=payment.user.email,
-        )
+            'customer_email': payment.user.email,
+            **session_options,
+        }, idempotency_key=f"checkout-{payment.transaction_id}-{session_options.get('expires_at', '')}")
         
         # Store the Stripe session ID in our payment record
         payment.stripe_session_id = checkout_session.id
-        payment.save()
+        payment.save(update_fields=['stripe_session_id'])
         
         logger.info(f"Created Stripe checkout session {checkout_session.id} for payment {payment.id}")
         
@@ -96,7 +125,7 @@ def retrieve_checkout_session(session_id):
         The session object or None if failed
     """
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = get_gateway().retrieve_checkout_session(session_id)
         return session
     except stripe.error.StripeError as e:
         logger.error(f"Stripe error retrieving session: {str(e)}")
@@ -121,31 +150,36 @@ def handle_checkout_completion(session):
         
         payment = Payment.objects.get(id=payment_id)
         
+        # A redelivered or replayed completion must not confirm twice,
+        # nor bring back the tickets of a refunded payment
+        if payment.payment_status in ('completed', 'refunded'):
+            logger.info(f"Payment {payment.id} was already {payment.payment_status}")
+            return payment
+        
         # Update payment with Stripe details
-        payment.stripe_session_id = session.id
-        payment.stripe_payment_intent = session.payment_intent
+        payment.stripe_session_id = session['id']
+        payment.stripe_payment_intent = session.get('payment_intent')
         
         # Update payment status based on Stripe status
-        if session.payment_status == 'paid':
+        if session.get('payment_status') == 'paid':
+            # Saving the completed payment confirms its tickets, see tickets/signals.py
             payment.payment_status = 'completed'
-            # Update all associated tickets to confirmed
-            payment.tickets.update(status='confirmed')
             logger.info(f"Payment {payment.id} completed successfully")
         else:
             payment.payment_status = 'failed'
-            logger.warning(f"Payment {payment.id} failed with status: {session.payment_status}")
+            logger.warning(f"Payment {payment.id} failed with status: {session.get('payment_status')}")
         
         payment.save()
         return payment
         
     except Payment.DoesNotExist:
-        logger.error(f"Payment not found for session {session.id}")
+        logger.error(f"Payment not found for session {session['id']}")
         return None
     except Exception as e:
         logger.error(f"Error handling checkout completion: {str(e)}")
         return None
 
-def create_payment_intent(amount, currency='usd', metadata=None):
+def create_payment_intent(amount, currency='usd', metadata=None, idempotency_key=None):
     """
     Create a payment intent directly (for custom payment flows)
     
@@ -153,19 +187,20 @@ def create_payment_intent(amount, currency='usd', metadata=None):
         amount: Amount in dollars (will be converted to cents)
         currency: Currency code (default: usd)
         metadata: Optional metadata dict
+        idempotency_key: Optional key so a repeated request creates one intent
         
     Returns:
         The payment intent object or None if failed
     """
     try:
-        intent = stripe.PaymentIntent.create(
-            amount=int(amount * 100),  # Convert to cents
-            currency=currency,
-            metadata=metadata or {},
-            automatic_payment_methods={
+        intent = get_gateway().create_payment_intent({
+            'amount': int(amount * 100),  # Convert to cents
+            'currency': currency,
+            'metadata': metadata or {},
+            'automatic_payment_methods': {
                 'enabled': True,
             },
-        )
+        }, idempotency_key=idempotency_key)
         return intent
     except stripe.error.StripeError as e:
         logger.error(f"Stripe error creating payment intent: {str(e)}")
@@ -187,19 +222,16 @@ def create_refund(payment):
             logger.error(f"No payment intent found for payment {payment.id}")
             return None
         
-        # Create refund
-        refund = stripe.Refund.create(
-            payment_intent=payment.stripe_payment_intent,
-            reason='requested_by_customer',
-        )
+        # Create refund; keyed by the payment so it is never refunded twice
+        refund = get_gateway().create_refund({
+            'payment_intent': payment.stripe_payment_intent,
+            'reason': 'requested_by_customer',
+        }, idempotency_key=f"refund-{payment.transaction_id}")
         
-        # Update payment status
+        # Saving the refunded payment cancels its tickets, see tickets/signals.py
         payment.payment_status = 'refunded'
         payment.save()
         
-        # Update tickets status
-        payment.tickets.update(status='cancelled')
-        
         logger.info(f"Created refund {refund.id} for payment {payment.id}")
         return refund
         
@@ -247,7 +279,7 @@ def get_payment_method_details(payment_method_id):
         The payment method object or None if failed
     """
     try:
-        payment_method = stripe.PaymentMethod.retrieve(payment_method_id)
+        payment_method = get_gateway().retrieve_payment_method(payment_method_id)
         return payment_method
     except stripe.error.StripeError as e:
         logger.error(f"Stripe error retrieving payment method: {str(e)}")
@@ -0,0 +1,321 @@
+# payments/tests/test_models.py
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from events.models import Event
+from tickets.models import TicketType
+from tickets.purchase import process_ticket_purchase
+from payments.models import OutboxEmail, Payment, ReservationHold
+from payments.holds import extend_hold, release_expired_holds
+from payments.outbox import queue_order_confirmation, send_outbox
+from payments.fake_stripe import FakeStripeServer
+from payments.reconcile import apply_session_outcomes, reconcile_stripe_payments
+from payments.stripe_utils import create_checkout_session
+from tickets.inventory import confirm_tickets
+from django.core import mail
+from django.core.mail import get_connection
+from unittest.mock import patch
+import time
+
+class ReservationHoldTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=25.00,
+            quantity_available=10
+        )
+    
+    def _purchase(self, quantity=2, payment_method='credit_card'):
+        payment, _ = process_ticket_purchase(self.user, {self.ticket_type.id: quantity}, payment_method)
+        return payment
+    
+    def test_online_purchase_places_hold(self):
+        """Test that online orders get a hold and offline orders do not"""
+        online = self._purchase()
+        offline = self._purchase(payment_method='offline')
+        
+        self.assertTrue(ReservationHold.objects.filter(payment=online).exists())
+        self.assertFalse(ReservationHold.objects.filter(payment=offline).exists())
+        self.assertGreater(online.reservation_hold.expires_at, timezone.now())
+    
+    def test_expired_hold_releases_stock(self):
+        """Test that the sweeper cancels expired pending payments and frees stock"""
+        payment = self._purchase(quantity=4)
+        
+        processed, cancelled = release_expired_holds(now=timezone.now() + timedelta(hours=1))
+        
+        self.assertEqual((processed, cancelled), (1, 1))
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'cancelled')
+        self.assertFalse(payment.tickets.exclude(status='cancelled').exists())
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 0)
+        self.assertFalse(ReservationHold.objects.exists())
+    
+    def test_unexpired_hold_is_kept(self):
+        """Test that holds within their TTL are left alone"""
+        self._purchase()
+        
+        self.assertEqual(release_expired_holds(), (0, 0))
+        self.assertEqual(ReservationHold.objects.count(), 1)
+    
+    def test_completed_payment_hold_is_dropped(self):
+        """Test that an expired hold on a paid order does not cancel it"""
+        payment = self._purchase()
+        Payment.objects.filter(pk=payment.pk).update(payment_status='completed')
+        
+        processed, cancelled = release_expired_holds(now=timezone.now() + timedelta(hours=1))
+        
+        self.assertEqual((processed, cancelled), (1, 0))
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'completed')
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 2)
+    
+    def test_release_in_batches(self):
+        """Test that every expired hold is processed across several batches"""
+        for _ in range(5):
+            self._purchase(quantity=1)
+        
+        processed, cancelled = release_expired_holds(batch_size=2, now=timezone.now() + timedelta(hours=1))
+        
+        self.assertEqual((processed, cancelled), (5, 5))
+    
+    def test_extend_hold(self):
+        """Test that extending a hold never shortens it"""
+        payment = self._purchase()
+        original = payment.reservation_hold.expires_at
+        
+        self.assertEqual(extend_hold(payment, minutes=1), original)
+        self.assertGreater(extend_hold(payment, minutes=120), original)
+    
+    def test_release_expired_holds_command(self):
+        """Test the release_expired_holds management command"""
+        payment = self._purchase()
+        ReservationHold.objects.filter(payment=payment).update(expires_at=timezone.now() - timedelta(minutes=1))
+        
+        out = StringIO()
+        call_command('release_expired_holds', stdout=out)
+        
+        self.assertIn('released 1 pending payment(s)', out.getvalue())
+
+class EmailOutboxTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=25.00,
+            quantity_available=100
+        )
+    
+    def _complete_purchase(self, quantity=3):
+        payment, _ = process_ticket_purchase(self.user, {self.ticket_type.id: quantity}, 'credit_card')
+        payment.payment_status = 'completed'
+        payment.save()
+        confirm_tickets(payment.tickets.all())
+        queue_order_confirmation(payment)
+        return payment
+    
+    def test_one_email_per_payment(self):
+        """Test that a completed order is queued once and sent as one email"""
+        payment = self._complete_purchase(quantity=3)
+        self.assertEqual(OutboxEmail.objects.filter(payment=payment).count(), 1)
+        
+        self.assertEqual(send_outbox(), (1, 0))
+        
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+        self.assertIn('Test Event', mail.outbox[0].subject)
+        for ticket in payment.tickets.all():
+            self.assertIn(str(ticket.ticket_code), mail.outbox[0].body)
+        
+        email = OutboxEmail.objects.get(payment=payment)
+        self.assertEqual(email.status, 'sent')
+        self.assertIsNotNone(email.sent_at)
+        
+        # Nothing left to send
+        self.assertEqual(send_outbox(), (0, 0))
+    
+    def test_batch_shares_one_connection(self):
+        """Test that a batch of emails is sent over a single connection"""
+        for _ in range(3):
+            self._complete_purchase(quantity=1)
+        
+        with patch('payments.outbox.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(send_outbox(), (3, 0))
+        
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+    
+    def test_failed_send_is_retried_with_backoff(self):
+        """Test that failures back off and are given up after the last attempt"""
+        payment = self._complete_purchase()
+        now = timezone.now()
+        
+        with self.settings(OUTBOX_MAX_ATTEMPTS=2), \
+                patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP down')):
+            self.assertEqual(send_outbox(now=now), (0, 1))
+            
+            email = OutboxEmail.objects.get(payment=payment)
+            self.assertEqual((email.status, email.attempts), ('pending', 1))
+            self.assertGreater(email.next_attempt_at, now)
+            self.assertEqual(email.last_error, 'SMTP down')
+            
+            # Not due yet
+            self.assertEqual(send_outbox(now=now), (0, 0))
+            
+            self.assertEqual(send_outbox(now=now + timedelta(hours=7)), (0, 1))
+        
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+    
+    def test_send_outbox_command(self):
+        """Test the send_outbox management command"""
+        self._complete_purchase()
+        
+        out = StringIO()
+        call_command('send_outbox', stdout=out)
+        
+        self.assertIn('Sent 1 email(s)', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+class StripeReconcileTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=25.00,
+            quantity_available=100
+        )
+        
+        self.fake = FakeStripeServer().start()
+        self.addCleanup(self.fake.stop)
+        settings = override_settings(STRIPE_API_BASE=self.fake.url, STRIPE_SECRET_KEY='sk_test_fake')
+        settings.enable()
+        self.addCleanup(settings.disable)
+    
+    def _checkout(self, minutes_ago=30):
+        payment, _ = process_ticket_purchase(self.user, {self.ticket_type.id: 2}, 'credit_card')
+        create_checkout_session(payment, 'https://example.com/success', 'https://example.com/cancel')
+        Payment.objects.filter(pk=payment.pk).update(payment_date=timezone.now() - timedelta(minutes=minutes_ago))
+        payment.refresh_from_db()
+        return payment
+    
+    def test_stale_payments_settled_in_bulk(self):
+        """Test that paid sessions complete and expired ones are cancelled"""
+        paid = self._checkout()
+        expired = self._checkout()
+        still_open = self._checkout()
+        recent = self._checkout(minutes_ago=1)
+        
+        session = self.fake.complete_session(paid.stripe_session_id)
+        self.fake.expire_session(expired.stripe_session_id)
+        self.fake.complete_session(recent.stripe_session_id)
+        
+        self.assertEqual(reconcile_stripe_payments(), (3, 1, 1))
+        
+        for payment in (paid, expired, still_open, recent):
+            payment.refresh_from_db()
+        self.assertEqual(paid.payment_status, 'completed')
+        self.assertEqual(paid.stripe_payment_intent, session['payment_intent'])
+        self.assertEqual(paid.tickets.filter(status='confirmed').count(), 2)
+        self.assertEqual(OutboxEmail.objects.filter(payment=paid).count(), 1)
+        
+        self.assertEqual(expired.payment_status, 'cancelled')
+        self.assertEqual(expired.tickets.filter(status='cancelled').count(), 2)
+        
+        self.assertEqual(still_open.payment_status, 'pending')
+        self.assertEqual(recent.payment_status, 'pending')
+        
+        # Settled payments are not looked up again
+        self.assertEqual(reconcile_stripe_payments(), (1, 0, 0))
+        self.assertEqual(OutboxEmail.objects.filter(payment=paid).count(), 1)
+    
+    def test_payment_settled_meanwhile_left_alone(self):
+        """Test that a payment the webhook completed during the lookup is not confirmed twice"""
+        payment = self._checkout()
+        self.fake.complete_session(payment.stripe_session_id)
+        
+        def webhook_wins(paid, expired):
+            Payment.objects.filter(pk=payment.pk).update(payment_status='completed', stripe_payment_intent='pi_webhook')
+            return apply_session_outcomes(paid, expired)
+        
+        with patch('payments.reconcile.apply_session_outcomes', side_effect=webhook_wins):
+            self.assertEqual(reconcile_stripe_payments(), (1, 0, 0))
+        
+        payment.refresh_from_db()
+        self.assertEqual(payment.stripe_payment_intent, 'pi_webhook')
+        self.assertFalse(OutboxEmail.objects.filter(payment=payment).exists())
+    
+    def test_sessions_looked_up_concurrently(self):
+        payments = [self._checkout() for _ in range(6)]
+        for payment in payments:
+            self.fake.complete_session(payment.stripe_session_id)
+        self.fake.latency = 0.2
+        
+        started = time.monotonic()
+        self.assertEqual(reconcile_stripe_payments(workers=6), (6, 6, 0))
+        
+        # One after the other the lookups alone would take 1.2 seconds
+        self.assertLess(time.monotonic() - started, 0.9)
+    
+    def test_reconcile_command(self):
+        payment = self._checkout()
+        self.fake.complete_session(payment.stripe_session_id)
+        
+        out = StringIO()
+        call_command('reconcile_stripe_payments', stdout=out)
+        
+        self.assertIn('Checked 1 payment(s): 1 completed, 0 cancelled.', out.getvalue())
@@ -1,16 +1,30 @@
 # payments/tests/test_views.py
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+from io import StringIO
+import hashlib
+import hmac
+import time
 import uuid
 import json
 from unittest.mock import patch, MagicMock
 from events.models import Event, EventCategory
+from tickets.inventory import confirm_tickets
 from tickets.models import Ticket, TicketType
-from payments.models import Payment
-from payments.stripe_utils import create_checkout_session, handle_checkout_completion
+from django.core.management import call_command
+from payments.models import OutboxEmail, Payment, WebhookEvent
+from payments.webhooks import process_webhook_events
+from payments.fake_stripe import FakeStripeServer, decode_form
+from payments.holds import place_hold
+from payments.outbox import queue_order_confirmation
+from payments.stripe_utils import (
+    STRIPE_MIN_SESSION_MINUTES, build_line_items, create_checkout_session, create_refund,
+    handle_checkout_completion, retrieve_checkout_session
+)
+import requests
 
 class PaymentViewsTest(TestCase):
     def setUp(self):
@@ -398,29 +412,21 @@ class PaymentViewsTest(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertIn('home', response.url)
     
-    @patch('payments.stripe_utils.stripe.checkout.Session.create')
-    def test_create_checkout_session(self, mock_stripe_create):
+    def test_create_checkout_session(self):
         """Test creating a Stripe checkout session"""
-        # Mock the Stripe API response
-        mock_session = MagicMock()
-        mock_session.id = 'cs_test_123'
-        mock_session.url = 'https://checkout.stripe.com/test-session'
-        mock_stripe_create.return_value = mock_session
-        
-        # Call the function
         success_url = 'https://example.com/success'
         cancel_url = 'https://example.com/cancel'
         
-        checkout_url = create_checkout_session(self.payment, success_url, cancel_url)
-        
-        # Verify results
-        self.assertEqual(checkout_url, 'https://checkout.stripe.com/test-session')
-        mock_stripe_create.assert_called_once()
+        with FakeStripeServer() as fake, override_settings(STRIPE_API_BASE=fake.url):
+            checkout_url = create_checkout_session(self.payment, success_url, cancel_url)
         
         # Check payment was updated with session ID
         self.payment.refresh_from_db()
-        self.assertEqual(self.payment.stripe_session_id, 'cs_test_123')
-    
+        session = fake.sessions[self.payment.stripe_session_id]
+        self.assertEqual(checkout_url, session['url'])
+        self.assertEqual(session['client_reference_id'], str(self.payment.id))
+        self.assertEqual(session['amount_total'], 5000)
+        
     @patch('payments.stripe_utils.stripe.checkout.Session.retrieve')
     def test_handle_checkout_completion(self, mock_stripe_retrieve):
         """Test handling Stripe checkout completion webhook"""
@@ -450,4 +456,290 @@ class PaymentViewsTest(TestCase):
         
         # Check tickets were updated
         self.ticket.refresh_from_db()
-        self.assertEqual(self.ticket.status, 'confirmed')
\ No newline at end of file
+        self.assertEqual(self.ticket.status, 'confirmed')
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Conference",
+            description="A test conference event",
+            organizer=self.user,
+            location="Test Venue",
+            start_date=timezone.now() + timedelta(days=7),
+            end_date=timezone.now() + timedelta(days=8),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=50
+        )
+        
+        self.payment = Payment.objects.create(
+            user=self.user,
+            amount=100.00,
+            payment_method='credit_card',
+            payment_status='pending'
+        )
+        for _ in range(2):
+            self.payment.tickets.add(
+                Ticket.objects.create(ticket_type=self.ticket_type, user=self.user, status='pending')
+            )
+        
+        self.created = int(time.time())
+    
+    def _post(self, event_id, event_type, data, created=None):
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': event_type,
+            'created': created or self.created,
+            'data': {'object': data},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(b'whsec_test', f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('stripe_webhook'),
+            data=payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}"
+        )
+    
+    def _session(self, **fields):
+        session = {
+            'id': 'cs_test_123',
+            'object': 'checkout.session',
+            'payment_intent': 'pi_test_123',
+            'payment_status': 'paid',
+            'client_reference_id': str(self.payment.id),
+        }
+        session.update(fields)
+        return session
+    
+    def test_webhook_only_stores_event(self):
+        """Test that the endpoint stores the event without touching the payment"""
+        response = self._post('evt_1', 'checkout.session.completed', self._session())
+        
+        self.assertEqual(response.status_code, 200)
+        record = WebhookEvent.objects.get(stripe_id='evt_1')
+        self.assertEqual(record.status, 'pending')
+        self.assertEqual(json.loads(record.payload)['data']['object']['id'], 'cs_test_123')
+        
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, 'pending')
+    
+    def test_invalid_signature_rejected(self):
+        response = self.client.post(
+            reverse('stripe_webhook'),
+            data='{"id": "evt_1"}',
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE='t=1,v1=bad'
+        )
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+    
+    def test_duplicate_delivery_applied_once(self):
+        """Test that a redelivered completion confirms the tickets and queues the email once"""
+        self._post('evt_1', 'checkout.session.completed', self._session())
+        self._post('evt_1', 'checkout.session.completed', self._session())
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        
+        self.assertEqual(process_webhook_events(), (1, 0))
+        self.assertEqual(process_webhook_events(), (0, 0))
+        
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, 'completed')
+        self.assertEqual(self.payment.stripe_payment_intent, 'pi_test_123')
+        self.assertEqual(self.payment.tickets.filter(status='confirmed').count(), 2)
+        self.assertEqual(OutboxEmail.objects.filter(payment=self.payment).count(), 1)
+        
+        record = WebhookEvent.objects.get(stripe_id='evt_1')
+        self.assertEqual(record.status, 'processed')
+        self.assertIsNotNone(record.processed_at)
+    
+    def test_events_processed_in_order(self):
+        """Test that a late failure notice cannot undo a completed payment"""
+        self._post('evt_2', 'payment_intent.payment_failed', {'id': 'pi_test_123'}, created=self.created + 5)
+        self._post('evt_1', 'checkout.session.completed', self._session())
+        
+        self.assertEqual(process_webhook_events(), (2, 0))
+        
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, 'completed')
+    
+    def test_failed_event_rolled_back_and_retried(self):
+        """Test that a failing handler leaves nothing applied and can be replayed"""
+        self._post('evt_1', 'checkout.session.completed', self._session())
+        
+        with patch('payments.webhooks.handle_checkout_completion', side_effect=RuntimeError("database unavailable")):
+            self.assertEqual(process_webhook_events(), (0, 1))
+        
+        record = WebhookEvent.objects.get(stripe_id='evt_1')
+        self.assertEqual(record.status, 'failed')
+        self.assertIn('database unavailable', record.last_error)
+        
+        out = StringIO()
+        call_command('process_webhook_events', '--retry-failed', stdout=out)
+        self.assertIn('Processed 1 webhook event(s), 0 failed.', out.getvalue())
+        
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, 'completed')
+    
+    def test_unhandled_event_marked_processed(self):
+        self._post('evt_1', 'customer.created', {'id': 'cus_123', 'object': 'customer'})
+        
+        self.assertEqual(process_webhook_events(), (1, 0))
+        self.assertEqual(WebhookEvent.objects.get(stripe_id='evt_1').status, 'processed')
+
+class StripeGatewayTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Conference",
+            description="A test conference event",
+            organizer=self.user,
+            location="Test Venue",
+            start_date=timezone.now() + timedelta(days=7),
+            end_date=timezone.now() + timedelta(days=8),
+            status="published"
+        )
+        
+        self.general = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=50
+        )
+        self.vip = TicketType.objects.create(
+            event=self.event,
+            name="VIP",
+            price=150.00,
+            quantity_available=10
+        )
+        
+        self.payment = Payment.objects.create(
+            user=self.user,
+            amount=250.00,
+            payment_method='credit_card',
+            payment_status='pending'
+        )
+        for ticket_type in (self.general, self.general, self.vip):
+            self.payment.tickets.add(
+                Ticket.objects.create(ticket_type=ticket_type, user=self.user, status='pending')
+            )
+        
+        self.fake = FakeStripeServer().start()
+        self.addCleanup(self.fake.stop)
+        settings = override_settings(STRIPE_API_BASE=self.fake.url, STRIPE_SECRET_KEY='sk_test_fake')
+        settings.enable()
+        self.addCleanup(settings.disable)
+    
+    def test_line_items_from_one_query(self):
+        with self.assertNumQueries(1):
+            line_items = build_line_items(self.payment)
+        
+        self.assertEqual(
+            [(item['price_data']['product_data']['name'], item['quantity'], item['price_data']['unit_amount'])
+             for item in line_items],
+            [("Test Conference - General Admission", 2, 5000), ("Test Conference - VIP", 1, 15000)]
+        )
+    
+    def test_decode_form(self):
+        self.assertEqual(
+            decode_form('mode=payment&line_items[0][quantity]=2&line_items[1][quantity]=1&metadata[a]=b'),
+            {'mode': 'payment', 'line_items': [{'quantity': '2'}, {'quantity': '1'}], 'metadata': {'a': 'b'}}
+        )
+    
+    def test_completion_settles_tickets_once(self):
+        """Test that a completed payment confirms its tickets and queues its email once"""
+        with patch('tickets.signals.confirm_tickets', wraps=confirm_tickets) as confirm, \
+                patch('tickets.signals.queue_order_confirmation', wraps=queue_order_confirmation) as queue:
+            handle_checkout_completion({
+                'id': 'cs_test_once',
+                'client_reference_id': str(self.payment.id),
+                'payment_status': 'paid',
+                'payment_intent': 'pi_test_once',
+            })
+        
+        self.assertEqual(confirm.call_count, 1)
+        self.assertEqual(queue.call_count, 1)
+        self.assertEqual(set(self.payment.tickets.values_list('status', flat=True)), {'confirmed'})
+        self.assertEqual(OutboxEmail.objects.filter(payment=self.payment).count(), 1)
+    
+    @override_settings(RESERVATION_HOLD_MINUTES=15)
+    def test_session_outlives_stripe_minimum(self):
+        """Test that a session expires comfortably after Stripe's 30-minute minimum"""
+        place_hold(self.payment)
+        started = time.time()
+        
+        create_checkout_session(self.payment, 'https://example.com/success', 'https://example.com/cancel')
+        
+        self.payment.refresh_from_db()
+        session = self.fake.sessions[self.payment.stripe_session_id]
+        self.assertGreaterEqual(session['expires_at'], started + (STRIPE_MIN_SESSION_MINUTES + 1) * 60)
+    
+    def test_failed_call_retried_with_same_key(self):
+        """Test that a 5xx answer is retried once, under the same idempotency key"""
+        self.fake.fail_next(1, status=500)
+        
+        url = create_checkout_session(self.payment, 'https://example.com/success', 'https://example.com/cancel')
+        
+        self.assertIsNotNone(url)
+        self.assertEqual(len(self.fake.sessions), 1)
+        posts = [key for method, path, key in self.fake.requests if path == '/v1/checkout/sessions']
+        self.assertEqual(len(posts), 2)
+        self.assertEqual(posts[0], posts[1])
+    
+    def test_refund_is_idempotent(self):
+        """Test that refunding a payment twice only refunds it once"""
+        create_checkout_session(self.payment, 'https://example.com/success', 'https://example.com/cancel')
+        self.payment.refresh_from_db()
+        session = self.fake.complete_session(self.payment.stripe_session_id)
+        self.payment.stripe_payment_intent = session['payment_intent']
+        self.payment.save()
+        
+        first = create_refund(self.payment)
+        second = create_refund(self.payment)
+        
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(len(self.fake.refunds), 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, 'refunded')
+    
+    def test_checkout_flow_against_fake(self):
+        """Test the buyer's path from checkout to confirmed tickets without the network"""
+        self.client.login(username='testuser', password='testpassword123')
+        
+        response = self.client.get(reverse('process_online_payment', args=[self.payment.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(f"{self.fake.url}/pay/"))
+        
+        # The fake checkout page pays and sends the buyer back to the site
+        paid = requests.get(response.url, allow_redirects=False, timeout=5)
+        self.assertEqual(paid.status_code, 303)
+        self.assertTrue(paid.headers['Location'].endswith(reverse('payment_success', args=[self.payment.id])))
+        
+        self.payment.refresh_from_db()
+        session = retrieve_checkout_session(self.payment.stripe_session_id)
+        self.assertEqual(session.payment_status, 'paid')
+        self.assertEqual(session.amount_total, 25000)
+        
+        self.assertIsNotNone(handle_checkout_completion(session))
+        self.assertEqual(self.payment.tickets.filter(status='confirmed').count(), 3)
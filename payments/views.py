@@ -6,7 +6,8 @@ from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from .models import Payment
 from .serializers import PaymentSerializer
-from tickets.models import Ticket, TicketType
+from tickets.inventory import release_tickets
+from tickets.purchase import resolve_ticket_selections, create_order_tickets
 from django.db import transaction
 import uuid
 
@@ -37,15 +38,16 @@ class PaymentViewSet(viewsets.ModelViewSet):
         if payment.is_offline_approved:
             return Response({'message': 'Payment already approved'}, status=status.HTTP_400_BAD_REQUEST)
         
+        if payment.payment_status == 'refunded':
+            return Response({'message': 'Payment has been refunded'}, status=status.HTTP_400_BAD_REQUEST)
+        
         payment.is_offline_approved = True
         payment.approved_by = request.user
         payment.approval_date = timezone.now()
+        # Saving the completed payment confirms its tickets, see tickets/signals.py
         payment.payment_status = 'completed'
         payment.save()
         
-        # Update related tickets to confirmed status
-        payment.tickets.update(status='confirmed')
-        
         serializer = self.get_serializer(payment)
         return Response(serializer.data)
     
@@ -61,12 +63,10 @@ class PaymentViewSet(viewsets.ModelViewSet):
         try:
             # Here we would integrate with Stripe payment processing
             # For now, we'll simulate successful payment
+            # Saving the completed payment confirms its tickets, see tickets/signals.py
             payment.payment_status = 'completed'
             payment.save()
             
-            # Update tickets to confirmed
-            payment.tickets.update(status='confirmed')
-            
             return Response({'message': 'Payment processed successfully', 'payment_id': payment.id})
         except Exception as e:
             payment.payment_status = 'failed'
@@ -85,8 +85,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
         payment.payment_status = 'cancelled'
         payment.save()
         
-        # Update tickets to cancelled
-        payment.tickets.update(status='cancelled')
+        # Cancel tickets and return their stock
+        release_tickets(payment.tickets.all())
         
         return Response({'message': 'Payment cancelled successfully'})
     
@@ -96,25 +96,24 @@ class PaymentViewSet(viewsets.ModelViewSet):
         """
         # Extract ticket information from request
         ticket_data = request.data.get('tickets', [])
+        ticket_selections = {}
+        for ticket_info in ticket_data:
+            ticket_type_id = ticket_info.get('ticket_type_id')
+            ticket_selections[ticket_type_id] = ticket_selections.get(ticket_type_id, 0) + ticket_info.get('quantity', 1)
         
-        # Create the payment
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        payment = serializer.save(user=request.user)
         
-        # Process and create tickets
-        for ticket_info in ticket_data:
-            ticket_type_id = ticket_info.get('ticket_type_id')
-            quantity = ticket_info.get('quantity', 1)
-            
-            # Create tickets based on the quantity
-            for _ in range(quantity):
-                ticket = Ticket.objects.create(
-                    ticket_type_id=ticket_type_id,
-                    user=request.user,
-                    status='pending'
-                )
-                payment.tickets.add(ticket)
+        try:
+            with transaction.atomic():
+                # Create the payment
+                payment = serializer.save(user=request.user)
+                
+                # Create all tickets for the payment in bulk
+                ticket_types, _ = resolve_ticket_selections(ticket_selections)
+                create_order_tickets(payment, ticket_types)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
\ No newline at end of file
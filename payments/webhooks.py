@@ -1,12 +1,24 @@
 # payments/webhooks.py
+#
+# Stripe webhooks are handled in two steps. The endpoint only verifies the
+# signature and stores the raw event, keyed by its Stripe id, so it answers
+# quickly however busy the site is and a redelivered event is stored once.
+# The process_webhook_events worker then handles stored events in the order
+# Stripe created them; an event's effects are committed together with its
+# status, so each event is applied at most once.
 import json
 import logging
-from django.http import JsonResponse, HttpResponse
+from datetime import datetime, timezone as dt_timezone
+import stripe
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.conf import settings
 from .stripe_utils import verify_webhook_signature, handle_checkout_completion
-from .models import Payment
+from .models import Payment, WebhookEvent
+from tickets.inventory import release_tickets
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +26,7 @@ logger = logging.getLogger(__name__)
 @require_POST
 def stripe_webhook(request):
     """
-    Handle Stripe webhook events
+    Receive a Stripe webhook event and store it for the worker
     """
     payload = request.body
     signature_header = request.META.get('HTTP_STRIPE_SIGNATURE')
@@ -29,49 +41,152 @@ def stripe_webhook(request):
     if not event:
         return HttpResponse(status=400)
     
-    # Handle the event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        
-        # Handle successful payment
-        payment = handle_checkout_completion(session)
-        
-        if payment:
-            logger.info(f"Successfully processed payment {payment.id}")
-            
-            # Here you could send confirmation emails
-            # send_payment_confirmation_email(payment)
-        else:
-            logger.error(f"Failed to process session {session.id}")
-    
-    elif event['type'] == 'checkout.session.expired':
-        # Handle expired checkout sessions
-        session = event['data']['object']
-        payment_id = session.get('client_reference_id')
-        
-        if payment_id:
-            try:
-                payment = Payment.objects.get(id=payment_id)
-                if payment.payment_status == 'pending':
-                    payment.payment_status = 'cancelled'
-                    payment.save()
-                    payment.tickets.update(status='cancelled')
-                    logger.info(f"Cancelled expired payment {payment.id}")
-            except Payment.DoesNotExist:
-                logger.error(f"Payment {payment_id} not found")
-    
-    elif event['type'] == 'payment_intent.payment_failed':
-        # Handle failed payments
-        payment_intent = event['data']['object']
-        
-        # Find payment by payment intent ID
-        try:
-            payment = Payment.objects.get(stripe_payment_intent=payment_intent['id'])
-            payment.payment_status = 'failed'
-            payment.save()
-            logger.info(f"Marked payment {payment.id} as failed")
-        except Payment.DoesNotExist:
-            logger.warning(f"Payment not found for intent {payment_intent['id']}")
+    record_webhook_event(event, payload)
     
     # Return 200 OK to acknowledge receipt of the event
-    return HttpResponse(status=200)
\ No newline at end of file
+    return HttpResponse(status=200)
+
+
+def record_webhook_event(event, payload):
+    """
+    Store a verified webhook event unless it was received before
+
+    Args:
+        event: The verified Stripe event
+        payload: The raw request body
+
+    Returns:
+        tuple: (WebhookEvent, created)
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    return WebhookEvent.objects.get_or_create(
+        stripe_id=event['id'],
+        defaults={
+            'type': event['type'],
+            'payload': payload,
+            'occurred_at': datetime.fromtimestamp(event['created'], tz=dt_timezone.utc),
+        }
+    )
+
+
+def handle_session_completed(session):
+    payment = handle_checkout_completion(session)
+    if not payment:
+        raise ValueError(f"Failed to process session {session['id']}")
+    # The confirmation email was queued by handle_checkout_completion
+    logger.info(f"Successfully processed payment {payment.id}")
+
+
+def handle_session_expired(session):
+    payment_id = session.get('client_reference_id')
+    if not payment_id:
+        return
+
+    try:
+        payment = Payment.objects.get(id=payment_id)
+    except Payment.DoesNotExist:
+        logger.error(f"Payment {payment_id} not found")
+        return
+
+    if payment.payment_status == 'pending':
+        payment.payment_status = 'cancelled'
+        payment.save()
+        release_tickets(payment.tickets.all())
+        logger.info(f"Cancelled expired payment {payment.id}")
+
+
+def handle_payment_failed(payment_intent):
+    try:
+        payment = Payment.objects.get(stripe_payment_intent=payment_intent['id'])
+    except Payment.DoesNotExist:
+        logger.warning(f"Payment not found for intent {payment_intent['id']}")
+        return
+
+    # A failed attempt delivered after the payment went through changes nothing
+    if payment.payment_status == 'completed':
+        return
+    payment.payment_status = 'failed'
+    payment.save()
+    logger.info(f"Marked payment {payment.id} as failed")
+
+
+# Event types that are acted on; others are stored and marked processed
+HANDLERS = {
+    'checkout.session.completed': handle_session_completed,
+    'checkout.session.expired': handle_session_expired,
+    'payment_intent.payment_failed': handle_payment_failed,
+}
+
+
+def process_webhook_event(record):
+    """
+    Apply one stored event to the database
+
+    Args:
+        record: A WebhookEvent
+
+    Raises:
+        Exception: Whatever the handler raised
+    """
+    handler = HANDLERS.get(record.type)
+    if handler is None:
+        return
+    event = stripe.Event.construct_from(json.loads(record.payload), stripe.api_key)
+    handler(event['data']['object'])
+
+
+def process_webhook_events(batch_size=100):
+    """
+    Handle pending webhook events, oldest first
+
+    Each event is claimed by a conditional UPDATE to 'processed' inside the
+    transaction that applies it, so a concurrent worker skips it and a
+    worker that dies mid-way leaves it pending with nothing applied. An
+    event whose handler fails is marked failed and its changes are undone.
+
+    Args:
+        batch_size: Maximum number of events to handle
+
+    Returns:
+        tuple: (processed, failed) counts for this batch
+    """
+    pending_ids = list(
+        WebhookEvent.objects.filter(status='pending')
+        .order_by('occurred_at', 'pk')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+
+    processed = failed = 0
+    for pk in pending_ids:
+        with transaction.atomic():
+            claimed = WebhookEvent.objects.filter(pk=pk, status='pending').update(
+                status='processed', processed_at=timezone.now()
+            )
+            if not claimed:
+                continue
+
+            record = WebhookEvent.objects.get(pk=pk)
+            try:
+                with transaction.atomic():
+                    process_webhook_event(record)
+            except Exception as e:
+                logger.error(f"Webhook event {record.stripe_id} failed: {e}")
+                WebhookEvent.objects.filter(pk=pk).update(
+                    status='failed', processed_at=None, last_error=str(e)[:2000]
+                )
+                failed += 1
+            else:
+                processed += 1
+
+    return processed, failed
+
+
+def retry_failed_webhook_events():
+    """
+    Queue failed events again, e.g. after fixing the cause of an outage
+
+    Returns:
+        int: Number of events queued
+    """
+    return WebhookEvent.objects.filter(status='failed').update(status='pending', last_error='')
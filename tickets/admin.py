@@ -1,6 +1,8 @@
 # tickets/admin.py
 from django.contrib import admin
-from .models import Ticket, TicketType
+from .models import SeatSection, Ticket, TicketType, WaitlistEntry
 
 admin.site.register(Ticket)
-admin.site.register(TicketType)
\ No newline at end of file
+admin.site.register(TicketType)
+admin.site.register(SeatSection)
+admin.site.register(WaitlistEntry)
@@ -0,0 +1,157 @@
+# tickets/checkin.py
+import uuid
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .checkin_stream import publish_scans
+from .models import Ticket
+from events.summary import adjust_event_summaries
+
+# Largest batch a gate device may sync in one request
+MAX_BATCH_SIZE = 500
+
+# Fields needed to validate a scan and show it at the gate, fetched in one join
+SCAN_FIELDS = (
+    'pk', 'ticket_code', 'status', 'checked_in', 'checked_in_time',
+    'ticket_type__name', 'event_id', 'event__title',
+    'user__username', 'user__first_name', 'user__last_name',
+)
+
+
+def _normalize(code):
+    """Canonical string form of a ticket code, or None if it is not a UUID"""
+    try:
+        return str(uuid.UUID(str(code).strip()))
+    except ValueError:
+        return None
+
+
+def _describe(row, result, checked_in_time=None):
+    attendee = f"{row['user__first_name']} {row['user__last_name']}".strip()
+    when = checked_in_time or row['checked_in_time']
+    return {
+        'code': str(row['ticket_code']),
+        'result': result,
+        'event': row['event__title'],
+        'event_id': row['event_id'],
+        'ticket_type': row['ticket_type__name'],
+        'user': row['user__username'],
+        'attendee': attendee or row['user__username'],
+        'status': row['status'],
+        'checked_in_time': when.isoformat() if when else None,
+    }
+
+
+def check_in_tickets(scans, event_id=None, now=None):
+    """
+    Validate and check in a batch of scanned ticket codes
+
+    The codes are looked up in one joined query and the admissible tickets
+    are claimed with one conditional UPDATE (status='confirmed' and not yet
+    checked in), so two gates scanning the same ticket cannot both admit
+    it. Devices that were offline can pass the time each code was scanned.
+
+    Args:
+        scans: List of (ticket_code, scanned_at) pairs; scanned_at may be None
+        event_id: Optional event the tickets must belong to
+        now: Check-in time for scans without their own (defaults to now)
+
+    Returns:
+        list: One result dict per scan, in order. 'result' is one of
+              checked_in, already_checked_in, invalid_status, wrong_event,
+              not_found or duplicate (same code earlier in the batch).
+    """
+    now = now or timezone.now()
+
+    scans = [(_normalize(code) or str(code), when) for code, when in scans]
+
+    codes = []
+    scanned_at = {}
+    for code, when in scans:
+        if code not in scanned_at and _normalize(code):
+            codes.append(code)
+            # Device clocks can run ahead; never record a check-in in the future
+            scanned_at[code] = min(when, now) if when else now
+
+    rows = {
+        str(row['ticket_code']): row
+        for row in Ticket.objects.filter(ticket_code__in=codes).values(*SCAN_FIELDS)
+    }
+
+    admissible = {
+        code: row for code, row in rows.items()
+        if row['status'] == 'confirmed' and not row['checked_in']
+        and (event_id is None or row['event_id'] == event_id)
+    }
+
+    claimed = set()
+    with transaction.atomic():
+        if admissible:
+            claimed_count = Ticket.objects.filter(
+                pk__in=[row['pk'] for row in admissible.values()],
+                status='confirmed',
+                checked_in=False
+            ).update(
+                status='used',
+                checked_in=True,
+                updated_at=now,
+                checked_in_time=Case(
+                    *[When(pk=row['pk'], then=Value(scanned_at[code])) for code, row in admissible.items()],
+                    output_field=DateTimeField()
+                )
+            )
+
+            if claimed_count == len(admissible):
+                claimed = set(admissible)
+            else:
+                # Another gate got some of them first; claim one by one
+                for code, row in admissible.items():
+                    if Ticket.objects.filter(pk=row['pk'], status='confirmed', checked_in=False).update(
+                        status='used', checked_in=True, checked_in_time=scanned_at[code], updated_at=now
+                    ):
+                        claimed.add(code)
+
+        results = []
+        seen = set()
+        by_event = defaultdict(list)
+        for code, _ in scans:
+            row = rows.get(code)
+
+            if code in seen:
+                result = {'code': code, 'result': 'duplicate'}
+            elif row is None:
+                result = {'code': code, 'result': 'not_found'}
+            elif code in claimed:
+                result = _describe(row, 'checked_in', checked_in_time=scanned_at[code])
+                result['status'] = 'used'
+                by_event[row['event_id']].append({
+                    'ticket_code': code,
+                    'attendee': result['attendee'],
+                    'ticket_type': result['ticket_type'],
+                    'checked_in_time': result['checked_in_time'],
+                })
+            elif event_id is not None and row['event_id'] != event_id:
+                result = _describe(row, 'wrong_event')
+            elif row['checked_in'] or code in admissible:
+                # Checked in before, or by another gate while this batch ran
+                result = _describe(row, 'already_checked_in')
+            else:
+                result = _describe(row, 'invalid_status')
+
+            seen.add(code)
+            results.append(result)
+
+        adjust_event_summaries({
+            scan_event_id: {'checked_in': len(event_scans)} for scan_event_id, event_scans in by_event.items()
+        })
+        for scan_event_id, event_scans in by_event.items():
+            publish_scans(scan_event_id, event_scans)
+
+    return results
+
+
+def check_in_ticket_code(ticket_code, event_id=None):
+    """Check in a single scanned code, see check_in_tickets()"""
+    return check_in_tickets([(ticket_code, None)], event_id=event_id)[0]
@@ -0,0 +1,166 @@
+# tickets/checkin_stream.py
+#
+# Live check-in feed for event dashboards. Every check-in publishes once:
+# the scan is stored under a per-event sequence number and the event's
+# counts are recomputed with a single aggregate. Connected dashboards only
+# watch the sequence number in the cache, so the database cost of a scan
+# does not depend on how many dashboards are open.
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .inventory import ACTIVE_STATUSES
+from .models import Ticket
+
+# Scans kept for reconnecting clients, and the most sent in one message
+RETENTION_SECONDS = 60 * 60
+MAX_BACKLOG = 20
+
+KEEPALIVE_SECONDS = 15
+
+
+def _seq_key(event_id):
+    return f"checkin:{event_id}:seq"
+
+
+def _scan_key(event_id, seq):
+    return f"checkin:{event_id}:scan:{seq}"
+
+
+def _counts_key(event_id):
+    return f"checkin:{event_id}:counts"
+
+
+def get_check_in_counts(event_id):
+    """Checked-in and admissible ticket counts for an event, in one query"""
+    return Ticket.objects.filter(event_id=event_id).aggregate(
+        checked_in=Count('pk', filter=Q(checked_in=True)),
+        total=Count('pk', filter=Q(status__in=ACTIVE_STATUSES)),
+    )
+
+
+def _publish(event_id, scans):
+    # Claim a block of sequence numbers for the scans in one increment
+    cache.add(_seq_key(event_id), 0, timeout=None)
+    try:
+        last = cache.incr(_seq_key(event_id), len(scans))
+    except ValueError:
+        # The sequence was evicted between add() and incr(); start over
+        last = len(scans)
+        cache.set(_seq_key(event_id), last, timeout=None)
+
+    first = last - len(scans) + 1
+    entries = {_scan_key(event_id, seq): scan for seq, scan in zip(range(first, last + 1), scans)}
+    entries[_counts_key(event_id)] = get_check_in_counts(event_id)
+    cache.set_many(entries, timeout=RETENTION_SECONDS)
+
+
+def publish_scans(event_id, scans):
+    """
+    Announce check-ins to the event's live dashboards
+
+    Publishing waits for the surrounding transaction to commit, so a scan
+    that is rolled back is never shown. The counts are refreshed once per
+    call, however many scans it carries.
+
+    Args:
+        event_id: ID of the event the tickets belong to
+        scans: Dicts with ticket_code, attendee, ticket_type and checked_in_time
+    """
+    scans = list(scans)
+    if scans:
+        transaction.on_commit(lambda: _publish(event_id, scans))
+
+
+def publish_check_in(ticket):
+    """Announce a single checked-in Ticket, see publish_scans()"""
+    user = ticket.user
+    publish_scans(ticket.ticket_type.event_id, [{
+        'ticket_code': str(ticket.ticket_code),
+        'attendee': f"{user.first_name} {user.last_name}".strip() or user.username,
+        'ticket_type': ticket.ticket_type.name,
+        'checked_in_time': ticket.checked_in_time.isoformat() if ticket.checked_in_time else None,
+    }])
+
+
+def _format(event, data, seq=None):
+    lines = []
+    if seq is not None:
+        lines.append(f"id: {seq}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def stream_check_ins(event_id, last_seq=None, poll_interval=None, max_duration=None):
+    """
+    Yield server-sent events for an event's check-ins
+
+    New clients first get a 'counts' snapshot; after that every batch of
+    scans arrives as a 'checkin' event carrying the latest counts. Clients
+    resuming with Last-Event-ID get the scans they missed.
+
+    Args:
+        event_id: ID of the event to follow
+        last_seq: Sequence number the client already has (Last-Event-ID)
+        poll_interval: Seconds between cache checks
+        max_duration: Seconds before the stream closes; browsers reconnect
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'CHECKIN_STREAM_POLL_SECONDS', 1)
+    if max_duration is None:
+        max_duration = getattr(settings, 'CHECKIN_STREAM_MAX_SECONDS', 300)
+
+    started = last_sent = time.monotonic()
+    yield f"retry: {int(poll_interval * 1000) + 1000}\n\n"
+
+    if last_seq is None:
+        last_seq = await cache.aget(_seq_key(event_id), 0)
+        counts = await cache.aget(_counts_key(event_id))
+        if counts is None:
+            counts = await sync_to_async(get_check_in_counts)(event_id)
+        yield _format('counts', counts, seq=last_seq)
+
+    gap = None
+    while time.monotonic() - started < max_duration:
+        seq = await cache.aget(_seq_key(event_id), 0)
+
+        if seq < last_seq:
+            # The sequence was reset (cache flush); resend what is there
+            last_seq = max(seq - MAX_BACKLOG, 0)
+
+        if seq > last_seq:
+            first = max(last_seq + 1, seq - MAX_BACKLOG + 1)
+            found = await cache.aget_many([_scan_key(event_id, n) for n in range(first, seq + 1)])
+
+            # A publisher bumps the sequence before storing its scans, so a
+            # missing scan gets one more poll before it is skipped
+            scans = []
+            sent_up_to = last_seq
+            for n in range(first, seq + 1):
+                key = _scan_key(event_id, n)
+                if key not in found and gap != n:
+                    gap = n
+                    break
+                if key in found:
+                    scans.append(found[key])
+                sent_up_to = n
+
+            if sent_up_to > last_seq:
+                yield _format('checkin', {
+                    'counts': await cache.aget(_counts_key(event_id)),
+                    'scans': scans,
+                }, seq=sent_up_to)
+
+                last_seq = sent_up_to
+                last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+
+        await asyncio.sleep(poll_interval)
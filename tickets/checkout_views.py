@@ -5,13 +5,12 @@ from django.contrib import messages
 from django.http import HttpResponseBadRequest
 from django.conf import settings
 from django.urls import reverse
-from django.db import transaction
 
 from events.models import Event
-from .models import TicketType, Ticket
+from events import waiting_room
 from payments.models import Payment
 from payments.stripe_utils import create_checkout_session
-import uuid
+from .purchase import process_ticket_purchase
 
 @login_required
 def checkout(request):
@@ -23,6 +22,11 @@ def checkout(request):
     event_id = request.POST.get('event_id')
     event = get_object_or_404(Event, id=event_id, status='published')
     
+    # High-demand events only let admitted buyers through to checkout
+    if not waiting_room.is_admitted(request, event):
+        messages.info(request, "This event is in high demand. Please wait for your turn to check out.")
+        return redirect('waiting_room', event_id=event.id)
+    
     # Parse ticket selections from form
     ticket_selections = {}
     for key, value in request.POST.items():
@@ -40,41 +44,7 @@ def checkout(request):
     
     try:
         # Process the ticket purchase
-        with transaction.atomic():
-            # Calculate total amount
-            total_amount = 0
-            for ticket_type_id, quantity in ticket_selections.items():
-                ticket_type = TicketType.objects.get(id=ticket_type_id)
-                
-                # Verify availability
-                if ticket_type.quantity_available > 0:
-                    sold_tickets = ticket_type.tickets.count()
-                    remaining = ticket_type.quantity_available - sold_tickets
-                    
-                    if quantity > remaining:
-                        raise ValueError(f"Only {remaining} tickets available for {ticket_type.name}")
-                
-                total_amount += ticket_type.price * quantity
-            
-            # Create payment
-            payment = Payment.objects.create(
-                user=request.user,
-                amount=total_amount,
-                payment_method=payment_method,
-                payment_status='pending'
-            )
-            
-            # Create tickets
-            for ticket_type_id, quantity in ticket_selections.items():
-                ticket_type = TicketType.objects.get(id=ticket_type_id)
-                for _ in range(quantity):
-                    ticket = Ticket.objects.create(
-                        ticket_type=ticket_type,
-                        user=request.user,
-                        status='pending',
-                        ticket_code=uuid.uuid4()
-                    )
-                    payment.tickets.add(ticket)
+        payment, _ = process_ticket_purchase(request.user, ticket_selections, payment_method)
         
         if payment_method == 'offline':
             # For offline payments, redirect to confirmation page
@@ -129,26 +99,13 @@ def payment_success(request, payment_id):
     """View for handling successful payments"""
     payment = get_object_or_404(Payment, id=payment_id, user=request.user)
     
-    # For Stripe payments, verify the session
-    if payment.stripe_session_id:
-        from payments.stripe_utils import retrieve_checkout_session
-        session = retrieve_checkout_session(payment.stripe_session_id)
-        
-        if session and session.payment_status == 'paid':
-            # Update payment status if it's still pending
-            if payment.payment_status == 'pending':
-                payment.payment_status = 'completed'
-                payment.save()
-                
-                # Update ticket status
-                payment.tickets.update(status='confirmed')
-                
-                # Send email notification
-                # send_ticket_confirmation_email(payment)
-        else:
-            # Payment not actually completed
-            messages.warning(request, "Payment verification failed. Please contact support.")
-            return redirect('payment_status', payment_id=payment.id)
+    # Stripe payments are confirmed by the webhook worker, or by the
+    # reconcile_stripe_payments job if the webhook was lost
+    if payment.stripe_session_id and payment.payment_status == 'pending':
+        messages.info(
+            request,
+            "We're confirming your payment. Your tickets will be confirmed and emailed to you in a few minutes."
+        )
     
     return render(request, 'tickets/payment_success.html', {
         'payment': payment,
@@ -26,7 +26,7 @@ class TicketPurchaseForm(forms.Form):
         
         if self.ticket_type and self.ticket_type.quantity_available > 0:
             # Check if enough tickets are available
-            available = self.ticket_type.quantity_available - self.ticket_type.tickets.count()
+            available = self.ticket_type.quantity_remaining
             if quantity > available:
                 raise forms.ValidationError(f"Only {available} tickets available")
         
@@ -0,0 +1,372 @@
+# tickets/inventory.py
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+import logging
+
+from .models import Ticket, TicketType, WaitlistEntry
+from .seating import reclaim_ticket_seats, release_ticket_seats
+from events.models import Event
+from events.summary import CONFIRMED_STATUSES, adjust_event_summaries
+from events.trending import record_ticket_sales
+
+logger = logging.getLogger(__name__)
+
+# Ticket statuses that hold a unit of stock
+ACTIVE_STATUSES = ('pending', 'confirmed', 'used')
+
+
+class InsufficientInventory(ValueError):
+    """Raised when a ticket type cannot cover the requested quantity"""
+
+    def __init__(self, ticket_type, remaining):
+        self.ticket_type = ticket_type
+        self.remaining = remaining
+        super().__init__(f"Only {remaining} tickets available for {ticket_type.name}")
+
+
+class InsufficientCapacity(InsufficientInventory):
+    """Raised when an event's max_attendees cannot cover the requested quantity"""
+
+    def __init__(self, event, remaining):
+        self.event = event
+        self.ticket_type = None
+        self.remaining = remaining
+        ValueError.__init__(self, f"Only {remaining} places left for {event.title}")
+
+
+def get_remaining(ticket_type):
+    """
+    Read the current remaining stock for a ticket type from the database
+
+    Returns:
+        int or None: Remaining tickets, or None when the ticket type is unlimited
+    """
+    available, sold = TicketType.objects.values_list(
+        'quantity_available', 'quantity_sold'
+    ).get(pk=ticket_type.pk)
+
+    if available == 0:
+        return None
+    return max(available - sold, 0)
+
+
+def get_places_remaining(event_id):
+    """
+    Read the current number of places left for an event from the database
+
+    Returns:
+        int or None: Places left, or None when the event is unlimited
+    """
+    max_attendees, attendee_count = Event.objects.values_list(
+        'max_attendees', 'attendee_count'
+    ).get(pk=event_id)
+
+    if max_attendees == 0:
+        return None
+    return max(max_attendees - attendee_count, 0)
+
+
+def reserve_tickets(ticket_type, quantity):
+    """
+    Atomically claim stock for a ticket type and places at its event
+
+    Runs two conditional UPDATEs in one transaction, first on the event's
+    attendee_count and then on the ticket type's quantity_sold, so
+    concurrent purchases can push neither past its limit, even when several
+    ticket types share the event's max_attendees. The event row is always
+    updated before any ticket type row, so purchases cannot deadlock.
+
+    Args:
+        ticket_type: The TicketType to reserve from
+        quantity: Number of tickets to reserve
+
+    Raises:
+        InsufficientCapacity: If the event has fewer places left
+        InsufficientInventory: If not enough tickets of the type are left
+    """
+    if quantity <= 0:
+        return
+
+    with transaction.atomic():
+        claimed = Event.objects.filter(pk=ticket_type.event_id).filter(
+            Q(max_attendees=0) | Q(max_attendees__gte=F('attendee_count') + quantity)
+        ).update(attendee_count=F('attendee_count') + quantity)
+
+        if not claimed:
+            raise InsufficientCapacity(ticket_type.event, get_places_remaining(ticket_type.event_id) or 0)
+
+        updated = TicketType.objects.filter(pk=ticket_type.pk).filter(
+            Q(quantity_available=0) | Q(quantity_available__gte=F('quantity_sold') + quantity)
+        ).update(quantity_sold=F('quantity_sold') + quantity)
+
+        if not updated:
+            # Rolls back the places claimed above
+            raise InsufficientInventory(ticket_type, get_remaining(ticket_type) or 0)
+
+    # Keep the in-memory instance roughly in sync for the caller
+    ticket_type.quantity_sold += quantity
+
+
+def _return_places(event_id, quantity):
+    """Give places back to an event, never dropping below zero"""
+    if quantity <= 0:
+        return
+
+    Event.objects.filter(pk=event_id).update(
+        attendee_count=Greatest(F('attendee_count') - quantity, Value(0))
+    )
+
+
+def _return_stock(ticket_type_id, quantity):
+    """Give stock back to a ticket type, never dropping below zero"""
+    if quantity <= 0:
+        return
+
+    TicketType.objects.filter(pk=ticket_type_id).update(
+        quantity_sold=Greatest(F('quantity_sold') - quantity, Value(0))
+    )
+
+
+def return_reserved(ticket_type, quantity):
+    """
+    Give back stock claimed by reserve_tickets() that never became tickets
+
+    Args:
+        ticket_type: The TicketType the stock was reserved from
+        quantity: Number of units to return
+    """
+    with transaction.atomic():
+        # The event before the ticket type, as in reserve_tickets()
+        _return_places(ticket_type.event_id, quantity)
+        _return_stock(ticket_type.pk, quantity)
+
+
+def release_tickets(tickets):
+    """
+    Cancel tickets and return their stock to the ticket type counters
+
+    The stock returned per ticket type, and the places returned to its
+    event, are the row count of the status UPDATE itself, so two requests
+    cancelling the same tickets cannot release twice. Reserved seats are
+    freed for the seated tickets locked before the UPDATE.
+
+    Args:
+        tickets: A Ticket queryset (e.g. payment.tickets.all())
+
+    Returns:
+        int: Number of tickets cancelled
+    """
+    tickets = tickets.exclude(status='cancelled')
+    groups = list(
+        tickets.order_by().values_list('ticket_type_id', 'event_id', 'status').distinct()
+    )
+
+    cancelled = 0
+    with transaction.atomic():
+        # Lock seated tickets first so only this call frees their seats
+        seats = list(
+            tickets.filter(seat_section__isnull=False).select_for_update(of=('self',))
+            .values_list('seat_section_id', 'seat_index')
+        )
+
+        # One UPDATE per ticket type and status, so the summaries know
+        # how many paid tickets were among those cancelled
+        released = {}
+        places_by_event = {}
+        changes = {}
+        for ticket_type_id, event_id, status in groups:
+            updated = Ticket.objects.filter(
+                pk__in=tickets.filter(ticket_type_id=ticket_type_id, status=status).values('pk'),
+                status=status
+            ).update(status='cancelled', updated_at=timezone.now())
+            released[ticket_type_id] = released.get(ticket_type_id, 0) + updated
+            places_by_event[event_id] = places_by_event.get(event_id, 0) + updated
+
+            change = changes.setdefault(event_id, {'sold': 0, 'confirmed': 0})
+            change['sold'] -= updated
+            if status in CONFIRMED_STATUSES:
+                change['confirmed'] -= updated
+
+        # Events before ticket types, in the same order as reserve_tickets()
+        for event_id in sorted(places_by_event):
+            _return_places(event_id, places_by_event[event_id])
+
+        for ticket_type_id, updated in released.items():
+            _return_stock(ticket_type_id, updated)
+            cancelled += updated
+
+        if seats:
+            release_ticket_seats(seats)
+
+        adjust_event_summaries(changes)
+
+    return cancelled
+
+
+def confirm_tickets(tickets):
+    """
+    Confirm pending tickets and record the sales for trending
+
+    Tickets that had already been released (e.g. an expired hold that was
+    paid late) are revived, since the buyer has paid for them. They claim
+    their stock again through reserve_tickets(), so a revival never pushes
+    a ticket type or event past its limit, and they get their seats back
+    unless those were resold. Tickets of cancelled events or refunded
+    payments are never revived.
+
+    Args:
+        tickets: A Ticket queryset (e.g. payment.tickets.all())
+
+    Returns:
+        int: Number of tickets confirmed
+    """
+    tickets = tickets.filter(status__in=['pending', 'cancelled'])
+    groups = list(
+        tickets.order_by().values_list('ticket_type_id', 'event_id').distinct()
+    )
+
+    confirmed = 0
+    sales_by_event = {}
+    changes = {}
+    with transaction.atomic():
+        for ticket_type_id, event_id in groups:
+            of_type = tickets.filter(ticket_type_id=ticket_type_id)
+
+            revivable = of_type.filter(status='cancelled').exclude(
+                event__status='cancelled'
+            ).exclude(payments__payment_status='refunded')
+            revived = 0
+            revive_ids = list(revivable.values_list('pk', flat=True))
+            if revive_ids:
+                ticket_type = TicketType.objects.select_related('event').get(pk=ticket_type_id)
+                try:
+                    reserve_tickets(ticket_type, len(revive_ids))
+                except InsufficientInventory as e:
+                    # Sold out meanwhile; the organizer has to refund or seat them by hand
+                    logger.warning(f"Could not revive paid tickets {revive_ids}: {e}")
+                else:
+                    reclaim_ticket_seats(Ticket.objects.filter(pk__in=revive_ids))
+                    revived = Ticket.objects.filter(pk__in=revive_ids).update(
+                        status='confirmed', updated_at=timezone.now()
+                    )
+
+            updated = Ticket.objects.filter(
+                pk__in=of_type.filter(status='pending').values('pk')
+            ).update(status='confirmed', updated_at=timezone.now())
+
+            confirmed += revived + updated
+            sales_by_event[event_id] = sales_by_event.get(event_id, 0) + revived + updated
+            change = changes.setdefault(event_id, {'sold': 0, 'confirmed': 0})
+            # Revived tickets hold a place again
+            change['sold'] += revived
+            change['confirmed'] += revived + updated
+
+        for event_id, quantity in sales_by_event.items():
+            record_ticket_sales(event_id, quantity)
+
+        adjust_event_summaries(changes)
+
+    return confirmed
+
+
+def _active_ticket_count():
+    """Subquery counting the stock-holding tickets of the outer ticket type"""
+    return Subquery(
+        Ticket.objects.filter(
+            ticket_type=OuterRef('pk'),
+            status__in=ACTIVE_STATUSES
+        ).order_by().values('ticket_type').annotate(
+            total=Count('pk')
+        ).values('total')
+    )
+
+
+def _offered_quantity(outer):
+    """
+    Subquery summing the stock held by open waitlist offers
+
+    Args:
+        outer: Lookup from a WaitlistEntry to the outer row, e.g. 'ticket_type'
+    """
+    return Subquery(
+        WaitlistEntry.objects.filter(
+            status='offered',
+            **{outer: OuterRef('pk')}
+        ).order_by().values(outer).annotate(
+            total=Sum('quantity')
+        ).values('total')
+    )
+
+
+def rebuild_counters(ticket_types=None):
+    """
+    Recompute quantity_sold from Ticket rows and open waitlist offers
+
+    Args:
+        ticket_types: Optional TicketType queryset to limit the rebuild
+
+    Returns:
+        int: Number of ticket types whose counter had drifted and was fixed
+    """
+    if ticket_types is None:
+        ticket_types = TicketType.objects.all()
+
+    actual_sold = (
+        Coalesce(_active_ticket_count(), Value(0))
+        + Coalesce(_offered_quantity('ticket_type'), Value(0))
+    )
+
+    drifted = ticket_types.annotate(
+        actual_sold=actual_sold
+    ).exclude(quantity_sold=F('actual_sold'))
+    drifted_ids = list(drifted.values_list('pk', flat=True))
+
+    if drifted_ids:
+        TicketType.objects.filter(pk__in=drifted_ids).update(
+            quantity_sold=actual_sold
+        )
+
+    return len(drifted_ids)
+
+
+def rebuild_attendee_counts(events=None):
+    """
+    Recompute Event.attendee_count from Ticket rows and open waitlist offers
+
+    Args:
+        events: Optional Event queryset to limit the rebuild
+
+    Returns:
+        int: Number of events whose counter had drifted and was fixed
+    """
+    if events is None:
+        events = Event.objects.all()
+
+    active_tickets = Subquery(
+        Ticket.objects.filter(
+            event=OuterRef('pk'),
+            status__in=ACTIVE_STATUSES
+        ).order_by().values('event').annotate(
+            total=Count('pk')
+        ).values('total')
+    )
+
+    actual_count = (
+        Coalesce(active_tickets, Value(0))
+        + Coalesce(_offered_quantity('ticket_type__event'), Value(0))
+    )
+
+    drifted_ids = list(
+        events.annotate(actual_count=actual_count)
+        .exclude(attendee_count=F('actual_count'))
+        .values_list('pk', flat=True)
+    )
+
+    if drifted_ids:
+        Event.objects.filter(pk__in=drifted_ids).update(
+            attendee_count=actual_count
+        )
+
+    return len(drifted_ids)
@@ -0,0 +1,108 @@
+# tickets/management/commands/benchmark_event_tickets.py
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from events.models import Event
+from tickets.models import Ticket, TicketType
+
+STATUSES = ('confirmed', 'confirmed', 'confirmed', 'used', 'pending', 'cancelled')
+
+
+class Command(BaseCommand):
+    help = 'Compare per-event ticket aggregates through ticket_type with the denormalized Ticket.event column'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=1000000, help='Number of tickets to generate')
+        parser.add_argument('--events', type=int, default=200, help='Number of events the tickets are spread over')
+        parser.add_argument('--types', type=int, default=4, help='Ticket types per event')
+        parser.add_argument('--samples', type=int, default=50, help='Events aggregated per run')
+
+    def _time(self, queryset_for, event_ids):
+        """Median and worst time of the dashboard aggregate over the sampled events"""
+        timings = []
+        for event_id in event_ids:
+            started = time.perf_counter()
+            queryset_for(event_id).aggregate(
+                total=Count('pk'),
+                sold=Count('pk', filter=Q(status__in=('confirmed', 'used'))),
+                checked_in=Count('pk', filter=Q(checked_in=True)),
+            )
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), max(timings)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        total = options['tickets']
+        now = timezone.now()
+
+        # Everything runs in a transaction that is rolled back at the end
+        with transaction.atomic():
+            organizer = User.objects.create_user(username='ticket-benchmark', password=None)
+            events = Event.objects.bulk_create([
+                Event(
+                    title=f"Benchmark Event {i}",
+                    description="Generated for benchmark_event_tickets",
+                    organizer=organizer,
+                    location="Benchmark Hall",
+                    start_date=now + timedelta(days=1),
+                    end_date=now + timedelta(days=1, hours=3),
+                    status='published',
+                )
+                for i in range(options['events'])
+            ])
+            ticket_types = TicketType.objects.bulk_create([
+                TicketType(event=event, name=f"Type {n}", price=Decimal('25.00'), quantity_available=0)
+                for event in events
+                for n in range(options['types'])
+            ])
+
+            self.stdout.write(f"Generating {total} tickets over {len(events)} events...")
+            started = time.perf_counter()
+            batch = []
+            for i in range(total):
+                ticket_type = rng.choice(ticket_types)
+                batch.append(Ticket(
+                    ticket_type=ticket_type,
+                    event_id=ticket_type.event_id,
+                    user=organizer,
+                    ticket_code=uuid.uuid4(),
+                    status=rng.choice(STATUSES),
+                    checked_in=rng.random() < 0.3,
+                ))
+                if len(batch) == 5000:
+                    Ticket.objects.bulk_create(batch)
+                    batch = []
+            Ticket.objects.bulk_create(batch)
+            self.stdout.write(f"Inserted in {time.perf_counter() - started:.1f}s")
+
+            sample = rng.sample([event.id for event in events], min(options['samples'], len(events)))
+            # Warm the page cache so both runs read from memory
+            self._time(lambda event_id: Ticket.objects.filter(event_id=event_id), sample)
+
+            join_median, join_worst = self._time(
+                lambda event_id: Ticket.objects.filter(ticket_type__event_id=event_id), sample
+            )
+            column_median, column_worst = self._time(
+                lambda event_id: Ticket.objects.filter(event_id=event_id), sample
+            )
+
+            self.stdout.write(
+                f"Per-event aggregate via ticket_type join: {join_median * 1000:.1f}ms median, "
+                f"{join_worst * 1000:.1f}ms worst"
+            )
+            self.stdout.write(
+                f"Per-event aggregate via Ticket.event: {column_median * 1000:.1f}ms median, "
+                f"{column_worst * 1000:.1f}ms worst, {join_median / column_median:.1f}x"
+            )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished, generated tickets rolled back."))
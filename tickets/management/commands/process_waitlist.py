@@ -0,0 +1,25 @@
+# tickets/management/commands/process_waitlist.py
+import time
+from django.core.management.base import BaseCommand
+from tickets.waitlist import process_waitlist
+
+class Command(BaseCommand):
+    help = 'Expire stale waitlist offers, promote waiters into freed stock and email their offers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Waiters promoted or offers expired per batch')
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and process every N seconds (0 runs once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired, offers, sent = process_waitlist(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Expired {expired} offer(s), made {offers} new offer(s), sent {sent} email(s)."
+            ))
+            
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+# tickets/management/commands/reconcile_inventory.py
+from django.core.management.base import BaseCommand
+from events.models import Event
+from events.summary import rebuild_event_summaries
+from tickets.inventory import rebuild_attendee_counts, rebuild_counters
+from tickets.models import TicketType
+
+class Command(BaseCommand):
+    help = 'Rebuild TicketType.quantity_sold, Event.attendee_count and event summaries from Ticket rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='Only reconcile ticket types for this event ID')
+
+    def handle(self, *args, **options):
+        ticket_types = TicketType.objects.all()
+        events = Event.objects.all()
+        if options['event']:
+            ticket_types = ticket_types.filter(event_id=options['event'])
+            events = events.filter(pk=options['event'])
+        
+        self.stdout.write("Reconciling ticket inventory counters...")
+        fixed = rebuild_counters(ticket_types)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled inventory, {fixed} ticket type counter(s) corrected."))
+        
+        fixed = rebuild_attendee_counts(events)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled attendance, {fixed} event counter(s) corrected."))
+        
+        summaries = rebuild_event_summaries(events)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {summaries} event summary row(s)."))
@@ -0,0 +1,116 @@
+# tickets/management/commands/stress_event_capacity.py
+import multiprocessing
+import random
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.utils import timezone
+from events.models import Event
+from tickets.inventory import ACTIVE_STATUSES
+from tickets.models import Ticket, TicketType
+from tickets.purchase import process_ticket_purchase
+
+
+def _buy(job):
+    """Place orders for random ticket types of the event from one process"""
+    user_id, ticket_type_ids, orders, max_quantity, seed = job
+    rng = random.Random(seed)
+    user = User.objects.get(pk=user_id)
+    results = Counter()
+
+    for _ in range(orders):
+        quantity = rng.randint(1, max_quantity)
+        try:
+            process_ticket_purchase(user, {rng.choice(ticket_type_ids): quantity}, 'credit_card')
+        except OperationalError:
+            # e.g. SQLite's lock timeout under heavy contention
+            results['errors'] += 1
+        except ValueError:
+            results['rejected'] += 1
+        else:
+            results['orders'] += 1
+            results['tickets'] += quantity
+
+    connections.close_all()
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Hammer one event with concurrent purchases from many processes and check max_attendees holds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Concurrent buyer processes')
+        parser.add_argument('--orders', type=int, default=50, help='Orders placed by each process')
+        parser.add_argument('--capacity', type=int, default=100, help='max_attendees of the generated event')
+        parser.add_argument('--types', type=int, default=3, help='Ticket types sharing the capacity')
+        parser.add_argument('--max-quantity', type=int, default=4, help='Largest quantity per order')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated event, users and tickets')
+
+    def handle(self, *args, **options):
+        capacity = options['capacity']
+        processes = options['processes']
+        now = timezone.now()
+
+        # Each ticket type alone could fill the event, so only max_attendees limits sales
+        organizer = User.objects.create_user(username=f"capacity-stress-{now.timestamp():.0f}", password=None)
+        event = Event.objects.create(
+            title="Capacity Stress Event",
+            description="Generated by stress_event_capacity",
+            organizer=organizer,
+            location="Stress Hall",
+            start_date=now + timedelta(days=1),
+            end_date=now + timedelta(days=1, hours=3),
+            status='published',
+            max_attendees=capacity,
+        )
+        ticket_type_ids = [
+            TicketType.objects.create(
+                event=event, name=f"Type {n}", price=Decimal('10.00'), quantity_available=capacity
+            ).pk
+            for n in range(options['types'])
+        ]
+        buyers = [
+            User.objects.create_user(username=f"{organizer.username}-buyer-{n}", password=None).pk
+            for n in range(processes)
+        ]
+
+        self.stdout.write(
+            f"{processes} processes placing {options['orders']} orders each for {capacity} places "
+            f"over {len(ticket_type_ids)} ticket types..."
+        )
+
+        # Children must open their own database connections
+        connections.close_all()
+        jobs = [
+            (user_id, ticket_type_ids, options['orders'], options['max_quantity'], n)
+            for n, user_id in enumerate(buyers)
+        ]
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            results = sum(pool.map(_buy, jobs), Counter())
+
+        held = Ticket.objects.filter(event=event, status__in=ACTIVE_STATUSES).count()
+        event.refresh_from_db()
+
+        self.stdout.write(
+            f"{results['orders']} orders placed, {results['rejected']} rejected, {results['errors']} errors; "
+            f"{held}/{capacity} places taken"
+        )
+
+        failures = []
+        if held > capacity:
+            failures.append(f"{held} tickets sold for {capacity} places")
+        if event.attendee_count != held:
+            failures.append(f"attendee_count is {event.attendee_count} for {held} tickets")
+        if held != results['tickets']:
+            failures.append(f"{results['tickets']} tickets bought but {held} stored")
+
+        if not options['keep']:
+            # Cascades to the event, ticket types, payments and tickets
+            User.objects.filter(pk__in=[organizer.pk, *buyers]).delete()
+
+        if failures:
+            raise CommandError("Capacity not enforced: " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Capacity held."))
@@ -0,0 +1,134 @@
+# tickets/manifest.py
+#
+# Signed lists of admissible ticket codes that gate devices download once
+# and then validate against offline. A full manifest carries every ticket
+# of the event that can still be checked in; a delta carries the tickets
+# that became admissible ("valid") or stopped being so ("revoked") since
+# the generated_at of an earlier manifest. Scans made against the manifest
+# are synced back through the scan API, which settles double entries.
+#
+# Layout (big-endian):
+#   header   magic b'TKTM', version, kind (0 full, 1 delta), event id,
+#            generated_at and since (ms since the epoch), valid count,
+#            revoked count
+#   valid    sorted 16-byte ticket UUIDs
+#   revoked  sorted 16-byte ticket UUIDs
+#   trailer  HMAC-SHA256 of everything before it
+import struct
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import Ticket
+
+MAGIC = b'TKTM'
+VERSION = 1
+FULL, DELTA = 0, 1
+
+HEADER = struct.Struct('>4sBBIqqII')
+SIGNATURE_SIZE = 32
+KEY_SALT = 'tickets.manifest'
+
+# Rows fetched per round trip while building a manifest
+CHUNK_SIZE = 2000
+
+
+def _to_ms(when):
+    return int(when.timestamp() * 1000) if when else 0
+
+
+def _from_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc) if ms else None
+
+
+def _sign(data):
+    # Devices are provisioned with CHECKIN_MANIFEST_KEY; without one the
+    # manifest can only be verified by the server itself
+    key = getattr(settings, 'CHECKIN_MANIFEST_KEY', None) or None
+    return salted_hmac(KEY_SALT, data, secret=key, algorithm='sha256').digest()
+
+
+def _codes(tickets):
+    # Ticket codes are ordered in the database, so the UUIDs arrive sorted
+    return b''.join(
+        code.bytes for code in
+        tickets.order_by('ticket_code').values_list('ticket_code', flat=True).iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def build_manifest(event_id, since=None):
+    """
+    Build the signed scan manifest for an event
+
+    Args:
+        event_id: ID of the event
+        since: Optional datetime; only tickets changed since then are sent
+
+    Returns:
+        tuple: (manifest bytes, generated_at datetime). Pass generated_at as
+               since on the next request to get the following delta.
+    """
+    # Taken before reading so a change during the build is in the next delta
+    generated_at = timezone.now()
+
+    tickets = Ticket.objects.filter(event_id=event_id)
+    valid = tickets.filter(status='confirmed', checked_in=False)
+
+    if since is None:
+        valid_codes, revoked_codes = _codes(valid), b''
+    else:
+        changed = tickets.filter(updated_at__gte=since)
+        valid_codes = _codes(changed.filter(status='confirmed', checked_in=False))
+        revoked_codes = _codes(changed.exclude(status='confirmed', checked_in=False))
+
+    header = HEADER.pack(
+        MAGIC, VERSION, FULL if since is None else DELTA, event_id,
+        _to_ms(generated_at), _to_ms(since),
+        len(valid_codes) // 16, len(revoked_codes) // 16
+    )
+    body = header + valid_codes + revoked_codes
+    return body + _sign(body), generated_at
+
+
+def parse_manifest(data):
+    """
+    Verify and decode a manifest produced by build_manifest()
+
+    Args:
+        data: Manifest bytes
+
+    Returns:
+        dict: kind ('full' or 'delta'), event_id, generated_at, since, and
+              the valid and revoked ticket codes as lists of UUIDs
+
+    Raises:
+        signing.BadSignature: If the manifest is malformed or was altered
+    """
+    if len(data) < HEADER.size + SIGNATURE_SIZE:
+        raise signing.BadSignature("Manifest is truncated")
+
+    body, signature = data[:-SIGNATURE_SIZE], data[-SIGNATURE_SIZE:]
+    if not constant_time_compare(_sign(body), signature):
+        raise signing.BadSignature("Manifest signature does not match")
+
+    magic, version, kind, event_id, generated_ms, since_ms, valid_count, revoked_count = HEADER.unpack_from(body)
+    if magic != MAGIC or version != VERSION:
+        raise signing.BadSignature("Unsupported manifest format")
+
+    offset = HEADER.size
+    codes = [
+        uuid.UUID(bytes=bytes(body[start:start + 16]))
+        for start in range(offset, offset + (valid_count + revoked_count) * 16, 16)
+    ]
+
+    return {
+        'kind': 'full' if kind == FULL else 'delta',
+        'event_id': event_id,
+        'generated_at': _from_ms(generated_ms),
+        'since': _from_ms(since_ms),
+        'valid': codes[:valid_count],
+        'revoked': codes[valid_count:],
+    }
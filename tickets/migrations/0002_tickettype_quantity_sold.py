@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_quantity_sold(apps, schema_editor):
+    TicketType = apps.get_model('tickets', 'TicketType')
+    Ticket = apps.get_model('tickets', 'Ticket')
+
+    active_tickets = Ticket.objects.filter(
+        ticket_type=OuterRef('pk'),
+        status__in=['pending', 'confirmed', 'used'],
+    ).order_by().values('ticket_type').annotate(total=Count('pk')).values('total')
+
+    TicketType.objects.update(quantity_sold=Coalesce(Subquery(active_tickets), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickettype',
+            name='quantity_sold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_quantity_sold, migrations.RunPython.noop),
+    ]
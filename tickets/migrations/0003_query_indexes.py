@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_tickettype_quantity_sold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['ticket_type', 'status'], name='ticket_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', 'purchase_date'], name='ticket_user_purchase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('checked_in', True)), fields=['checked_in_time'], name='ticket_checkin_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_eventnotification'),
+        ('tickets', '0004_ticket_updated_at'),
+    ]
+
+    operations = [
+        # Nullable until 0006 has filled it in
+        migrations.AddField(
+            model_name='ticket',
+            name='event',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='events.event'),
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_type_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'updated_at'], name='ticket_event_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# tickets/migrations/0006_backfill_ticket_event.py
+#
+# Copies each ticket's ticket_type.event into Ticket.event. The UPDATEs run
+# over ranges of ticket ids, each committed on its own, so a large table is
+# never locked as a whole and an interrupted run can simply be restarted.
+from django.db import migrations, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+CHUNK_SIZE = 10000
+
+
+def backfill_ticket_event(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketType = apps.get_model('tickets', 'TicketType')
+
+    last_id = Ticket.objects.aggregate(last=Max('pk'))['last'] or 0
+    event_of_type = TicketType.objects.filter(pk=OuterRef('ticket_type_id')).values('event_id')[:1]
+
+    for start in range(0, last_id, CHUNK_SIZE):
+        with transaction.atomic():
+            Ticket.objects.filter(
+                pk__gt=start,
+                pk__lte=start + CHUNK_SIZE,
+                event__isnull=True
+            ).update(event_id=Subquery(event_of_type))
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits separately
+    atomic = False
+
+    dependencies = [
+        ('tickets', '0005_ticket_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ticket_event, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_eventnotification'),
+        ('tickets', '0006_backfill_ticket_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='event',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='events.event'),
+        ),
+    ]
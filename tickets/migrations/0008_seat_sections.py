@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_attendee_count'),
+        ('tickets', '0007_alter_ticket_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='seat_index',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SeatSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('rows', models.PositiveIntegerField()),
+                ('seats_per_row', models.PositiveIntegerField()),
+                ('taken', models.BinaryField()),
+                ('version', models.PositiveIntegerField(default=0, editable=False)),
+                ('ticket_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_sections', to='tickets.tickettype')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='seat_section',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets', to='tickets.seatsection'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('seat_section', 'seat_index'), name='unique_live_seat'),
+        ),
+    ]
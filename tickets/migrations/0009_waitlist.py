@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_seat_sections'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('offered', 'Offered'), ('purchased', 'Purchased'), ('expired', 'Expired'), ('left', 'Left')], default='waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('offered_at', models.DateTimeField(blank=True, null=True)),
+                ('offer_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('ticket_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='tickets.tickettype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist entries',
+                'indexes': [models.Index(fields=['ticket_type', 'status', 'created_at', 'id'], name='waitlist_queue_idx'), models.Index(fields=['status', 'offer_expires_at'], name='waitlist_offer_expiry_idx'), models.Index(condition=models.Q(('notified_at__isnull', True), ('status', 'offered')), fields=['offered_at'], name='waitlist_unnotified_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ('waiting', 'offered'))), fields=('ticket_type', 'user'), name='unique_live_waitlist_entry')],
+            },
+        ),
+    ]
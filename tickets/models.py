@@ -1,6 +1,8 @@
 # tickets/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
 from events.models import Event
 import uuid
 
@@ -10,9 +12,101 @@ class TicketType(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity_available = models.PositiveIntegerField(default=0)  # 0 means unlimited
+    quantity_sold = models.PositiveIntegerField(default=0)  # Non-cancelled tickets, see tickets.inventory
     
     def __str__(self):
         return f"{self.name} - {self.event.title}"
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # quantity_sold is only moved by conditional UPDATEs in
+        # tickets.inventory; never write back a stale in-memory value
+        if not adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'quantity_sold'
+            ]
+        
+        with transaction.atomic():
+            # The event it moved away from, if any, and the summary figures
+            # of the tickets it took along
+            self._moved_from_event_id = None
+            self._moved_tickets = None
+            if not adding:
+                self._moved_from_event_id = self._move_places()
+                # Tickets carry their event too; follow a move to another
+                # event before post_save refreshes the summaries
+                self.tickets.exclude(event_id=self.event_id).update(event_id=self.event_id, updated_at=timezone.now())
+            super().save(*args, **kwargs)
+    
+    def _move_places(self):
+        """
+        Carry the places held by this type's tickets and offers over to its new event
+        
+        Returns:
+            int or None: Id of the event it moves away from, or None if it stays
+        """
+        previous_event_id = TicketType.objects.filter(pk=self.pk).values_list('event_id', flat=True).first()
+        if previous_event_id in (None, self.event_id):
+            return None
+        
+        # Stock-holding tickets (tickets.inventory.ACTIVE_STATUSES) and open waitlist offers
+        self._moved_tickets = self.tickets.aggregate(
+            sold=models.Count('pk', filter=models.Q(status__in=('pending', 'confirmed', 'used'))),
+            confirmed=models.Count('pk', filter=models.Q(status__in=('confirmed', 'used'))),
+            checked_in=models.Count('pk', filter=models.Q(checked_in=True)),
+        )
+        moving = self._moved_tickets['sold']
+        moving += self.waitlist_entries.filter(status='offered').aggregate(
+            total=models.Sum('quantity')
+        )['total'] or 0
+        
+        # Events in id order, like every other attendee_count update
+        for event_id in sorted([previous_event_id, self.event_id]) if moving else []:
+            if event_id == self.event_id:
+                change = models.F('attendee_count') + moving
+            else:
+                change = Greatest(models.F('attendee_count') - moving, models.Value(0))
+            Event.objects.filter(pk=event_id).update(attendee_count=change)
+        
+        return previous_event_id
+    
+    @property
+    def quantity_remaining(self):
+        """Remaining stock, or None when the ticket type is unlimited"""
+        if self.quantity_available == 0:
+            return None
+        return max(self.quantity_available - self.quantity_sold, 0)
+
+class SeatSection(models.Model):
+    """
+    A block of reserved seats sold under a ticket type, see tickets/seating.py
+
+    Availability is kept as a bitmap with one bit per seat, row by row (set
+    means taken), and only ever rewritten by a compare-and-swap on version.
+    """
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='seat_sections')
+    name = models.CharField(max_length=100)
+    rows = models.PositiveIntegerField()
+    seats_per_row = models.PositiveIntegerField()
+    taken = models.BinaryField(editable=False)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ticket_type})"
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.taken:
+            self.taken = bytes((self.seat_count + 7) // 8)
+        super().save(*args, **kwargs)
+    
+    @property
+    def seat_count(self):
+        return self.rows * self.seats_per_row
+    
+    def seat_label(self, seat_index):
+        row, seat = divmod(seat_index, self.seats_per_row)
+        return f"{self.name}, Row {row + 1}, Seat {seat + 1}"
 
 class Ticket(models.Model):
     STATUS_CHOICES = (
@@ -23,12 +117,137 @@ class Ticket(models.Model):
     )
     
     ticket_type = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='tickets')
+    # Copy of ticket_type.event, so event-wide queries skip the ticket_type
+    # join. Set by save() and kept in step by TicketType.save(); indexed by
+    # the (event, ...) indexes below
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='tickets', editable=False, db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tickets')
     purchase_date = models.DateTimeField(auto_now_add=True)
     ticket_code = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     checked_in = models.BooleanField(default=False)
     checked_in_time = models.DateTimeField(null=True, blank=True)
+    # Bulk .update() calls must set this too; gate manifests sync from it
+    updated_at = models.DateTimeField(auto_now=True)
+    # Reserved seat, held in the section's bitmap by tickets.seating
+    seat_section = models.ForeignKey(
+        SeatSection, on_delete=models.SET_NULL, null=True, blank=True, related_name='tickets', editable=False
+    )
+    seat_index = models.PositiveIntegerField(null=True, blank=True, editable=False)
     
     def __str__(self):
-        return f"Ticket {self.ticket_code} - {self.ticket_type.event.title}"
\ No newline at end of file
+        return f"Ticket {self.ticket_code} - {self.ticket_type.event.title}"
+    
+    @property
+    def seat_label(self):
+        if self.seat_section_id is None:
+            return ''
+        return self.seat_section.seat_label(self.seat_index)
+    
+    class Meta:
+        indexes = [
+            # Stock counts and confirmations per ticket type
+            models.Index(fields=['ticket_type', 'status'], name='ticket_type_status_idx'),
+            # "My tickets", newest first
+            models.Index(fields=['user', 'purchase_date'], name='ticket_user_purchase_idx'),
+            # Recent check-ins on the scanner page. Partial, since a bare
+            # boolean filter cannot use a (checked_in, ...) index on SQLite
+            models.Index(fields=['checked_in_time'], condition=models.Q(checked_in=True), name='ticket_checkin_idx'),
+            # Event-wide counts, check-ins and attendee lists
+            models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+            # Scan manifest deltas: tickets of an event changed since a time
+            models.Index(fields=['event', 'updated_at'], name='ticket_event_updated_idx'),
+        ]
+        constraints = [
+            # Backstop for the seat bitmaps: one live ticket per seat
+            models.UniqueConstraint(
+                fields=['seat_section', 'seat_index'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_live_seat',
+            ),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ticket = super().from_db(db, field_names, values)
+        # The stored state, so post_save can move the event summary by the change
+        ticket._saved_state = None
+        if 'status' in field_names and 'checked_in' in field_names:
+            ticket._saved_state = (
+                values[field_names.index('status')], values[field_names.index('checked_in')]
+            )
+        return ticket
+    
+    def save(self, *args, **kwargs):
+        if self.event_id is None:
+            self.event_id = self.ticket_type.event_id
+        
+        # New tickets claim a unit of stock from their ticket type, and a
+        # seat if the type has reserved seating
+        if self._state.adding and self.status != 'cancelled':
+            from .inventory import reserve_tickets
+            from .seating import assign_seats
+            
+            with transaction.atomic():
+                reserve_tickets(self.ticket_type, 1)
+                if self.seat_section_id is None:
+                    seats = assign_seats(self.ticket_type, 1)
+                    if seats:
+                        self.seat_section, self.seat_index = seats[0]
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+        self._saved_state = (self.status, self.checked_in)
+
+class WaitlistEntry(models.Model):
+    """
+    A user waiting for a sold-out ticket type, see tickets/waitlist.py
+
+    Waiters are promoted first come, first served. An offer holds the stock
+    for the entry's quantity until it is taken up or expires.
+    """
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('purchased', 'Purchased'),
+        ('expired', 'Expired'),
+        ('left', 'Left'),
+    )
+    
+    ticket_type = models.ForeignKey(TicketType, on_delete=models.CASCADE, related_name='waitlist_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    quantity = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    created_at = models.DateTimeField(auto_now_add=True)
+    offered_at = models.DateTimeField(null=True, blank=True)
+    offer_expires_at = models.DateTimeField(null=True, blank=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.user.username} waiting for {self.ticket_type} ({self.status})"
+    
+    @property
+    def has_open_offer(self):
+        return self.status == 'offered' and self.offer_expires_at > timezone.now()
+    
+    class Meta:
+        verbose_name_plural = "Waitlist entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ticket_type', 'user'],
+                condition=models.Q(status__in=('waiting', 'offered')),
+                name='unique_live_waitlist_entry',
+            ),
+        ]
+        indexes = [
+            # The queue of a ticket type, first come first served
+            models.Index(fields=['ticket_type', 'status', 'created_at', 'id'], name='waitlist_queue_idx'),
+            # Offers running out
+            models.Index(fields=['status', 'offer_expires_at'], name='waitlist_offer_expiry_idx'),
+            # Offers still to be emailed
+            models.Index(
+                fields=['offered_at'],
+                condition=models.Q(status='offered', notified_at__isnull=True),
+                name='waitlist_unnotified_idx',
+            ),
+        ]
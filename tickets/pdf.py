@@ -0,0 +1,296 @@
+# tickets/pdf.py
+#
+# PDF tickets rendered off the request path. WeasyPrint runs in a process
+# pool and the result is stored under MEDIA_ROOT, keyed by the ticket and a
+# fingerprint of everything printed on it (holder, ticket type, event and
+# template version). A transfer or an event edit changes the fingerprint,
+# so a stale PDF is never served; the invalidate_* helpers only reclaim
+# the disk space.
+import glob
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from django.conf import settings
+from django.template.loader import get_template
+
+from .pdf_worker import PAGE_CSS, render_pdf, render_pdf_pages, warm_up
+from .qr import get_qr_data_uri
+
+PDF_TEMPLATE = 'tickets/pdf/ticket_template.html'
+ARTIFACT_DIR = os.path.join('tickets', 'pdf')
+
+_executor = None
+_lock = threading.Lock()
+# Renders in flight in this process, by artifact path
+_pending = {}
+
+# Tickets that are printed in bulk exports
+ISSUED_STATUSES = ('confirmed', 'used')
+
+
+@lru_cache(maxsize=1)
+def get_template_version():
+    """Short hash of the ticket template and page CSS"""
+    source = get_template(PDF_TEMPLATE).template.source
+    return hashlib.sha256((source + PAGE_CSS).encode()).hexdigest()[:12]
+
+
+def _event_dir(event_id):
+    return os.path.join(settings.MEDIA_ROOT, ARTIFACT_DIR, str(event_id))
+
+
+def get_artifact_path(ticket):
+    """
+    Where the rendered PDF for a ticket is stored
+
+    Args:
+        ticket: Ticket with ticket_type, event, user and seat_section loaded
+
+    Returns:
+        str: Absolute path of the PDF
+    """
+    event = ticket.ticket_type.event
+    fingerprint = hashlib.sha256('|'.join([
+        get_template_version(),
+        str(ticket.user_id),
+        ticket.user.get_full_name() or ticket.user.username,
+        ticket.ticket_type.name,
+        # Seats can be taken away or changed after the PDF was made
+        str(ticket.seat_section_id),
+        str(ticket.seat_index),
+        event.updated_at.isoformat(),
+    ]).encode()).hexdigest()[:16]
+    return os.path.join(_event_dir(event.id), f"{ticket.ticket_code}-{fingerprint}.pdf")
+
+
+def render_ticket_html(ticket, template=None):
+    """Render the ticket template that the PDF is made from"""
+    template = template or get_template(PDF_TEMPLATE)
+    return template.render({
+        'ticket': ticket,
+        'event': ticket.ticket_type.event,
+        'qr_code': get_qr_data_uri(str(ticket.ticket_code)),
+        'generated_at': datetime.now(),
+    })
+
+
+def get_executor():
+    """The process pool, started on first use"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PDF_RENDER_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warm_up,
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        _executor = None
+
+
+def _submit(path, func, build_args):
+    # build_args is only called when no render of path is in flight yet
+    with _lock:
+        future = _pending.get(path)
+    if future is not None:
+        return future
+
+    args = build_args()
+    try:
+        future = get_executor().submit(func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool
+        _reset_executor()
+        future = get_executor().submit(func, *args)
+
+    with _lock:
+        future = _pending.setdefault(path, future)
+    future.add_done_callback(lambda done: _forget(path, done))
+    return future
+
+
+def _submit_ticket(ticket, path):
+    return _submit(path, render_pdf, lambda: (render_ticket_html(ticket), path))
+
+
+def _forget(path, future):
+    with _lock:
+        if _pending.get(path) is future:
+            del _pending[path]
+
+
+def get_ticket_pdf(ticket, wait=None):
+    """
+    Path of a ticket's PDF, rendering it in the pool if needed
+
+    Args:
+        ticket: Ticket with ticket_type, event and user loaded
+        wait: Seconds to wait for a render (PDF_RENDER_WAIT_SECONDS by default)
+
+    Returns:
+        str or None: The PDF path, or None while it is still rendering
+
+    Raises:
+        Exception: Whatever WeasyPrint raised if the render failed
+    """
+    path = get_artifact_path(ticket)
+    if os.path.exists(path):
+        return path
+
+    if wait is None:
+        wait = getattr(settings, 'PDF_RENDER_WAIT_SECONDS', 2)
+
+    try:
+        return _submit_ticket(ticket, path).result(timeout=wait)
+    except TimeoutError:
+        return None
+
+
+def invalidate_ticket_pdf(ticket):
+    """Delete stored PDFs of a ticket (e.g. after a transfer)"""
+    pattern = os.path.join(_event_dir(ticket.ticket_type.event_id), f"{ticket.ticket_code}-*.pdf")
+    for path in glob.glob(pattern):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def invalidate_event_pdfs(event_id):
+    """Delete all stored PDFs of an event (e.g. after it was edited)"""
+    shutil.rmtree(_event_dir(event_id), ignore_errors=True)
+
+
+def get_export_tickets(tickets):
+    """
+    Issued tickets of a queryset with everything printed on them, in one query
+
+    Args:
+        tickets: A Ticket queryset (e.g. payment.tickets.all())
+
+    Returns:
+        list: Tickets ordered by event and holder name
+    """
+    return list(
+        tickets.filter(status__in=ISSUED_STATUSES)
+        .select_related('ticket_type__event', 'user', 'seat_section')
+        .order_by('event_id', 'user__last_name', 'user__first_name', 'user__username', 'pk')
+    )
+
+
+def get_batch_pdf(tickets, name, wait=None):
+    """
+    Path of one PDF holding a page per ticket, rendering it if needed
+
+    All pages are rendered by a single worker so they share the stylesheet
+    and fonts; the stored file is keyed by the tickets' own fingerprints.
+
+    Args:
+        tickets: Tickets from get_export_tickets()
+        name: Stable name of the batch (e.g. 'order-12')
+        wait: Seconds to wait for a render (PDF_RENDER_WAIT_SECONDS by default)
+
+    Returns:
+        str or None: The PDF path, or None while it is still rendering
+    """
+    fingerprint = hashlib.sha256(
+        '|'.join(get_artifact_path(ticket) for ticket in tickets).encode()
+    ).hexdigest()[:16]
+    batch_dir = os.path.join(settings.MEDIA_ROOT, ARTIFACT_DIR, 'batches')
+    path = os.path.join(batch_dir, f"{name}-{fingerprint}.pdf")
+    if os.path.exists(path):
+        return path
+
+    if wait is None:
+        wait = getattr(settings, 'PDF_RENDER_WAIT_SECONDS', 2)
+
+    def build_args():
+        template = get_template(PDF_TEMPLATE)
+        return [render_ticket_html(ticket, template) for ticket in tickets], path
+
+    try:
+        _submit(path, render_pdf_pages, build_args).result(timeout=wait)
+    except TimeoutError:
+        return None
+
+    # Earlier versions of the batch are superseded
+    for old_path in glob.glob(os.path.join(batch_dir, f"{name}-*.pdf")):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+    return path
+
+
+class _ZipBuffer:
+    """Write-only file that collects zipfile output for a streaming response"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_tickets_zip(tickets):
+    """
+    Stream a ZIP of per-ticket PDFs
+
+    Stored PDFs are reused; missing ones are rendered across the pool a few
+    tickets ahead of the one being written, so workers stay busy while the
+    archive streams out in order.
+
+    Args:
+        tickets: Tickets from get_export_tickets()
+
+    Yields:
+        bytes: Chunks of the ZIP file
+    """
+    ahead = getattr(settings, 'PDF_RENDER_WORKERS', 2) * 4
+    remaining = iter(tickets)
+    window = deque()
+
+    def fill():
+        while len(window) < ahead:
+            ticket = next(remaining, None)
+            if ticket is None:
+                return
+            path = get_artifact_path(ticket)
+            future = None if os.path.exists(path) else _submit_ticket(ticket, path)
+            window.append((ticket, path, future))
+
+    buffer = _ZipBuffer()
+    # PDFs are already compressed
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        fill()
+        while window:
+            ticket, path, future = window.popleft()
+            if future is not None:
+                future.result()
+            archive.write(path, arcname=f"ticket_{ticket.ticket_code}.pdf")
+            fill()
+            yield buffer.take()
+    yield buffer.take()
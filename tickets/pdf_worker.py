@@ -0,0 +1,79 @@
+# tickets/pdf_worker.py
+#
+# Code that runs inside the PDF render pool. It is kept free of Django
+# imports so spawned workers start quickly and never open a database
+# connection; the request process renders the HTML and the worker only
+# turns it into a PDF.
+import os
+from functools import lru_cache
+
+PAGE_CSS = '@page { size: A4; margin: 1cm }'
+
+
+@lru_cache(maxsize=1)
+def get_stylesheets():
+    """Parsed page stylesheet, built once per worker"""
+    from weasyprint import CSS
+
+    return [CSS(string=PAGE_CSS)]
+
+
+def warm_up():
+    """Pool initializer: import WeasyPrint and parse the CSS before the first job"""
+    get_stylesheets()
+
+
+def _write(path, write_pdf):
+    # Written to a temporary file and moved into place, so a reader never
+    # sees a partial file even if two workers render the same PDF
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write_pdf(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
+
+
+def render_pdf(html, path):
+    """
+    Render HTML to a PDF file
+
+    Args:
+        html: The rendered ticket template
+        path: Where to store the PDF
+
+    Returns:
+        str: path
+    """
+    from weasyprint import HTML
+
+    return _write(path, lambda target: HTML(string=html).write_pdf(target, stylesheets=get_stylesheets()))
+
+
+def render_pdf_pages(pages, path):
+    """
+    Render several HTML documents into one PDF, one after the other
+
+    The documents share the parsed stylesheet and one font configuration,
+    so fonts are loaded once rather than per ticket.
+
+    Args:
+        pages: Rendered ticket templates, in order
+        path: Where to store the PDF
+
+    Returns:
+        str: path
+    """
+    from weasyprint import HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    documents = [
+        HTML(string=html).render(stylesheets=get_stylesheets(), font_config=font_config)
+        for html in pages
+    ]
+    all_pages = [page for document in documents for page in document.pages]
+    return _write(path, lambda target: documents[0].copy(all_pages).write_pdf(target))
@@ -2,9 +2,130 @@
 from django.db import transaction
 from django.contrib.auth.models import User
 from .models import Ticket, TicketType
+from .inventory import reserve_tickets, release_tickets
+from .seating import assign_seats
+from events.summary import adjust_event_summaries
 from payments.models import Payment
+from payments.holds import place_hold
 import uuid
 
+def resolve_ticket_selections(ticket_selections):
+    """
+    Load and validate the ticket types for an order
+    
+    Args:
+        ticket_selections: Dictionary of ticket_type_id -> quantity
+    
+    Returns:
+        tuple: (dict of TicketType -> quantity, total_amount)
+    """
+    quantities = {}
+    for ticket_type_id, quantity in ticket_selections.items():
+        try:
+            quantities[int(ticket_type_id)] = int(quantity)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid ticket type: {ticket_type_id}")
+    
+    # Load every selected ticket type and its event in one query
+    ticket_types_by_id = TicketType.objects.select_related('event').in_bulk(list(quantities))
+    
+    total_amount = 0
+    ticket_types = {}
+    
+    for ticket_type_id, quantity in quantities.items():
+        ticket_type = ticket_types_by_id.get(ticket_type_id)
+        if ticket_type is None:
+            raise ValueError(f"Invalid ticket type: {ticket_type_id}")
+        
+        if quantity <= 0:
+            continue
+        
+        # Check availability (stock is claimed atomically when tickets are created)
+        if ticket_type.quantity_available > 0:
+            remaining = ticket_type.quantity_remaining
+            
+            if quantity > remaining:
+                raise ValueError(f"Only {remaining} tickets available for {ticket_type.name}")
+        
+        # Add to total
+        total_amount += ticket_type.price * quantity
+        ticket_types[ticket_type] = quantity
+    
+    # Ticket types of one event share its max_attendees
+    quantities_by_event = {}
+    for ticket_type, quantity in ticket_types.items():
+        quantities_by_event[ticket_type.event] = quantities_by_event.get(ticket_type.event, 0) + quantity
+    
+    for event, quantity in quantities_by_event.items():
+        remaining = event.places_remaining
+        if remaining is not None and quantity > remaining:
+            raise ValueError(f"Only {remaining} places left for {event.title}")
+    
+    return ticket_types, total_amount
+
+def create_order_tickets(payment, ticket_types, user=None, stock_reserved=False):
+    """
+    Create all tickets for an order and link them to its payment
+    
+    Stock is reserved with one conditional UPDATE per ticket type, tickets are
+    inserted with bulk_create and the Payment<->Ticket rows in a single batch,
+    so the number of queries does not grow with the number of seats, beyond
+    the extra INSERTs of very large orders (SQLite caps one at 999 parameters). Tickets
+    of seated ticket types get the best available seats.
+    
+    Args:
+        payment: The Payment the tickets belong to
+        ticket_types: Dictionary of TicketType -> quantity
+        user: The ticket holder (defaults to the payment's user)
+        stock_reserved: The stock was already claimed, e.g. by a waitlist offer
+    
+    Returns:
+        list: The created tickets
+    """
+    user = user or payment.user
+    
+    with transaction.atomic():
+        tickets = []
+        for ticket_type, quantity in ticket_types.items():
+            if not stock_reserved:
+                reserve_tickets(ticket_type, quantity)
+            seats = assign_seats(ticket_type, quantity) or [(None, None)] * quantity
+            tickets.extend(
+                Ticket(
+                    ticket_type=ticket_type,
+                    event_id=ticket_type.event_id,
+                    user=user,
+                    status='pending',
+                    ticket_code=uuid.uuid4(),
+                    seat_section=section,
+                    seat_index=seat_index
+                )
+                for section, seat_index in seats
+            )
+        
+        created_tickets = Ticket.objects.bulk_create(tickets)
+        
+        PaymentTicket = Payment.tickets.through
+        PaymentTicket.objects.bulk_create([
+            PaymentTicket(payment_id=payment.id, ticket_id=ticket.id)
+            for ticket in created_tickets
+        ])
+        
+        changes = {}
+        for ticket_type, quantity in ticket_types.items():
+            change = changes.setdefault(ticket_type.event_id, {'sold': 0, 'offered': 0})
+            change['sold'] += quantity
+            if stock_reserved:
+                # The offer's stock became these tickets
+                change['offered'] -= quantity
+        adjust_event_summaries(changes)
+        
+        # Online orders only hold their stock for a limited time
+        if payment.payment_status == 'pending' and payment.payment_method != 'offline':
+            place_hold(payment)
+    
+    return created_tickets
+
 def process_ticket_purchase(user, ticket_selections, payment_method):
     """
     Process a bulk ticket purchase
@@ -25,31 +146,7 @@ def process_ticket_purchase(user, ticket_selections, payment_method):
         raise ValueError("Invalid user")
     
     # Calculate total amount and validate ticket availability
-    total_amount = 0
-    ticket_types = {}
-    
-    for ticket_type_id, quantity in ticket_selections.items():
-        try:
-            ticket_type = TicketType.objects.get(id=ticket_type_id)
-            quantity = int(quantity)
-            
-            if quantity <= 0:
-                continue
-                
-            # Check availability
-            if ticket_type.quantity_available > 0:
-                sold_tickets = ticket_type.tickets.count()
-                remaining = ticket_type.quantity_available - sold_tickets
-                
-                if quantity > remaining:
-                    raise ValueError(f"Only {remaining} tickets available for {ticket_type.name}")
-            
-            # Add to total
-            total_amount += ticket_type.price * quantity
-            ticket_types[ticket_type] = quantity
-            
-        except TicketType.DoesNotExist:
-            raise ValueError(f"Invalid ticket type: {ticket_type_id}")
+    ticket_types, total_amount = resolve_ticket_selections(ticket_selections)
     
     if not ticket_types:
         raise ValueError("No valid tickets selected")
@@ -65,18 +162,7 @@ def process_ticket_purchase(user, ticket_selections, payment_method):
         )
         
         # Create tickets
-        created_tickets = []
-        
-        for ticket_type, quantity in ticket_types.items():
-            for _ in range(quantity):
-                ticket = Ticket.objects.create(
-                    ticket_type=ticket_type,
-                    user=user,
-                    status='pending',
-                    ticket_code=uuid.uuid4()
-                )
-                created_tickets.append(ticket)
-                payment.tickets.add(ticket)
+        created_tickets = create_order_tickets(payment, ticket_types, user=user)
         
         return payment, created_tickets
 
@@ -94,8 +180,8 @@ def cancel_tickets(payment_id):
         payment.payment_status = 'refunded'
         payment.save()
         
-        # Update all associated tickets to cancelled
-        payment.tickets.update(status='cancelled')
+        # Cancel all associated tickets and return their stock
+        release_tickets(payment.tickets.all())
         
         return True
     except Payment.DoesNotExist:
@@ -0,0 +1,92 @@
+# tickets/qr.py
+#
+# Rendered ticket QR codes. A ticket's code never changes, so each image is
+# rendered once and then served from a bounded in-process LRU, backed by
+# the shared Django cache so other workers (and restarts, with a file or
+# Redis backend) reuse it too.
+import base64
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import generate_qr_code, make_qr
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def _cache_key(data, fmt):
+    return f"qr:{fmt}:{hashlib.sha256(data.encode()).hexdigest()}"
+
+
+def _render_png(data):
+    buffer = BytesIO()
+    generate_qr_code(data).save(buffer)
+    return buffer.getvalue()
+
+
+def _render_svg(data):
+    # One horizontal stroke per run of dark modules; several times smaller
+    # than an SVG with a square per module
+    matrix = make_qr(data).get_matrix()
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            runs.append(f"M{start} {y}.5h{x - start}")
+
+    size = len(matrix)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path stroke="#000" d="{"".join(runs)}"/></svg>'
+    ).encode()
+
+
+@lru_cache(maxsize=getattr(settings, 'QR_MEMORY_CACHE_SIZE', 512))
+def get_qr_image(data, fmt='png'):
+    """
+    Rendered QR code for the given data, cached
+
+    Args:
+        data: The string to encode (a ticket code)
+        fmt: 'png' or 'svg'
+
+    Returns:
+        bytes: The encoded image
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported QR code format: {fmt}")
+
+    key = _cache_key(data, fmt)
+    image = cache.get(key)
+    if image is None:
+        image = _render_svg(data) if fmt == 'svg' else _render_png(data)
+        cache.set(key, image, timeout=getattr(settings, 'QR_CACHE_SECONDS', 30 * 24 * 60 * 60))
+    return image
+
+
+def get_qr_data_uri(data, fmt=None):
+    """
+    QR code for the given data as a data: URI for <img src>
+
+    Args:
+        data: The string to encode (a ticket code)
+        fmt: 'png' or 'svg'; defaults to the QR_CODE_FORMAT setting
+
+    Returns:
+        str: The data URI
+    """
+    fmt = fmt or getattr(settings, 'QR_CODE_FORMAT', 'png')
+    encoded = base64.b64encode(get_qr_image(data, fmt)).decode('ascii')
+    return f"data:{FORMATS[fmt]};base64,{encoded}"
@@ -1,6 +1,7 @@
 # tickets/serializers.py
 from rest_framework import serializers
 from .models import Ticket, TicketType
+from .checkin import MAX_BATCH_SIZE
 from events.serializers import EventSerializer
 
 class TicketTypeSerializer(serializers.ModelSerializer):
@@ -10,8 +11,9 @@ class TicketTypeSerializer(serializers.ModelSerializer):
         model = TicketType
         fields = [
             'id', 'event', 'event_title', 'name', 
-            'description', 'price', 'quantity_available'
+            'description', 'price', 'quantity_available', 'quantity_sold'
         ]
+        read_only_fields = ['quantity_sold']
 
 class TicketSerializer(serializers.ModelSerializer):
     ticket_type_name = serializers.ReadOnlyField(source='ticket_type.name')
@@ -23,6 +25,21 @@ class TicketSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'ticket_type', 'ticket_type_name', 'event_title',
             'user', 'user_username', 'purchase_date', 'ticket_code',
-            'status', 'checked_in', 'checked_in_time'
+            'status', 'checked_in', 'checked_in_time', 'seat_section', 'seat_index'
         ]
-        read_only_fields = ['purchase_date', 'ticket_code', 'checked_in_time']
\ No newline at end of file
+        read_only_fields = ['purchase_date', 'ticket_code', 'checked_in_time']
+
+class TicketScanItemSerializer(serializers.Serializer):
+    code = serializers.CharField(max_length=64)
+    scanned_at = serializers.DateTimeField(required=False, allow_null=True)
+
+class TicketScanSerializer(serializers.Serializer):
+    """A single scanned code, or a batch of scans synced by a gate device"""
+    event = serializers.IntegerField(required=False)
+    code = serializers.CharField(required=False, max_length=64)
+    scans = TicketScanItemSerializer(many=True, required=False, max_length=MAX_BATCH_SIZE)
+    
+    def validate(self, data):
+        if ('code' in data) == ('scans' in data):
+            raise serializers.ValidationError("Provide either code or scans.")
+        return data
@@ -1,54 +1,101 @@
 # tickets/signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
 
-from .models import Ticket
+from .inventory import confirm_tickets, release_tickets
+from .models import Ticket, TicketType
+from .pdf import invalidate_event_pdfs
+from events.models import Event
+from events.summary import adjust_event_summaries, get_ticket_change, refresh_event_limits
 from payments.models import Payment
+from payments.outbox import queue_order_confirmation
+
+@receiver(post_save, sender=Payment)
+def update_ticket_status(sender, instance, **kwargs):
+    """
+    Update ticket status when payment status changes
+    
+    The one place a payment saved as completed or refunded settles its
+    tickets; the payment views only save the new status. Bulk updates,
+    which send no signal, call confirm_tickets() and release_tickets()
+    themselves.
+    """
+    previous = getattr(instance, '_saved_status', None)
+    if instance.payment_status == previous:
+        # Saved for another reason; the tickets were settled on the change itself
+        return
+    
+    if instance.payment_status == 'completed' and previous != 'refunded':
+        # Update all associated tickets to confirmed and email the buyer
+        with transaction.atomic():
+            confirm_tickets(instance.tickets.all())
+            queue_order_confirmation(instance)
+    elif instance.payment_status == 'refunded':
+        # Cancel all associated tickets and return their stock
+        release_tickets(instance.tickets.all())
+
+@receiver(post_save, sender=Event)
+def invalidate_ticket_pdfs(sender, instance, created, **kwargs):
+    """Drop stored PDF tickets when an event is edited"""
+    if not created:
+        invalidate_event_pdfs(instance.id)
 
 @receiver(post_save, sender=Ticket)
-def send_ticket_email(sender, instance, created, **kwargs):
-    """Send an email when a ticket is created or status is updated"""
-    if created:
-        # Don't send email on creation as ticket is still pending
+def adjust_event_summary(sender, instance, created, **kwargs):
+    """Move the event summary by the change a ticket saved on its own made"""
+    before = None if created else getattr(instance, '_saved_state', None)
+    if before is None and not created:
+        # Loaded with its status deferred; reconcile_inventory recounts it
         return
     
-    # Only send email when status changes to confirmed
-    if instance.status == 'confirmed':
-        event = instance.ticket_type.event
-        user = instance.user
-        
-        # Prepare email context
-        context = {
-            'user': user,
-            'ticket': instance,
-            'event': event,
-            'ticket_url': f"{settings.SITE_URL}/tickets/{instance.ticket_code}/"
-        }
+    change = get_ticket_change(before, (instance.status, instance.checked_in))
+    adjust_event_summaries({instance.event_id: change})
+
+@receiver(post_save, sender=TicketType)
+def refresh_event_summary(sender, instance, **kwargs):
+    """Update the prices and places of the event summary when a ticket type is edited"""
+    moved_from = getattr(instance, '_moved_from_event_id', None)
+    if moved_from is not None and instance._moved_tickets:
+        # The tickets went along to the new event
+        moved = instance._moved_tickets
+        adjust_event_summaries({
+            instance.event_id: moved,
+            moved_from: {name: -count for name, count in moved.items()},
+        })
+    refresh_event_limits([instance.event_id, moved_from])
+
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=TicketType)
+def refresh_event_summary_after_delete(sender, instance, origin=None, **kwargs):
+    """Take deleted tickets and ticket types out of the event summaries once the deletion is committed"""
+    if isinstance(origin, Event):
+        # The summary is deleted along with the event
+        return
+    
+    # Deferred, since the tickets' owner may be part of the same cascade.
+    # Every row deleted by one delete() call shares its origin, so deleting
+    # thousands of tickets queues a single update of their events
+    pending = getattr(origin, '_summary_changes', None)
+    if pending is None:
+        # Ticket deltas by event, and the events that lost ticket types
+        pending = ({}, set())
+        if origin is not None:
+            origin._summary_changes = pending
         
-        # Render email content
-        subject = f"Your ticket for {event.title} is confirmed!"
-        html_message = render_to_string('tickets/emails/ticket_confirmed.html', context)
-        plain_message = render_to_string('tickets/emails/ticket_confirmed.txt', context)
+        def refresh():
+            if origin is not None:
+                del origin._summary_changes
+            changes, edited = pending
+            adjust_event_summaries(changes)
+            refresh_event_limits(edited)
         
-        # Send email
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=True,
-        )
-
-@receiver(post_save, sender=Payment)
-def update_ticket_status(sender, instance, **kwargs):
-    """Update ticket status when payment status changes"""
-    if instance.payment_status == 'completed':
-        # Update all associated tickets to confirmed
-        instance.tickets.update(status='confirmed')
-    elif instance.payment_status == 'refunded':
-        # Update all associated tickets to cancelled
-        instance.tickets.update(status='cancelled')
\ No newline at end of file
+        transaction.on_commit(refresh)
+    
+    changes, edited = pending
+    if sender is Ticket:
+        change = changes.setdefault(instance.event_id, {'sold': 0, 'confirmed': 0, 'checked_in': 0})
+        for name, count in get_ticket_change((instance.status, instance.checked_in), None).items():
+            change[name] += count
+    else:
+        edited.add(instance.event_id)
@@ -0,0 +1,69 @@
+# tickets/stats.py
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q
+
+from .inventory import ACTIVE_STATUSES
+from .models import Ticket, TicketType
+
+# Statuses of tickets that have been paid for
+PAID_STATUSES = ('confirmed', 'used')
+
+
+def _count(**lookups):
+    """Count an event's tickets matching the given ticket lookups"""
+    return Count('tickets', filter=Q(**{f'tickets__{key}': value for key, value in lookups.items()}))
+
+
+def get_event_ticket_stats(event):
+    """
+    Ticket counts and revenue for an event, per ticket type and overall
+
+    Everything comes from one grouped query over the event's ticket types,
+    so the cost does not grow with the number of ticket types.
+
+    Args:
+        event: The Event to report on
+
+    Returns:
+        dict: 'ticket_types' (annotated TicketType list) and 'totals'.
+              Each ticket type carries total, pending, confirmed, cancelled,
+              used, checked_in, sold (stock-holding tickets), available
+              ('Unlimited' when uncapped) and revenue (paid tickets x price).
+    """
+    ticket_types = list(
+        TicketType.objects.filter(event=event).annotate(
+            total=Count('tickets'),
+            pending=_count(status='pending'),
+            confirmed=_count(status='confirmed'),
+            cancelled=_count(status='cancelled'),
+            used=_count(status='used'),
+            checked_in=_count(checked_in=True),
+            sold=_count(status__in=ACTIVE_STATUSES),
+            paid=_count(status__in=PAID_STATUSES),
+        ).annotate(
+            revenue=ExpressionWrapper(
+                F('paid') * F('price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        ).order_by('pk')
+    )
+
+    totals = dict.fromkeys(
+        ('total', 'pending', 'confirmed', 'cancelled', 'used', 'checked_in', 'sold', 'paid', 'revenue'), 0
+    )
+    for ticket_type in ticket_types:
+        if ticket_type.quantity_available > 0:
+            ticket_type.available = max(ticket_type.quantity_available - ticket_type.sold, 0)
+        else:
+            ticket_type.available = 'Unlimited'
+
+        for key in totals:
+            totals[key] += getattr(ticket_type, key)
+
+    return {'ticket_types': ticket_types, 'totals': totals}
+
+
+def get_recent_attendees(event, limit=10):
+    """Most recently purchased tickets for an event, with their buyers"""
+    return Ticket.objects.filter(
+        event=event
+    ).select_related('user').order_by('-purchase_date')[:limit]
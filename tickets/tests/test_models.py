@@ -0,0 +1,929 @@
+# tickets/tests/test_models.py
+from django.test import SimpleTestCase, TestCase
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from events.models import Event, EventCategory, EventSummary
+from tickets.models import SeatSection, Ticket, TicketType, WaitlistEntry
+from tickets.inventory import (
+    InsufficientCapacity, InsufficientInventory, confirm_tickets, rebuild_attendee_counts, rebuild_counters,
+    release_tickets, reserve_tickets
+)
+from tickets.purchase import process_ticket_purchase, create_order_tickets
+from tickets.seating import (
+    SeatUnavailable, find_contiguous, hold_best_available, hold_seats, release_seats, seat_map
+)
+from tickets.stats import get_event_ticket_stats
+from tickets.waitlist import (
+    expire_offers, join_waitlist, leave_waitlist, promote_waitlist, purchase_offer, send_offer_notifications
+)
+from payments.models import Payment
+
+class TicketInventoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.category = EventCategory.objects.create(
+            name="Test Category",
+            description="Test description"
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test description",
+            category=self.category,
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="Limited",
+            price=25.00,
+            quantity_available=5
+        )
+    
+    def test_ticket_creation_claims_stock(self):
+        """Test that creating a ticket increments quantity_sold"""
+        Ticket.objects.create(ticket_type=self.ticket_type, user=self.user)
+        
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 1)
+        self.assertEqual(self.ticket_type.quantity_remaining, 4)
+    
+    def test_reserve_cannot_oversell(self):
+        """Test that a reservation larger than remaining stock is rejected"""
+        reserve_tickets(self.ticket_type, 4)
+        
+        with self.assertRaises(InsufficientInventory) as ctx:
+            reserve_tickets(self.ticket_type, 2)
+        
+        self.assertEqual(ctx.exception.remaining, 1)
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 4)
+    
+    def test_unlimited_ticket_type(self):
+        """Test that unlimited ticket types always accept reservations"""
+        unlimited = TicketType.objects.create(
+            event=self.event,
+            name="Unlimited",
+            price=10.00,
+            quantity_available=0
+        )
+        
+        reserve_tickets(unlimited, 1000)
+        
+        unlimited.refresh_from_db()
+        self.assertEqual(unlimited.quantity_sold, 1000)
+        self.assertIsNone(unlimited.quantity_remaining)
+    
+    def test_purchase_rejects_when_sold_out(self):
+        """Test that purchases beyond remaining stock fail without creating tickets"""
+        process_ticket_purchase(self.user, {self.ticket_type.id: 4}, 'credit_card')
+        
+        with self.assertRaises(ValueError):
+            process_ticket_purchase(self.user, {self.ticket_type.id: 2}, 'credit_card')
+        
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 4)
+        self.assertEqual(self.ticket_type.tickets.count(), 4)
+    
+    def test_release_tickets_returns_stock_once(self):
+        """Test that cancelling tickets frees stock and repeating it is a no-op"""
+        for _ in range(3):
+            Ticket.objects.create(ticket_type=self.ticket_type, user=self.user)
+        
+        tickets = Ticket.objects.filter(ticket_type=self.ticket_type)
+        self.assertEqual(release_tickets(tickets), 3)
+        self.assertEqual(release_tickets(tickets), 0)
+        
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 0)
+        self.assertFalse(tickets.exclude(status='cancelled').exists())
+    
+    def test_saving_the_ticket_type_keeps_the_counter(self):
+        """Test that saving a stale instance does not overwrite quantity_sold"""
+        stale = TicketType.objects.get(pk=self.ticket_type.pk)
+        reserve_tickets(self.ticket_type, 4)
+        
+        stale.price = Decimal('30.00')
+        stale.save()
+        
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.price, Decimal('30.00'))
+        self.assertEqual(self.ticket_type.quantity_sold, 4)
+    
+    def test_rebuild_counters_fixes_drift(self):
+        """Test that counters are recomputed from ticket rows"""
+        Ticket.objects.create(ticket_type=self.ticket_type, user=self.user, status='confirmed')
+        Ticket.objects.create(ticket_type=self.ticket_type, user=self.user, status='cancelled')
+        TicketType.objects.filter(pk=self.ticket_type.pk).update(quantity_sold=5)
+        
+        self.assertEqual(rebuild_counters(), 1)
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 1)
+        
+        # Nothing left to fix on a second run
+        self.assertEqual(rebuild_counters(), 0)
+    
+    def test_reconcile_inventory_command(self):
+        """Test the reconcile_inventory management command"""
+        TicketType.objects.filter(pk=self.ticket_type.pk).update(quantity_sold=3)
+        
+        out = StringIO()
+        call_command('reconcile_inventory', event=self.event.id, stdout=out)
+        
+        self.assertIn('1 ticket type counter(s) corrected', out.getvalue())
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 0)
+
+
+class OrderFulfilmentTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Corporate Summit",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=20.00,
+            quantity_available=500
+        )
+        
+        self.vip_ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="VIP",
+            price=80.00,
+            quantity_available=0
+        )
+    
+    def _count_purchase_queries(self, general, vip):
+        with CaptureQueriesContext(connection) as ctx:
+            process_ticket_purchase(
+                self.user,
+                {self.ticket_type.id: general, self.vip_ticket_type.id: vip},
+                'credit_card'
+            )
+        return len(ctx.captured_queries)
+    
+    def test_query_count_independent_of_quantity(self):
+        """Test that 100 seats only cost the extra INSERT batches the database needs"""
+        small_order = self._count_purchase_queries(1, 1)
+        large_order = self._count_purchase_queries(70, 30)
+        
+        # The backend caps rows per INSERT (999 parameters on SQLite)
+        fields = [field for field in Ticket._meta.concrete_fields if not field.primary_key]
+        batches = math.ceil(100 / connection.ops.bulk_batch_size(fields, [None] * 100))
+        self.assertEqual(large_order, small_order + batches - 1)
+    
+    def test_order_tickets_linked_to_payment(self):
+        """Test that bulk-created tickets are linked to the payment and claim stock"""
+        payment, tickets = process_ticket_purchase(
+            self.user,
+            {str(self.ticket_type.id): 3, str(self.vip_ticket_type.id): 2},
+            'credit_card'
+        )
+        
+        self.assertEqual(len(tickets), 5)
+        self.assertEqual(payment.amount, 3 * 20 + 2 * 80)
+        self.assertEqual(
+            set(payment.tickets.values_list('id', flat=True)),
+            {ticket.id for ticket in tickets}
+        )
+        self.assertEqual(len({ticket.ticket_code for ticket in tickets}), 5)
+        
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 3)
+    
+    def test_create_order_tickets_for_existing_payment(self):
+        """Test bulk ticket creation for a payment created elsewhere (e.g. the API)"""
+        payment = Payment.objects.create(
+            user=self.user,
+            amount=40.00,
+            payment_method='offline'
+        )
+        
+        tickets = create_order_tickets(payment, {self.ticket_type: 2})
+        
+        self.assertEqual(payment.tickets.count(), 2)
+        self.assertTrue(all(ticket.status == 'pending' for ticket in tickets))
+
+
+class TicketStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Stats Event",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('20.00'),
+            quantity_available=10
+        )
+        
+        self.vip_ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="VIP",
+            price=Decimal('80.00'),
+            quantity_available=0
+        )
+        
+        for status in ('pending', 'confirmed', 'confirmed', 'cancelled', 'used'):
+            Ticket.objects.create(ticket_type=self.ticket_type, user=self.user, status=status)
+        Ticket.objects.create(
+            ticket_type=self.vip_ticket_type, user=self.user, status='used', checked_in=True
+        )
+    
+    def test_counts_and_revenue(self):
+        stats = get_event_ticket_stats(self.event)
+        general, vip = stats['ticket_types']
+        
+        self.assertEqual(general.total, 5)
+        self.assertEqual(general.confirmed, 2)
+        self.assertEqual(general.cancelled, 1)
+        self.assertEqual(general.sold, 4)
+        self.assertEqual(general.available, 6)
+        # Only confirmed and used tickets count as revenue
+        self.assertEqual(general.revenue, Decimal('60.00'))
+        
+        self.assertEqual(vip.available, 'Unlimited')
+        self.assertEqual(vip.checked_in, 1)
+        
+        totals = stats['totals']
+        self.assertEqual(totals['total'], 6)
+        self.assertEqual(totals['used'], 2)
+        self.assertEqual(totals['checked_in'], 1)
+        self.assertEqual(totals['revenue'], Decimal('140.00'))
+    
+    def test_single_query_regardless_of_ticket_types(self):
+        for i in range(10):
+            TicketType.objects.create(
+                event=self.event,
+                name=f"Tier {i}",
+                price=Decimal('10.00'),
+                quantity_available=5
+            )
+        
+        with self.assertNumQueries(1):
+            get_event_ticket_stats(self.event)
+
+class TicketEventTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Main Event",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.other_event = Event.objects.create(
+            title="Other Event",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=3),
+            end_date=timezone.now() + timedelta(days=4),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('20.00'),
+            quantity_available=10
+        )
+    
+    def test_event_set_on_create(self):
+        ticket = Ticket.objects.create(ticket_type=self.ticket_type, user=self.user)
+        self.assertEqual(ticket.event_id, self.event.id)
+    
+    def test_event_set_on_bulk_purchase(self):
+        process_ticket_purchase(self.user, {self.ticket_type.id: 3}, 'credit_card')
+        
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 3)
+    
+    def test_event_follows_ticket_type(self):
+        """Test that moving a ticket type to another event moves its tickets too"""
+        ticket = Ticket.objects.create(ticket_type=self.ticket_type, user=self.user)
+        
+        self.ticket_type.event = self.other_event
+        self.ticket_type.save()
+        
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.event_id, self.other_event.id)
+        self.assertEqual(self.event.tickets.count(), 0)
+    
+    def test_event_queries_skip_ticket_type_join(self):
+        Ticket.objects.create(ticket_type=self.ticket_type, user=self.user, status='confirmed')
+        
+        with CaptureQueriesContext(connection) as queries:
+            release_tickets(Ticket.objects.filter(event=self.event))
+        
+        self.assertFalse(
+            [
+                query['sql'] for query in queries.captured_queries
+                if 'FROM "tickets_ticket"' in query['sql'] and 'tickets_tickettype"."event_id' in query['sql']
+            ]
+        )
+        self.assertEqual(self.event.tickets.filter(status='cancelled').count(), 1)
+
+
+class EventCapacityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Small Venue",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published",
+            max_attendees=5
+        )
+        
+        # Either type alone could fill the room
+        self.standing = TicketType.objects.create(
+            event=self.event,
+            name="Standing",
+            price=Decimal('20.00'),
+            quantity_available=5
+        )
+        
+        self.seated = TicketType.objects.create(
+            event=self.event,
+            name="Seated",
+            price=Decimal('40.00'),
+            quantity_available=0
+        )
+    
+    def test_capacity_is_shared_across_ticket_types(self):
+        reserve_tickets(self.standing, 3)
+        
+        with self.assertRaises(InsufficientCapacity) as ctx:
+            reserve_tickets(self.seated, 3)
+        self.assertEqual(ctx.exception.remaining, 2)
+        
+        reserve_tickets(self.seated, 2)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 5)
+        self.assertEqual(self.event.places_remaining, 0)
+    
+    def test_failed_type_check_gives_places_back(self):
+        TicketType.objects.filter(pk=self.standing.pk).update(quantity_available=2)
+        self.standing.refresh_from_db()
+        
+        with self.assertRaises(InsufficientInventory):
+            reserve_tickets(self.standing, 3)
+        
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 0)
+    
+    def test_purchase_rejects_orders_over_capacity(self):
+        with self.assertRaises(ValueError) as ctx:
+            process_ticket_purchase(self.user, {self.standing.id: 3, self.seated.id: 3}, 'credit_card')
+        self.assertIn('Only 5 places left', str(ctx.exception))
+        
+        self.assertFalse(Ticket.objects.filter(event=self.event).exists())
+    
+    def test_release_and_revive_move_the_counter(self):
+        payment, _ = process_ticket_purchase(self.user, {self.standing.id: 4}, 'credit_card')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 4)
+        
+        release_tickets(payment.tickets.all())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 0)
+        
+        # A late payment takes its places back
+        confirm_tickets(payment.tickets.all())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 4)
+    
+    def test_revival_respects_the_limits(self):
+        payment, _ = process_ticket_purchase(self.user, {self.standing.id: 3}, 'credit_card')
+        release_tickets(payment.tickets.all())
+        
+        # The places were resold before the late payment came in
+        process_ticket_purchase(self.user, {self.seated.id: 4}, 'credit_card')
+        with self.assertLogs('tickets.inventory', level='WARNING'):
+            self.assertEqual(confirm_tickets(payment.tickets.all()), 0)
+        
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 4)
+        self.assertFalse(payment.tickets.exclude(status='cancelled').exists())
+    
+    def test_resaving_a_completed_payment_does_not_revive_tickets(self):
+        payment, _ = process_ticket_purchase(self.user, {self.standing.id: 2}, 'credit_card')
+        payment.payment_status = 'completed'
+        payment.save()
+        
+        # The event is cancelled, then the payment is saved again
+        self.event.status = 'cancelled'
+        self.event.save()
+        release_tickets(Ticket.objects.filter(event=self.event))
+        
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.save()
+        confirm_tickets(payment.tickets.all())
+        
+        self.standing.refresh_from_db()
+        self.event.refresh_from_db()
+        self.assertEqual((self.standing.quantity_sold, self.event.attendee_count), (0, 0))
+        self.assertFalse(payment.tickets.exclude(status='cancelled').exists())
+    
+    def test_refunded_tickets_are_not_revived(self):
+        payment, _ = process_ticket_purchase(self.user, {self.standing.id: 2}, 'credit_card')
+        payment.payment_status = 'refunded'
+        payment.save()
+        
+        # e.g. a late duplicate completion
+        self.assertEqual(confirm_tickets(payment.tickets.all()), 0)
+        payment.payment_status = 'completed'
+        payment.save()
+        
+        self.assertEqual(Ticket.objects.filter(event=self.event, status='cancelled').count(), 2)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 0)
+    
+    def test_moving_a_ticket_type_moves_its_places(self):
+        process_ticket_purchase(self.user, {self.standing.id: 4}, 'credit_card')
+        other = Event.objects.create(
+            title="Bigger Venue",
+            description="Test description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published",
+            max_attendees=5
+        )
+        
+        self.standing.event = other
+        self.standing.save()
+        
+        self.event.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.event.attendee_count, other.attendee_count), (0, 4))
+        self.assertEqual(rebuild_attendee_counts(), 0)
+    
+    def test_saving_the_event_keeps_the_counter(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        reserve_tickets(self.standing, 2)
+        
+        stale.title = "Renamed Venue"
+        stale.save()
+        
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.title, "Renamed Venue")
+        self.assertEqual(self.event.attendee_count, 2)
+    
+    def test_rebuild_attendee_counts(self):
+        Ticket.objects.create(ticket_type=self.standing, user=self.user, status='confirmed')
+        Ticket.objects.create(ticket_type=self.seated, user=self.user, status='cancelled')
+        Event.objects.filter(pk=self.event.pk).update(attendee_count=4)
+        
+        self.assertEqual(rebuild_attendee_counts(), 1)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 1)
+        self.assertEqual(rebuild_attendee_counts(), 0)
+
+
+class EventCapacityStressTest(SimpleTestCase):
+    """Concurrent purchases from several processes against a throwaway SQLite file"""
+    
+    def _manage(self, *args, env):
+        return subprocess.run(
+            [sys.executable, 'manage.py', *args],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=300
+        )
+    
+    def test_concurrent_purchases_never_exceed_capacity(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DATABASE_PATH=os.path.join(directory, 'stress.sqlite3'))
+            
+            migrate = self._manage('migrate', '--verbosity', '0', env=env)
+            self.assertEqual(migrate.returncode, 0, migrate.stderr)
+            
+            stress = self._manage(
+                'stress_event_capacity', '--processes', '6', '--orders', '40', '--capacity', '60', env=env
+            )
+        
+        self.assertEqual(stress.returncode, 0, stress.stderr)
+        self.assertIn('60/60 places taken', stress.stdout)
+        self.assertIn('Capacity held.', stress.stdout)
+
+
+class SeatingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Seated Concert",
+            description="Test description",
+            organizer=self.user,
+            location="Concert Hall",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="Stalls",
+            price=Decimal('45.00'),
+            quantity_available=0
+        )
+        
+        # 3 rows of 10 seats
+        self.section = SeatSection.objects.create(
+            ticket_type=self.ticket_type,
+            name="Stalls",
+            rows=3,
+            seats_per_row=10
+        )
+    
+    def _taken(self):
+        self.section.refresh_from_db()
+        taken = int.from_bytes(bytes(self.section.taken), 'little')
+        return [seat for seat in range(self.section.seat_count) if taken >> seat & 1]
+    
+    def test_new_section_is_empty(self):
+        self.assertEqual(len(bytes(self.section.taken)), 4)
+        self.assertEqual(self._taken(), [])
+    
+    def test_best_available_is_central_in_the_front_row(self):
+        self.assertEqual(find_contiguous(self.section, 0, 4), [3, 4, 5, 6])
+        
+        # Seat 5 taken: the front row still has a block of 4 on either side
+        self.assertEqual(find_contiguous(self.section, 1 << 5, 4), [1, 2, 3, 4])
+        
+        # Front row full: the second row
+        self.assertEqual(find_contiguous(self.section, (1 << 10) - 1, 2), [14, 15])
+        
+        self.assertIsNone(find_contiguous(self.section, 0, 11))
+    
+    def test_purchase_assigns_adjacent_seats(self):
+        _, tickets = process_ticket_purchase(self.user, {self.ticket_type.id: 3}, 'credit_card')
+        
+        self.assertEqual(sorted(ticket.seat_index for ticket in tickets), [3, 4, 5])
+        self.assertEqual(self._taken(), [3, 4, 5])
+        
+        ticket = Ticket.objects.get(pk=tickets[0].pk)
+        self.assertEqual(ticket.seat_section, self.section)
+        self.assertTrue(ticket.seat_label.startswith("Stalls, Row 1, Seat"))
+    
+    def test_group_is_split_when_no_row_fits(self):
+        # Leave every row with free seats, but never 4 adjacent ones
+        hold_seats(self.section, [seat for seat in range(30) if seat % 3 == 2])
+        
+        _, tickets = process_ticket_purchase(self.user, {self.ticket_type.id: 4}, 'credit_card')
+        
+        self.assertEqual(sorted(ticket.seat_index for ticket in tickets), [0, 1, 3, 4])
+    
+    def test_sold_out_section_rejects_the_order(self):
+        hold_seats(self.section, range(28))
+        
+        with self.assertRaises(SeatUnavailable):
+            process_ticket_purchase(self.user, {self.ticket_type.id: 3}, 'credit_card')
+        
+        self.assertFalse(Ticket.objects.exists())
+        self.ticket_type.refresh_from_db()
+        self.assertEqual(self.ticket_type.quantity_sold, 0)
+    
+    def test_hold_is_compare_and_swap(self):
+        hold_seats(self.section, [7])
+        
+        with self.assertRaises(SeatUnavailable):
+            hold_seats(self.section, [6, 7])
+        self.assertEqual(self._taken(), [7])
+        
+        # A writer that read an older version must not overwrite the bitmap
+        self.assertEqual(
+            SeatSection.objects.filter(pk=self.section.pk, version=0).update(taken=bytes(4)), 0
+        )
+        self.assertEqual(self.section.version, 1)
+    
+    def test_release_frees_seats_once(self):
+        payment, tickets = process_ticket_purchase(self.user, {self.ticket_type.id: 2}, 'credit_card')
+        
+        release_tickets(payment.tickets.all())
+        self.assertEqual(self._taken(), [])
+        
+        # The seats are sold again; releasing the old tickets again changes nothing
+        _, resold = process_ticket_purchase(self.user, {self.ticket_type.id: 2}, 'credit_card')
+        release_tickets(payment.tickets.all())
+        self.assertEqual(self._taken(), sorted(ticket.seat_index for ticket in resold))
+    
+    def test_single_ticket_gets_a_seat(self):
+        ticket = Ticket.objects.create(ticket_type=self.ticket_type, user=self.user)
+        
+        self.assertEqual(ticket.seat_section_id, self.section.id)
+        self.assertEqual(self._taken(), [ticket.seat_index])
+    
+    def test_late_payment_gets_its_seats_back_unless_resold(self):
+        payment, tickets = process_ticket_purchase(self.user, {self.ticket_type.id: 2}, 'credit_card')
+        release_tickets(payment.tickets.all())
+        
+        # Someone takes one of the two seats meanwhile
+        lost_seat = tickets[0].seat_index
+        hold_seats(self.section, [lost_seat])
+        
+        with self.assertLogs('tickets.seating', level='WARNING'):
+            confirm_tickets(payment.tickets.all())
+        
+        revived = {ticket.pk: ticket for ticket in payment.tickets.all()}
+        self.assertEqual(revived[tickets[0].pk].status, 'confirmed')
+        self.assertIsNone(revived[tickets[0].pk].seat_section_id)
+        self.assertEqual(revived[tickets[1].pk].seat_index, tickets[1].seat_index)
+        self.assertEqual(self._taken(), sorted([lost_seat, tickets[1].seat_index]))
+    
+    def test_large_section_map(self):
+        arena = SeatSection.objects.create(
+            ticket_type=self.ticket_type,
+            name="Arena",
+            rows=200,
+            seats_per_row=250
+        )
+        
+        seats = hold_best_available(arena, 6)
+        self.assertEqual(seats, list(range(122, 128)))
+        release_seats(arena, seats[:2])
+        
+        arena.refresh_from_db()
+        payload = seat_map(arena)
+        self.assertEqual(payload['available'], 50000 - 4)
+        self.assertEqual(payload['version'], 2)
+        # 50,000 seats in 6,250 bytes, base64 encoded
+        self.assertEqual(len(payload['taken']), 8336)
+
+
+class WaitlistTest(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Sold Out Show",
+            description="Test description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General",
+            price=Decimal('30.00'),
+            quantity_available=4
+        )
+        
+        # An early buyer takes every ticket
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='testpassword123')
+        self.payment, _ = process_ticket_purchase(self.buyer, {self.ticket_type.id: 4}, 'credit_card')
+        self.ticket_type.refresh_from_db()
+        
+        self.waiters = [
+            User.objects.create_user(username=f'waiter{n}', email=f'waiter{n}@example.com', password='testpassword123')
+            for n in range(3)
+        ]
+    
+    def _free_tickets(self, quantity):
+        live = self.payment.tickets.exclude(status='cancelled')
+        release_tickets(Ticket.objects.filter(pk__in=live.values('pk')[:quantity]))
+    
+    def _counters(self):
+        self.ticket_type.refresh_from_db()
+        self.event.refresh_from_db()
+        return self.ticket_type.quantity_sold, self.event.attendee_count
+    
+    def test_join_only_sold_out_limited_types(self):
+        join_waitlist(self.waiters[0], self.ticket_type, 2)
+        
+        with self.assertRaises(ValueError):
+            join_waitlist(self.waiters[0], self.ticket_type, 1)
+        with self.assertRaises(ValueError):
+            join_waitlist(self.waiters[1], self.ticket_type, 5)
+        
+        unlimited = TicketType.objects.create(event=self.event, name="Standing", price=Decimal('10.00'))
+        with self.assertRaises(ValueError):
+            join_waitlist(self.waiters[1], unlimited, 1)
+        
+        self._free_tickets(1)
+        self.ticket_type.refresh_from_db()
+        with self.assertRaises(ValueError):
+            join_waitlist(self.waiters[1], self.ticket_type, 1)
+    
+    def test_full_event_counts_as_sold_out(self):
+        TicketType.objects.filter(pk=self.ticket_type.pk).update(quantity_available=10)
+        Event.objects.filter(pk=self.event.pk).update(max_attendees=4)
+        self.ticket_type.refresh_from_db()
+        
+        # The type has stock left, but the event has no places
+        entry = join_waitlist(self.waiters[0], self.ticket_type, 1)
+        self.assertEqual(promote_waitlist(), (0, 0))
+        
+        self._free_tickets(1)
+        self.assertEqual(promote_waitlist(), (1, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'offered')
+    
+    def test_offers_show_in_the_summary(self):
+        join_waitlist(self.waiters[0], self.ticket_type, 2)
+        self._free_tickets(2)
+        self.assertFalse(EventSummary.objects.get(event=self.event).sold_out)
+        
+        promote_waitlist()
+        summary = EventSummary.objects.get(event=self.event)
+        self.assertEqual((summary.sold, summary.remaining, summary.sold_out), (2, 0, True))
+        
+        expire_offers(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(EventSummary.objects.get(event=self.event).remaining, 2)
+    
+    def test_promotion_is_first_come_first_served(self):
+        first = join_waitlist(self.waiters[0], self.ticket_type, 1)
+        second = join_waitlist(self.waiters[1], self.ticket_type, 2)
+        third = join_waitlist(self.waiters[2], self.ticket_type, 1)
+        
+        self._free_tickets(2)
+        self.assertEqual(promote_waitlist(), (1, 1))
+        
+        # The second waiter does not fit, and nobody jumps the queue
+        statuses = dict(WaitlistEntry.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {first.pk: 'offered', second.pk: 'waiting', third.pk: 'waiting'})
+        self.assertEqual(self._counters(), (3, 3))
+        
+        self._free_tickets(1)
+        self.assertEqual(promote_waitlist(), (1, 2))
+        self.assertEqual(self._counters(), (4, 4))
+        self.assertEqual(promote_waitlist(), (0, 0))
+        third.refresh_from_db()
+        self.assertEqual(third.status, 'waiting')
+    
+    def test_promotion_queries_do_not_grow_with_the_batch(self):
+        def promote(waiters):
+            WaitlistEntry.objects.all().delete()
+            self.payment.tickets.update(status='confirmed')
+            TicketType.objects.filter(pk=self.ticket_type.pk).update(quantity_available=4, quantity_sold=4)
+            Event.objects.filter(pk=self.event.pk).update(attendee_count=4)
+            WaitlistEntry.objects.bulk_create(
+                WaitlistEntry(ticket_type=self.ticket_type, user=User.objects.create_user(username=f'w{waiters}-{n}'))
+                for n in range(waiters)
+            )
+            TicketType.objects.filter(pk=self.ticket_type.pk).update(quantity_available=4 + waiters)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(promote_waitlist(), (waiters, waiters))
+            return len(queries)
+        
+        self.assertEqual(promote(3), promote(40))
+    
+    def test_expired_offers_go_to_the_next_waiter(self):
+        first = join_waitlist(self.waiters[0], self.ticket_type, 2)
+        second = join_waitlist(self.waiters[1], self.ticket_type, 2)
+        
+        self._free_tickets(2)
+        promote_waitlist()
+        
+        self.assertEqual(expire_offers(now=timezone.now() + timedelta(days=1)), 1)
+        self.assertEqual(self._counters(), (2, 2))
+        
+        promote_waitlist()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('expired', 'offered'))
+        self.assertEqual(self._counters(), (4, 4))
+    
+    def test_purchase_uses_the_offered_stock(self):
+        entry = join_waitlist(self.waiters[0], self.ticket_type, 2)
+        self._free_tickets(2)
+        promote_waitlist()
+        entry.refresh_from_db()
+        
+        payment, tickets = purchase_offer(entry)
+        
+        self.assertEqual(len(tickets), 2)
+        self.assertEqual(payment.amount, Decimal('60.00'))
+        self.assertEqual(payment.payment_status, 'pending')
+        self.assertEqual(self._counters(), (4, 4))
+        self.assertEqual(rebuild_counters(), 0)
+        
+        with self.assertRaises(ValueError):
+            purchase_offer(entry)
+    
+    def test_expired_offer_cannot_be_purchased(self):
+        entry = join_waitlist(self.waiters[0], self.ticket_type, 1)
+        self._free_tickets(1)
+        promote_waitlist(now=timezone.now() - timedelta(days=1))
+        entry.refresh_from_db()
+        
+        with self.assertRaises(ValueError):
+            purchase_offer(entry)
+        self.assertFalse(Ticket.objects.filter(user=self.waiters[0]).exists())
+    
+    def test_leaving_gives_the_offer_back(self):
+        entry = join_waitlist(self.waiters[0], self.ticket_type, 1)
+        self._free_tickets(1)
+        promote_waitlist()
+        
+        self.assertTrue(leave_waitlist(entry))
+        self.assertEqual(self._counters(), (3, 3))
+        self.assertFalse(leave_waitlist(entry))
+    
+    def test_rebuild_counts_open_offers(self):
+        join_waitlist(self.waiters[0], self.ticket_type, 2)
+        self._free_tickets(2)
+        promote_waitlist()
+        
+        self.assertEqual(rebuild_counters(), 0)
+        self.assertEqual(rebuild_attendee_counts(), 0)
+        self.assertEqual(self._counters(), (4, 4))
+    
+    def test_offers_are_emailed_once(self):
+        for waiter in self.waiters:
+            join_waitlist(waiter, self.ticket_type, 1)
+        self._free_tickets(3)
+        promote_waitlist()
+        
+        self.assertEqual(send_offer_notifications(batch_size=2), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn("Sold Out Show", mail.outbox[0].subject)
+        self.assertEqual(send_offer_notifications(), 0)
+        self.assertFalse(WaitlistEntry.objects.filter(notified_at__isnull=True).exists())
+    
+    def test_process_waitlist_command(self):
+        join_waitlist(self.waiters[0], self.ticket_type, 1)
+        self._free_tickets(1)
+        
+        out = StringIO()
+        call_command('process_waitlist', stdout=out)
+        
+        self.assertIn("made 1 new offer(s), sent 1 email(s)", out.getvalue())
+
@@ -1,13 +1,32 @@
 # tickets/tests/test_views.py
 from django.test import TestCase, Client
+from django.core.cache import cache
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+import json
 import uuid
 from events.models import Event, EventCategory
-from tickets.models import Ticket, TicketType
-from tickets.utils import validate_ticket_purchase, create_ticket
+from tickets.models import SeatSection, Ticket, TicketType, WaitlistEntry
+from tickets.utils import validate_ticket_purchase, create_ticket, generate_qr_code
+from tickets.qr import get_qr_data_uri, get_qr_image
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+import threading
+from tickets.pdf import get_artifact_path, get_export_tickets, get_ticket_pdf
+import io
+import zipfile
+from tickets.checkin_stream import publish_check_in, stream_check_ins
+from tickets.inventory import confirm_tickets, release_tickets
+from tickets.manifest import build_manifest, parse_manifest
+from tickets.seating import hold_seats
+from tickets.waitlist import promote_waitlist
+from django.core import signing
 from payments.models import Payment
 
 class TicketViewsTest(TestCase):
@@ -205,6 +224,18 @@ class TicketViewsTest(TestCase):
         self.assertTrue(self.ticket.checked_in)
         self.assertEqual(self.ticket.status, 'used')
     
+    def test_check_in_ticket_needs_a_confirmed_ticket(self):
+        """Test that cancelled tickets are not checked in"""
+        Ticket.objects.filter(pk=self.ticket.pk).update(status='cancelled')
+        self.client.login(username='staff', password='staffpass123')
+        
+        response = self.client.get(reverse('check_in_ticket', args=[self.ticket.ticket_code]))
+        
+        self.assertEqual(response.status_code, 302)
+        self.ticket.refresh_from_db()
+        self.assertFalse(self.ticket.checked_in)
+        self.assertEqual(self.ticket.status, 'cancelled')
+    
     def test_scan_ticket_page(self):
         """Test ticket scanning page"""
         self.client.login(username='staff', password='staffpass123')
@@ -431,6 +462,32 @@ class TicketUtilsTest(TestCase):
         self.assertEqual(ticket.user, self.user)
         self.assertEqual(ticket.status, 'pending')
         self.assertIsNotNone(ticket.ticket_code)
+    
+    def test_qr_code_rendered_once(self):
+        """Test QR codes are served from cache after the first render"""
+        cache.clear()
+        get_qr_image.cache_clear()
+        code = str(uuid.uuid4())
+        
+        with patch('tickets.qr.generate_qr_code', wraps=generate_qr_code) as render:
+            first = get_qr_data_uri(code, 'png')
+            self.assertEqual(get_qr_data_uri(code, 'png'), first)
+            
+            # Another process only has the shared cache
+            get_qr_image.cache_clear()
+            self.assertEqual(get_qr_data_uri(code, 'png'), first)
+        
+        self.assertEqual(render.call_count, 1)
+        self.assertTrue(first.startswith('data:image/png;base64,'))
+    
+    def test_qr_code_svg(self):
+        """Test compact SVG QR codes"""
+        svg = get_qr_image(str(uuid.uuid4()), 'svg')
+        
+        self.assertTrue(svg.startswith(b'<svg'))
+        self.assertLess(len(svg), 4000)
+        with self.assertRaises(ValueError):
+            get_qr_image('data', 'gif')
 
 
 class TicketAPITest(TestCase):
@@ -507,6 +564,31 @@ class TicketAPITest(TestCase):
         self.assertTrue(self.ticket.checked_in)
         self.assertIsNotNone(self.ticket.checked_in_time)
     
+    def test_ticket_check_in_api_needs_a_confirmed_ticket(self):
+        """Test that pending tickets cannot be checked in through the API"""
+        Ticket.objects.filter(pk=self.ticket.pk).update(status='pending')
+        self.client.login(username='testuser', password='testpassword123')
+        
+        response = self.client.post(f'/api/tickets/tickets/{self.ticket.id}/check_in/')
+        
+        self.assertEqual(response.status_code, 400)
+        self.ticket.refresh_from_db()
+        self.assertFalse(self.ticket.checked_in)
+        self.assertEqual(self.ticket.status, 'pending')
+    
+    def test_create_ticket_api_assigns_a_seat(self):
+        """Test that tickets of seated types created through the API get a seat, or are refused"""
+        section = SeatSection.objects.create(ticket_type=self.ticket_type, name="Box", rows=1, seats_per_row=1)
+        self.client.login(username='testuser', password='testpassword123')
+        
+        response = self.client.post('/api/tickets/tickets/', {'ticket_type': self.ticket_type.id, 'user': self.user.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['seat_section'], response.json()['seat_index']), (section.id, 0))
+        
+        response = self.client.post('/api/tickets/tickets/', {'ticket_type': self.ticket_type.id, 'user': self.user.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Ticket.objects.filter(seat_section=section).count(), 1)
+    
     def test_ticket_type_list_api(self):
         """Test ticket type list API endpoint"""
         response = self.client.get('/api/tickets/types/')
@@ -515,4 +597,774 @@ class TicketAPITest(TestCase):
         data = response.json()
         self.assertIn('results', data)
         self.assertEqual(len(data['results']), 1)
-        self.assertEqual(data['results'][0]['name'], 'General')
\ No newline at end of file
+        self.assertEqual(data['results'][0]['name'], 'General')
+
+class CheckInStreamTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='organizerpass123'
+        )
+        self.staff = User.objects.create_user(
+            username='staff',
+            email='staff@example.com',
+            password='staffpass123',
+            is_staff=True
+        )
+        self.attendee = User.objects.create_user(
+            username='attendee',
+            email='attendee@example.com',
+            password='attendeepass123',
+            first_name='Ada',
+            last_name='Lovelace'
+        )
+        
+        self.event = Event.objects.create(
+            title="Live Event",
+            description="Test Description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=100
+        )
+        
+        self.tickets = [
+            Ticket.objects.create(ticket_type=self.ticket_type, user=self.attendee, status='confirmed')
+            for _ in range(3)
+        ]
+    
+    def _collect(self, count, **kwargs):
+        """Read the first few messages of the event's stream"""
+        async def collect():
+            stream = stream_check_ins(self.event.id, poll_interval=0.01, max_duration=1, **kwargs)
+            messages = []
+            async for chunk in stream:
+                if chunk.startswith(('retry:', ':')):
+                    continue
+                messages.append(chunk)
+                if len(messages) == count:
+                    break
+            await stream.aclose()
+            return messages
+        
+        return async_to_sync(collect)()
+    
+    def test_check_in_publishes_once_committed(self):
+        self.client.force_login(self.staff)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/tickets/tickets/{self.tickets[0].id}/check_in/')
+        self.assertEqual(response.status_code, 200)
+        
+        messages = self._collect(1, last_seq=0)
+        self.assertIn('id: 1', messages[0])
+        self.assertIn('event: checkin', messages[0])
+        
+        data = json.loads(messages[0].split('data: ', 1)[1])
+        self.assertEqual(data['counts'], {'checked_in': 1, 'total': 3})
+        self.assertEqual(data['scans'][0]['attendee'], 'Ada Lovelace')
+        self.assertEqual(data['scans'][0]['ticket_code'], str(self.tickets[0].ticket_code))
+    
+    def test_new_client_gets_snapshot_then_scans(self):
+        messages = self._collect(1)
+        self.assertIn('event: counts', messages[0])
+        self.assertEqual(json.loads(messages[0].split('data: ', 1)[1]), {'checked_in': 0, 'total': 3})
+        
+        for ticket in self.tickets[:2]:
+            ticket.checked_in = True
+            ticket.checked_in_time = timezone.now()
+            ticket.status = 'used'
+            ticket.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                publish_check_in(ticket)
+        
+        # A client resuming after the first scan only receives the second
+        messages = self._collect(1, last_seq=1)
+        data = json.loads(messages[0].split('data: ', 1)[1])
+        self.assertIn('id: 2', messages[0])
+        self.assertEqual(len(data['scans']), 1)
+        self.assertEqual(data['counts']['checked_in'], 2)
+    
+    def test_stream_view_permissions(self):
+        url = reverse('check_in_stream', args=[self.event.id])
+        
+        self.client.force_login(self.attendee)
+        self.assertEqual(self.client.get(url).status_code, 403)
+    
+    async def test_stream_view_sends_event_stream(self):
+        await self.async_client.aforce_login(self.organizer)
+        
+        with self.settings(CHECKIN_STREAM_POLL_SECONDS=0.01, CHECKIN_STREAM_MAX_SECONDS=0.05):
+            response = await self.async_client.get(reverse('check_in_stream', args=[self.event.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertIn(b'event: counts', body)
+
+class TicketScannerAPITest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='organizerpass123'
+        )
+        self.attendee = User.objects.create_user(
+            username='attendee',
+            email='attendee@example.com',
+            password='attendeepass123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Gate Event",
+            description="Test Description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        self.other_event = Event.objects.create(
+            title="Other Event",
+            description="Test Description",
+            organizer=self.attendee,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=100
+        )
+        self.other_type = TicketType.objects.create(
+            event=self.other_event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=100
+        )
+        
+        self.tickets = [
+            Ticket.objects.create(ticket_type=self.ticket_type, user=self.attendee, status='confirmed')
+            for _ in range(5)
+        ]
+        self.url = '/api/tickets/tickets/scan/'
+    
+    def test_single_scan_admits_once(self):
+        self.client.force_login(self.organizer)
+        payload = {'event': self.event.id, 'code': str(self.tickets[0].ticket_code)}
+        
+        response = self.client.post(self.url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result'], 'checked_in')
+        
+        response = self.client.post(self.url, payload, content_type='application/json')
+        self.assertEqual(response.json()['result'], 'already_checked_in')
+        
+        self.tickets[0].refresh_from_db()
+        self.assertTrue(self.tickets[0].checked_in)
+        self.assertEqual(self.tickets[0].status, 'used')
+    
+    def test_batch_scan_results(self):
+        self.tickets[1].status = 'cancelled'
+        self.tickets[1].save()
+        other_ticket = Ticket.objects.create(ticket_type=self.other_type, user=self.attendee, status='confirmed')
+        scanned_at = timezone.now() - timedelta(minutes=30)
+        
+        self.client.force_login(self.organizer)
+        response = self.client.post(self.url, {
+            'event': self.event.id,
+            'scans': [
+                {'code': str(self.tickets[0].ticket_code), 'scanned_at': scanned_at.isoformat()},
+                {'code': str(self.tickets[1].ticket_code)},
+                {'code': str(other_ticket.ticket_code)},
+                {'code': str(uuid.uuid4())},
+                {'code': 'not-a-code'},
+                {'code': str(self.tickets[0].ticket_code)},
+            ]
+        }, content_type='application/json')
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['checked_in'], 1)
+        self.assertEqual(
+            [result['result'] for result in data['results']],
+            ['checked_in', 'invalid_status', 'wrong_event', 'not_found', 'not_found', 'duplicate']
+        )
+        
+        # Offline scans keep the time they were made at the gate
+        self.tickets[0].refresh_from_db()
+        self.assertEqual(self.tickets[0].checked_in_time, scanned_at)
+        other_ticket.refresh_from_db()
+        self.assertFalse(other_ticket.checked_in)
+    
+    def test_batch_scan_query_count(self):
+        self.client.force_login(self.organizer)
+        codes = [{'code': str(ticket.ticket_code)} for ticket in self.tickets]
+        
+        # Session, user, permission check, savepoint pair, lookup, update
+        # and the event summary UPDATE
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, {
+                'event': self.event.id,
+                'scans': codes,
+            }, content_type='application/json')
+        self.assertEqual(response.json()['checked_in'], 5)
+    
+    def test_scan_requires_organizer(self):
+        self.client.force_login(self.attendee)
+        
+        response = self.client.post(self.url, {
+            'event': self.event.id,
+            'code': str(self.tickets[0].ticket_code)
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        
+        response = self.client.post(self.url, {
+            'code': str(self.tickets[0].ticket_code)
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        
+        self.tickets[0].refresh_from_db()
+        self.assertFalse(self.tickets[0].checked_in)
+    
+    def test_scan_requires_code_or_scans(self):
+        self.client.force_login(self.organizer)
+        
+        response = self.client.post(self.url, {'event': self.event.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_scans_are_published_to_the_stream(self):
+        self.client.force_login(self.organizer)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {
+                'event': self.event.id,
+                'scans': [{'code': str(ticket.ticket_code)} for ticket in self.tickets[:3]],
+            }, content_type='application/json')
+        
+        self.assertEqual(cache.get(f"checkin:{self.event.id}:seq"), 3)
+        self.assertEqual(cache.get(f"checkin:{self.event.id}:counts"), {'checked_in': 3, 'total': 5})
+
+
+class ScanManifestTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='organizerpass123'
+        )
+        self.attendee = User.objects.create_user(
+            username='attendee',
+            email='attendee@example.com',
+            password='attendeepass123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Gate Event",
+            description="Test Description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=100
+        )
+        
+        self.tickets = [
+            Ticket.objects.create(ticket_type=self.ticket_type, user=self.attendee, status='confirmed')
+            for _ in range(4)
+        ]
+        self.pending = Ticket.objects.create(ticket_type=self.ticket_type, user=self.attendee, status='pending')
+    
+    def test_full_manifest_lists_admissible_codes(self):
+        self.tickets[0].checked_in = True
+        self.tickets[0].status = 'used'
+        self.tickets[0].save()
+        
+        manifest = parse_manifest(build_manifest(self.event.id)[0])
+        
+        self.assertEqual(manifest['kind'], 'full')
+        self.assertEqual(manifest['event_id'], self.event.id)
+        self.assertEqual(manifest['valid'], sorted(ticket.ticket_code for ticket in self.tickets[1:]))
+        self.assertEqual(manifest['revoked'], [])
+    
+    def test_delta_since_previous_manifest(self):
+        _, generated_at = build_manifest(self.event.id)
+        
+        release_tickets(Ticket.objects.filter(pk=self.tickets[0].pk))
+        self.client.force_login(self.organizer)
+        self.client.post('/api/tickets/tickets/scan/', {
+            'event': self.event.id,
+            'code': str(self.tickets[1].ticket_code)
+        }, content_type='application/json')
+        confirm_tickets(Ticket.objects.filter(pk=self.pending.pk))
+        
+        manifest = parse_manifest(build_manifest(self.event.id, since=generated_at)[0])
+        
+        self.assertEqual(manifest['kind'], 'delta')
+        self.assertEqual(manifest['valid'], [self.pending.ticket_code])
+        self.assertEqual(manifest['revoked'], sorted([self.tickets[0].ticket_code, self.tickets[1].ticket_code]))
+    
+    def test_tampered_manifest_is_rejected(self):
+        manifest = bytearray(build_manifest(self.event.id)[0])
+        manifest[40] ^= 0xFF
+        
+        with self.assertRaises(signing.BadSignature):
+            parse_manifest(bytes(manifest))
+    
+    def test_manifest_view(self):
+        url = reverse('scan_manifest', args=[self.event.id])
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        
+        self.client.force_login(self.attendee)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        
+        self.client.force_login(self.organizer)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(len(parse_manifest(response.content)['valid']), 4)
+        
+        # The generated_at header is the cursor for the next delta
+        response = self.client.get(url, {'since': response['X-Manifest-Generated-At']})
+        manifest = parse_manifest(response.content)
+        self.assertEqual(manifest['kind'], 'delta')
+        self.assertEqual(manifest['valid'], [])
+        
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+    
+    def test_check_in_attendee_reconciles_scans(self):
+        url = reverse('check_in_attendee', args=[self.event.id])
+        self.client.force_login(self.organizer)
+        
+        response = self.client.post(url, {'ticket_code': str(self.tickets[0].ticket_code)})
+        self.assertTrue(response.json()['success'])
+        
+        response = self.client.post(url, {'ticket_code': str(self.tickets[0].ticket_code)})
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(response.json()['message'], "Ticket has already been used.")
+        
+        response = self.client.post(url, {'ticket_code': 'not-a-code'})
+        self.assertFalse(response.json()['success'])
+
+
+class TicketPDFTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword123'
+        )
+        self.recipient = User.objects.create_user(
+            username='recipient',
+            email='recipient@example.com',
+            password='recipientpass123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test Description",
+            organizer=self.user,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=100
+        )
+        
+        self.ticket = Ticket.objects.create(
+            ticket_type=self.ticket_type,
+            user=self.user,
+            status='confirmed'
+        )
+        self.url = reverse('download_ticket', args=[self.ticket.ticket_code])
+    
+    def store_pdf(self, ticket):
+        path = get_artifact_path(ticket)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as pdf:
+            pdf.write(b'%PDF-1.7 stored')
+        return path
+    
+    @patch('tickets.ticket_views.is_weasyprint_available', return_value=True)
+    def test_stored_pdf_is_served(self, available):
+        self.store_pdf(self.ticket)
+        self.client.force_login(self.user)
+        
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 stored')
+    
+    @patch('tickets.ticket_views.is_weasyprint_available', return_value=True)
+    def test_download_waits_for_render_then_serves(self, available):
+        release = threading.Event()
+        
+        def render(html, path):
+            release.wait(5)
+            with open(path, 'wb') as pdf:
+                pdf.write(b'%PDF-1.7 rendered')
+            return path
+        
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        os.makedirs(os.path.dirname(get_artifact_path(self.ticket)), exist_ok=True)
+        self.client.force_login(self.user)
+        
+        with patch('tickets.pdf.get_executor', return_value=executor), \
+                patch('tickets.pdf.render_pdf', side_effect=render) as render_pdf, \
+                self.settings(PDF_RENDER_WAIT_SECONDS=0):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 202)
+            self.assertIn('Retry-After', response)
+            
+            # A second request while rendering joins the same job
+            self.assertEqual(self.client.get(self.url).status_code, 202)
+            
+            release.set()
+            get_ticket_pdf(self.ticket, wait=5)
+            response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 rendered')
+        self.assertEqual(render_pdf.call_count, 1)
+    
+    def test_transfer_invalidates_pdf(self):
+        path = self.store_pdf(self.ticket)
+        self.client.force_login(self.user)
+        
+        self.client.post(reverse('transfer_ticket', args=[self.ticket.ticket_code]), {
+            'recipient_username': 'recipient'
+        })
+        self.ticket.refresh_from_db()
+        
+        self.assertEqual(self.ticket.user, self.recipient)
+        self.assertFalse(os.path.exists(path))
+        self.assertNotEqual(get_artifact_path(self.ticket), path)
+    
+    def test_event_edit_invalidates_pdfs(self):
+        path = self.store_pdf(self.ticket)
+        
+        self.event.location = "New Venue"
+        self.event.save()
+        self.ticket.refresh_from_db()
+        
+        self.assertFalse(os.path.exists(path))
+        self.assertNotEqual(get_artifact_path(self.ticket), path)
+    
+    def test_seat_change_changes_the_pdf(self):
+        path = self.store_pdf(self.ticket)
+        section = SeatSection.objects.create(ticket_type=self.ticket_type, name="Stalls", rows=2, seats_per_row=5)
+        
+        Ticket.objects.filter(pk=self.ticket.pk).update(seat_section=section, seat_index=3)
+        self.ticket.refresh_from_db()
+        
+        self.assertNotEqual(get_artifact_path(self.ticket), path)
+
+
+class TicketBulkExportTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        
+        self.client = Client()
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='organizerpass123'
+        )
+        self.buyer = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='buyerpass123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Test Event",
+            description="Test Description",
+            organizer=self.organizer,
+            location="Test Location",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="General Admission",
+            price=50.00,
+            quantity_available=100
+        )
+        
+        self.tickets = [
+            Ticket.objects.create(ticket_type=self.ticket_type, user=self.buyer, status='confirmed')
+            for _ in range(3)
+        ]
+        self.cancelled = Ticket.objects.create(ticket_type=self.ticket_type, user=self.buyer, status='cancelled')
+        
+        self.payment = Payment.objects.create(
+            user=self.buyer,
+            amount=150.00,
+            payment_method='offline',
+            payment_status='completed'
+        )
+        self.payment.tickets.add(*self.tickets, self.cancelled)
+        
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+    
+    def render(self, html, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as pdf:
+            pdf.write(b'%PDF-1.7 ticket')
+        return path
+    
+    def render_pages(self, pages, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as pdf:
+            pdf.write(f'%PDF-1.7 {len(pages)} pages'.encode())
+        return path
+    
+    def test_export_tickets_fetched_in_one_query(self):
+        with self.assertNumQueries(1):
+            tickets = get_export_tickets(Ticket.objects.filter(ticket_type__event=self.event))
+            for ticket in tickets:
+                ticket.user.username, ticket.ticket_type.event.title, ticket.seat_label
+        
+        self.assertEqual(len(tickets), 3)
+    
+    @patch('tickets.ticket_views.is_weasyprint_available', return_value=True)
+    def test_order_pdf(self, available):
+        self.client.force_login(self.buyer)
+        
+        with patch('tickets.pdf.get_executor', return_value=self.executor), \
+                patch('tickets.pdf.render_pdf_pages', side_effect=self.render_pages) as render_pages:
+            response = self.client.get(reverse('download_order_tickets', args=[self.payment.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 3 pages')
+            
+            # The stored batch is reused
+            self.client.get(reverse('download_order_tickets', args=[self.payment.id]))
+        
+        self.assertEqual(render_pages.call_count, 1)
+    
+    @patch('tickets.ticket_views.is_weasyprint_available', return_value=True)
+    def test_event_zip_reuses_stored_pdfs(self, available):
+        self.render('', get_artifact_path(
+            Ticket.objects.select_related('ticket_type__event', 'user').get(pk=self.tickets[0].pk)
+        ))
+        self.client.force_login(self.organizer)
+        
+        with patch('tickets.pdf.get_executor', return_value=self.executor), \
+                patch('tickets.pdf.render_pdf', side_effect=self.render) as render_pdf:
+            response = self.client.get(reverse('export_event_tickets', args=[self.event.id]))
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        
+        self.assertEqual(
+            sorted(archive.namelist()),
+            sorted(f"ticket_{ticket.ticket_code}.pdf" for ticket in self.tickets)
+        )
+        self.assertEqual(render_pdf.call_count, 2)
+    
+    def test_export_permissions(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse('export_event_tickets', args=[self.event.id]))
+        self.assertEqual(response.status_code, 403)
+        
+        self.client.force_login(self.organizer)
+        response = self.client.get(reverse('download_order_tickets', args=[self.payment.id]))
+        self.assertEqual(response.status_code, 302)
+    
+    def test_export_without_weasyprint(self):
+        self.client.force_login(self.buyer)
+        
+        with patch('tickets.ticket_views.is_weasyprint_available', return_value=False):
+            response = self.client.get(reverse('download_order_tickets', args=[self.payment.id]))
+        
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response.content.count(b'Ticket Code:'), 3)
+
+
+class SeatAvailabilityViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        
+        self.organizer = User.objects.create_user(
+            username='organizer',
+            email='organizer@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Seated Show",
+            description="Test description",
+            organizer=self.organizer,
+            location="Theatre",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="Circle",
+            price=30.00,
+            quantity_available=0
+        )
+        
+        self.section = SeatSection.objects.create(
+            ticket_type=self.ticket_type,
+            name="Circle",
+            rows=4,
+            seats_per_row=12
+        )
+        hold_seats(self.section, [0, 13])
+        
+        self.url = reverse('seat_availability', args=[self.section.id])
+    
+    def test_json_map(self):
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['rows'], data['seats_per_row'], data['available']), (4, 12, 46))
+        self.assertEqual(data['taken'], 'ASAAAAAA')
+    
+    def test_binary_map(self):
+        response = self.client.get(self.url, {'format': 'binary'})
+        
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(response.content, bytes([0x01, 0x20, 0, 0, 0, 0]))
+        self.assertEqual(response['X-Seats-Per-Row'], '12')
+    
+    def test_unchanged_map_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        
+        hold_seats(self.section, [20])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['available'], 45)
+    
+    def test_draft_event_map_is_hidden(self):
+        Event.objects.filter(pk=self.event.pk).update(status='draft')
+        
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        
+        self.client.force_login(self.organizer)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class WaitlistViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        
+        self.user = User.objects.create_user(
+            username='waiter',
+            email='waiter@example.com',
+            password='testpassword123'
+        )
+        
+        self.event = Event.objects.create(
+            title="Popular Show",
+            description="Test description",
+            organizer=self.user,
+            location="Arena",
+            start_date=timezone.now() + timedelta(days=1),
+            end_date=timezone.now() + timedelta(days=2),
+            status="published"
+        )
+        
+        self.ticket_type = TicketType.objects.create(
+            event=self.event,
+            name="Floor",
+            price=50.00,
+            quantity_available=2,
+            quantity_sold=2
+        )
+        
+        self.client.login(username='waiter', password='testpassword123')
+        self.detail_url = reverse('event_detail', args=[self.event.id])
+    
+    def test_join_from_event_page(self):
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, reverse('join_waitlist', args=[self.ticket_type.id]))
+        
+        response = self.client.post(
+            reverse('join_waitlist', args=[self.ticket_type.id]),
+            {f'waitlist_quantity[{self.ticket_type.id}]': '2'}
+        )
+        
+        self.assertRedirects(response, self.detail_url)
+        entry = WaitlistEntry.objects.get(user=self.user)
+        self.assertEqual((entry.quantity, entry.status), (2, 'waiting'))
+        self.assertContains(self.client.get(self.detail_url), "on the waitlist for 2")
+    
+    def test_purchase_offer_goes_to_checkout(self):
+        entry = WaitlistEntry.objects.create(ticket_type=self.ticket_type, user=self.user, quantity=1)
+        TicketType.objects.filter(pk=self.ticket_type.pk).update(quantity_sold=1)
+        promote_waitlist()
+        
+        self.assertContains(self.client.get(self.detail_url), "reserved for you")
+        
+        response = self.client.post(reverse('purchase_waitlist_offer', args=[entry.id]))
+        
+        payment = Payment.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('select_payment_method', args=[payment.id]), fetch_redirect_response=False)
+        self.assertEqual(payment.tickets.count(), 1)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'purchased')
+    
+    def test_leave_waitlist(self):
+        entry = WaitlistEntry.objects.create(ticket_type=self.ticket_type, user=self.user)
+        
+        response = self.client.post(reverse('leave_waitlist', args=[entry.id]))
+        
+        self.assertRedirects(response, self.detail_url)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'left')
+
@@ -1,19 +1,28 @@
 # tickets/ticket_views.py
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.contrib import messages
 from django.db import transaction
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied
+from django.views.decorators.http import condition
 
-from .models import Ticket, TicketType
-from .utils import generate_ticket_pdf, generate_qr_code
+from .models import SeatSection, Ticket, TicketType, WaitlistEntry
+from .checkin import check_in_ticket_code
+from .checkin_stream import stream_check_ins
+from .manifest import build_manifest
+from .stats import get_event_ticket_stats
+from .qr import get_qr_data_uri
+from .seating import seat_map
+from . import waitlist
+from .pdf import get_batch_pdf, get_export_tickets, get_ticket_pdf, invalidate_ticket_pdf, iter_tickets_zip
+from .utils import generate_ticket_pdf, is_weasyprint_available
 from events.models import Event
+from payments.models import Payment
 import uuid
-from io import BytesIO
-import base64
+from datetime import datetime, timezone as dt_timezone
 
 
 @login_required
@@ -50,50 +59,119 @@ def ticket_detail(request, ticket_id):
             messages.error(request, "You don't have permission to view this ticket.")
             return redirect('my_tickets')
         
-        # Generate QR code for the ticket
-        qr_image = generate_qr_code(str(ticket.ticket_code))
-        qr_buffer = BytesIO()
-        qr_image.save(qr_buffer)
-        qr_base64 = base64.b64encode(qr_buffer.getvalue()).decode('utf-8')
-        
+        # The QR code is rendered once per ticket and then served from cache
         return render(request, 'tickets/ticket_detail.html', {
             'ticket': ticket,
-            'qr_code': qr_base64,
+            'qr_code': get_qr_data_uri(str(ticket.ticket_code)),
         })
     except Exception as e:
         messages.error(request, f"Error retrieving ticket: {str(e)}")
         return redirect('my_tickets')
 
 
+def _rendering_response(request):
+    """202 asking the browser to retry while a PDF is rendered"""
+    response = HttpResponse(
+        "Your tickets are being prepared. This page will refresh in a moment.",
+        status=202,
+        content_type='text/plain'
+    )
+    response['Retry-After'] = 2
+    response['Refresh'] = 2
+    response['Location'] = request.get_full_path()
+    return response
+
+
 @login_required
 def download_ticket(request, ticket_id):
     """View for downloading a ticket as PDF"""
     try:
-        ticket = get_object_or_404(Ticket, ticket_code=ticket_id)
+        ticket = get_object_or_404(
+            Ticket.objects.select_related('ticket_type__event', 'user', 'seat_section'),
+            ticket_code=ticket_id
+        )
         
         # Check permission: only ticket owner or staff can download
         if ticket.user != request.user and not request.user.is_staff:
             messages.error(request, "You don't have permission to download this ticket.")
             return redirect('my_tickets')
         
-        # Generate PDF
-        pdf_file = generate_ticket_pdf(ticket)
+        filename = f"ticket_{ticket.ticket_code}.pdf"
         
-        # Determine content type based on whether we got a PDF or text
-        content_type = 'application/pdf'
-        if pdf_file.getvalue().startswith(b'PDF generation is not available'):
-            content_type = 'text/plain'
+        if not is_weasyprint_available():
+            # Without WeasyPrint the ticket details are sent as plain text
+            response = HttpResponse(generate_ticket_pdf(ticket), content_type='text/plain')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
         
-        # Create response
-        response = HttpResponse(pdf_file, content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="ticket_{ticket.ticket_code}.pdf"'
+        # Rendered in the PDF pool and stored, so repeat downloads are a file read
+        path = get_ticket_pdf(ticket)
+        if path is None:
+            return _rendering_response(request)
         
-        return response
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf')
     except Exception as e:
         messages.error(request, f"Failed to generate ticket: {str(e)}")
         return redirect('ticket_detail', ticket_id=ticket_id)
 
 
+def _export_response(request, tickets, name, default_format):
+    """One PDF or a streamed ZIP of the given tickets"""
+    if not tickets:
+        raise Http404("No issued tickets to export.")
+    
+    if not is_weasyprint_available():
+        # Without WeasyPrint the ticket details are sent as plain text
+        response = HttpResponse(
+            b'\n'.join(generate_ticket_pdf(ticket).getvalue() for ticket in tickets),
+            content_type='text/plain'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{name}-tickets.txt"'
+        return response
+    
+    if request.GET.get('format', default_format) == 'zip':
+        # Streamed as the PDFs become ready, rendered in parallel across the pool
+        response = StreamingHttpResponse(iter_tickets_zip(tickets), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{name}-tickets.zip"'
+        return response
+    
+    path = get_batch_pdf(tickets, name)
+    if path is None:
+        return _rendering_response(request)
+    
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{name}-tickets.pdf", content_type='application/pdf')
+
+
+@login_required
+def download_order_tickets(request, payment_id):
+    """View for downloading every ticket of an order at once"""
+    payment = get_object_or_404(Payment, id=payment_id)
+    
+    # Check permission: only the buyer or staff can download
+    if payment.user != request.user and not request.user.is_staff:
+        messages.error(request, "You don't have permission to download these tickets.")
+        return redirect('my_tickets')
+    
+    # Buyers get the tickets they still hold, not ones they transferred away
+    tickets = payment.tickets.all()
+    if not request.user.is_staff:
+        tickets = tickets.filter(user=request.user)
+    
+    return _export_response(request, get_export_tickets(tickets), f"order-{payment.id}", default_format='pdf')
+
+
+@login_required
+def export_event_tickets(request, event_id):
+    """View for exporting every issued ticket of an event (organizer or staff)"""
+    event = get_object_or_404(Event, id=event_id)
+    
+    if request.user != event.organizer and not request.user.is_staff:
+        return HttpResponseForbidden("You don't have permission to export tickets for this event.")
+    
+    tickets = get_export_tickets(Ticket.objects.filter(event=event))
+    return _export_response(request, tickets, f"event-{event.id}", default_format='zip')
+
+
 @login_required
 def transfer_ticket(request, ticket_id):
     """View for transferring a ticket to another user"""
@@ -125,6 +203,9 @@ def transfer_ticket(request, ticket_id):
                     messages.error(request, "You cannot transfer a ticket to yourself.")
                     return render(request, 'tickets/transfer_ticket.html', {'ticket': ticket})
                 
+                # The stored PDF carries the old holder's name
+                invalidate_ticket_pdf(ticket)
+                
                 # Update ticket owner
                 ticket.user = recipient
                 ticket.save()
@@ -153,22 +234,16 @@ def check_in_ticket(request, ticket_id):
     try:
         ticket = get_object_or_404(Ticket, ticket_code=ticket_id)
         
-        # Check if ticket is already checked in
-        if ticket.checked_in:
+        result = check_in_ticket_code(ticket.ticket_code)
+        
+        if result['result'] == 'already_checked_in':
             messages.warning(request, "This ticket has already been checked in.")
             return redirect(request.META.get('HTTP_REFERER', 'scan_ticket'))
         
-        # Check if ticket status allows check-in
-        if ticket.status != 'confirmed':
+        if result['result'] != 'checked_in':
             messages.error(request, f"Cannot check in ticket with status: {ticket.get_status_display()}")
             return redirect(request.META.get('HTTP_REFERER', 'scan_ticket'))
         
-        # Perform check-in
-        ticket.checked_in = True
-        ticket.checked_in_time = timezone.now()
-        ticket.status = 'used'
-        ticket.save()
-        
         messages.success(request, "Ticket successfully checked in.")
         
         # Redirect back to referring page or to admin page
@@ -198,61 +273,52 @@ def scan_ticket(request):
             })
         
         try:
-            ticket = Ticket.objects.get(ticket_code=ticket_code)
-            
-            # Check if already checked in
-            if ticket.checked_in:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'This ticket has already been checked in.',
-                    'ticket': {
-                        'event': ticket.ticket_type.event.title,
-                        'type': ticket.ticket_type.name,
-                        'user': ticket.user.username,
-                        'checked_in_time': ticket.checked_in_time.strftime('%Y-%m-%d %H:%M')
-                    }
-                })
-            
-            # Check ticket status
-            if ticket.status != 'confirmed':
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Cannot check in ticket with status: {ticket.get_status_display()}',
-                    'ticket': {
-                        'event': ticket.ticket_type.event.title,
-                        'type': ticket.ticket_type.name,
-                        'user': ticket.user.username,
-                        'status': ticket.get_status_display()
-                    }
-                })
-            
-            # Check in the ticket
-            ticket.checked_in = True
-            ticket.checked_in_time = timezone.now()
-            ticket.status = 'used'
-            ticket.save()
-            
+            # Validation and the check-in itself are one conditional update,
+            # so two scanners cannot admit the same ticket
+            result = check_in_ticket_code(ticket_code)
+        except Exception as e:
             return JsonResponse({
-                'status': 'success',
-                'message': 'Ticket successfully checked in!',
-                'ticket': {
-                    'event': ticket.ticket_type.event.title,
-                    'type': ticket.ticket_type.name,
-                    'user': ticket.user.username,
-                    'checked_in_time': ticket.checked_in_time.strftime('%Y-%m-%d %H:%M')
-                }
+                'status': 'error',
+                'message': f'Error processing ticket: {str(e)}'
             })
-            
-        except Ticket.DoesNotExist:
+        
+        if result['result'] == 'not_found':
             return JsonResponse({
                 'status': 'error',
                 'message': 'Invalid ticket code. No ticket found.'
             })
-        except Exception as e:
+        
+        ticket_info = {
+            'event': result['event'],
+            'type': result['ticket_type'],
+            'user': result['user'],
+        }
+        
+        if result['result'] == 'invalid_status':
+            status_display = dict(Ticket.STATUS_CHOICES).get(result['status'], result['status'])
+            ticket_info['status'] = status_display
             return JsonResponse({
                 'status': 'error',
-                'message': f'Error processing ticket: {str(e)}'
+                'message': f'Cannot check in ticket with status: {status_display}',
+                'ticket': ticket_info
+            })
+        
+        if result['checked_in_time']:
+            checked_in_time = datetime.fromisoformat(result['checked_in_time'])
+            ticket_info['checked_in_time'] = checked_in_time.strftime('%Y-%m-%d %H:%M')
+        
+        if result['result'] == 'already_checked_in':
+            return JsonResponse({
+                'status': 'error',
+                'message': 'This ticket has already been checked in.',
+                'ticket': ticket_info
             })
+        
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Ticket successfully checked in!',
+            'ticket': ticket_info
+        })
     
     # Get recent scan history for display
     recent_scans = Ticket.objects.filter(
@@ -273,27 +339,22 @@ def ticket_stats(request, event_id):
     
     event = get_object_or_404(Event, id=event_id)
     
-    # Get ticket types for this event
-    ticket_types = TicketType.objects.filter(event=event)
+    # Per-type and overall counts come from one grouped query
+    stats = get_event_ticket_stats(event)
     
-    # Calculate stats for each ticket type
     ticket_stats = []
-    for ticket_type in ticket_types:
-        total_tickets = ticket_type.tickets.count()
-        checked_in_tickets = ticket_type.tickets.filter(checked_in=True).count()
-        available = ticket_type.quantity_available - total_tickets if ticket_type.quantity_available > 0 else "Unlimited"
-        
+    for ticket_type in stats['ticket_types']:
         ticket_stats.append({
             'type': ticket_type,
-            'total': total_tickets,
-            'checked_in': checked_in_tickets,
-            'checked_in_percent': (checked_in_tickets / total_tickets * 100) if total_tickets > 0 else 0,
-            'available': available
+            'total': ticket_type.total,
+            'checked_in': ticket_type.checked_in,
+            'checked_in_percent': (ticket_type.checked_in / ticket_type.total * 100) if ticket_type.total > 0 else 0,
+            'available': ticket_type.available
         })
     
-    # Calculate overall stats
-    total_tickets = sum(stat['total'] for stat in ticket_stats)
-    total_checked_in = sum(stat['checked_in'] for stat in ticket_stats)
+    # Overall stats
+    total_tickets = stats['totals']['total']
+    total_checked_in = stats['totals']['checked_in']
     overall_checked_in_percent = (total_checked_in / total_tickets * 100) if total_tickets > 0 else 0
     
     return render(request, 'tickets/ticket_stats.html', {
@@ -302,4 +363,134 @@ def ticket_stats(request, event_id):
         'total_tickets': total_tickets,
         'total_checked_in': total_checked_in,
         'overall_checked_in_percent': overall_checked_in_percent
-    })
\ No newline at end of file
+    })
+
+
+@login_required
+async def check_in_stream(request, event_id):
+    """Server-sent event stream of live check-ins (organizer or staff)"""
+    user = await request.auser()
+    event = await aget_object_or_404(Event, id=event_id)
+    
+    if user.id != event.organizer_id and not user.is_staff:
+        return HttpResponseForbidden("You don't have permission to follow check-ins for this event.")
+    
+    # Browsers send the last id they saw when reconnecting
+    try:
+        last_seq = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        last_seq = None
+    
+    response = StreamingHttpResponse(
+        stream_check_ins(event.id, last_seq=last_seq),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def scan_manifest(request, event_id):
+    """Signed manifest of admissible ticket codes for gate devices (organizer or staff)"""
+    event = get_object_or_404(Event, id=event_id)
+    
+    if request.user != event.organizer and not request.user.is_staff:
+        return HttpResponseForbidden("You don't have permission to download this event's manifest.")
+    
+    # Devices pass the generated_at of their last manifest to get a delta
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = datetime.fromtimestamp(int(request.GET['since']) / 1000, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            return HttpResponseBadRequest("since must be a timestamp in milliseconds.")
+    
+    manifest, generated_at = build_manifest(event.id, since=since)
+    
+    response = HttpResponse(manifest, content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="event_{event.id}_manifest.bin"'
+    response['X-Manifest-Generated-At'] = int(generated_at.timestamp() * 1000)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _seat_map_etag(request, section_id):
+    # Every hold or release bumps the version, so unchanged maps answer 304
+    version = SeatSection.objects.filter(pk=section_id).values_list('version', flat=True).first()
+    return None if version is None else f"seats-{section_id}-{version}-{request.GET.get('format', 'json')}"
+
+@condition(etag_func=_seat_map_etag)
+def seat_availability(request, section_id):
+    """Availability map of a seat section as JSON, or the raw bitmap with ?format=binary"""
+    section = get_object_or_404(SeatSection.objects.select_related('ticket_type__event'), id=section_id)
+    event = section.ticket_type.event
+    
+    if event.status == 'draft' and request.user != event.organizer and not request.user.is_staff:
+        raise Http404("No seat section found.")
+    
+    if request.GET.get('format') == 'binary':
+        response = HttpResponse(bytes(section.taken), content_type='application/octet-stream')
+        response['X-Seat-Rows'] = section.rows
+        response['X-Seats-Per-Row'] = section.seats_per_row
+        response['X-Seat-Map-Version'] = section.version
+        return response
+    
+    return JsonResponse(seat_map(section))
+
+
+@login_required
+def join_waitlist(request, ticket_type_id):
+    """Put the user on the waitlist of a sold-out ticket type"""
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Method not allowed")
+    
+    ticket_type = get_object_or_404(
+        TicketType.objects.select_related('event'), id=ticket_type_id, event__status='published'
+    )
+    
+    try:
+        quantity = int(request.POST.get(f'waitlist_quantity[{ticket_type.id}]', 1))
+        entry = waitlist.join_waitlist(request.user, ticket_type, quantity)
+        position = waitlist.get_queue_position(entry)
+        messages.success(
+            request,
+            f"You are number {position} on the waitlist for {ticket_type.name}. "
+            f"We'll email you as soon as tickets are available."
+        )
+    except ValueError as e:
+        messages.error(request, f"{e}.")
+    
+    return redirect('event_detail', event_id=ticket_type.event_id)
+
+
+@login_required
+def leave_waitlist(request, entry_id):
+    """Take the user off a waitlist, giving up any open offer"""
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Method not allowed")
+    
+    entry = get_object_or_404(WaitlistEntry.objects.select_related('ticket_type'), id=entry_id, user=request.user)
+    
+    if waitlist.leave_waitlist(entry):
+        messages.success(request, f"You have left the waitlist for {entry.ticket_type.name}.")
+    
+    return redirect('event_detail', event_id=entry.ticket_type.event_id)
+
+
+@login_required
+def purchase_waitlist_offer(request, entry_id):
+    """Turn the user's waitlist offer into an order and continue to checkout"""
+    if request.method != 'POST':
+        return HttpResponseBadRequest("Method not allowed")
+    
+    entry = get_object_or_404(WaitlistEntry.objects.select_related('ticket_type'), id=entry_id, user=request.user)
+    
+    try:
+        # Payment method will be selected in checkout
+        payment, _ = waitlist.purchase_offer(entry)
+    except ValueError as e:
+        messages.error(request, f"{e}.")
+        return redirect('event_detail', event_id=entry.ticket_type.event_id)
+    
+    return redirect('select_payment_method', payment_id=payment.id)
@@ -15,8 +15,16 @@ urlpatterns = [
     path('my-tickets/', ticket_views.my_tickets, name='my_tickets'),
     path('ticket/<uuid:ticket_id>/', ticket_views.ticket_detail, name='ticket_detail'),
     path('ticket/<uuid:ticket_id>/download/', ticket_views.download_ticket, name='download_ticket'),
+    path('ticket/order/<int:payment_id>/download/', ticket_views.download_order_tickets, name='download_order_tickets'),
+    path('ticket/export/<int:event_id>/', ticket_views.export_event_tickets, name='export_event_tickets'),
     path('ticket/<uuid:ticket_id>/transfer/', ticket_views.transfer_ticket, name='transfer_ticket'),
     path('check-in/<uuid:ticket_id>/', ticket_views.check_in_ticket, name='check_in_ticket'),
     path('scan/', ticket_views.scan_ticket, name='scan_ticket'),
     path('stats/<int:event_id>/', ticket_views.ticket_stats, name='ticket_stats'),
+    path('stats/<int:event_id>/stream/', ticket_views.check_in_stream, name='check_in_stream'),
+    path('manifest/<int:event_id>/', ticket_views.scan_manifest, name='scan_manifest'),
+    path('seats/<int:section_id>/', ticket_views.seat_availability, name='seat_availability'),
+    path('waitlist/join/<int:ticket_type_id>/', ticket_views.join_waitlist, name='join_waitlist'),
+    path('waitlist/<int:entry_id>/leave/', ticket_views.leave_waitlist, name='leave_waitlist'),
+    path('waitlist/<int:entry_id>/purchase/', ticket_views.purchase_waitlist_offer, name='purchase_waitlist_offer'),
 ]
\ No newline at end of file
@@ -5,11 +5,12 @@ import qrcode
 from io import BytesIO
 import uuid
 from datetime import datetime
-import base64
 import importlib.util
 
-def generate_qr_code(data):
-    """Generate a QR code from the given data"""
+from .inventory import get_remaining
+
+def make_qr(data):
+    """Lay out the QR code for the given data without rendering it"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_H,
@@ -18,6 +19,11 @@ def generate_qr_code(data):
     )
     qr.add_data(data)
     qr.make(fit=True)
+    return qr
+
+def generate_qr_code(data):
+    """Generate a QR code from the given data"""
+    qr = make_qr(data)
     
     img = qr.make_image(fill_color="black", back_color="white")
     return img
@@ -28,25 +34,21 @@ def is_weasyprint_available():
 
 def generate_ticket_pdf(ticket):
     """Generate a PDF ticket"""
-    # Generate QR code as base64 data URL
-    qr_img = generate_qr_code(str(ticket.ticket_code))
-    qr_buffer = BytesIO()
-    qr_img.save(qr_buffer)
-    qr_buffer.seek(0)
-    qr_base64 = base64.b64encode(qr_buffer.getvalue()).decode('utf-8')
+    from .qr import get_qr_data_uri
     
     # Prepare context for the template
     context = {
         'ticket': ticket,
         'event': ticket.ticket_type.event,
-        'qr_code': f"data:image/png;base64,{qr_base64}",
+        'qr_code': get_qr_data_uri(str(ticket.ticket_code)),
         'generated_at': datetime.now(),
     }
     
     # Check if WeasyPrint is available
     if is_weasyprint_available():
         # Import WeasyPrint only if it's available
-        from weasyprint import HTML, CSS
+        from weasyprint import HTML
+        from .pdf_worker import get_stylesheets
         
         # Render the HTML template
         template = get_template('tickets/pdf/ticket_template.html')
@@ -57,7 +59,7 @@ def generate_ticket_pdf(ticket):
         try:
             HTML(string=html_string).write_pdf(
                 pdf_file,
-                stylesheets=[CSS(string='@page { size: A4; margin: 1cm }')]
+                stylesheets=get_stylesheets()
             )
             
             pdf_file.seek(0)
@@ -92,8 +94,7 @@ def validate_ticket_purchase(ticket_type, quantity):
         return True, "Tickets available"
     
     # Check if enough tickets are available
-    sold_tickets = ticket_type.tickets.count()
-    remaining = ticket_type.quantity_available - sold_tickets
+    remaining = get_remaining(ticket_type)
     
     if quantity > remaining:
         return False, f"Only {remaining} tickets available"
@@ -1,10 +1,11 @@
 # tickets/views.py
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.utils import timezone
 from .models import Ticket, TicketType
-from .serializers import TicketSerializer, TicketTypeSerializer
+from .checkin import check_in_ticket_code, check_in_tickets
+from events.models import Event
+from .serializers import TicketSerializer, TicketTypeSerializer, TicketScanSerializer
 
 class TicketTypeViewSet(viewsets.ModelViewSet):
     """
@@ -31,18 +32,60 @@ class TicketViewSet(viewsets.ModelViewSet):
         return Ticket.objects.filter(user=user)
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        try:
+            serializer.save(user=self.request.user)
+        except ValueError as e:
+            # Sold out, or no seat left for a seated ticket type
+            raise serializers.ValidationError({'ticket_type': [str(e)]})
     
     @action(detail=True, methods=['post'])
     def check_in(self, request, pk=None):
         ticket = self.get_object()
-        if ticket.checked_in:
-            return Response({'message': 'Ticket already checked in'}, status=status.HTTP_400_BAD_REQUEST)
         
-        ticket.checked_in = True
-        ticket.checked_in_time = timezone.now()
-        ticket.status = 'used'
-        ticket.save()
+        # Same conditional claim as the gate scanners: only confirmed tickets
+        # that are not checked in yet, so concurrent check-ins cannot both succeed
+        result = check_in_ticket_code(ticket.ticket_code)
+        if result['result'] == 'already_checked_in':
+            return Response({'message': 'Ticket already checked in'}, status=status.HTTP_400_BAD_REQUEST)
+        if result['result'] != 'checked_in':
+            return Response(
+                {'message': f"Cannot check in ticket with status: {ticket.get_status_display()}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
+        ticket.refresh_from_db()
         serializer = self.get_serializer(ticket)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def scan(self, request):
+        """
+        Check in scanned codes for gate devices
+        
+        Accepts {"code": ...} for a live scan, or {"scans": [{"code": ...,
+        "scanned_at": ...}, ...]} to sync scans made while offline. Staff may
+        scan any ticket; organizers must pass their event.
+        """
+        serializer = TicketScanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        event_id = data.get('event')
+        if not request.user.is_staff:
+            if event_id is None or not Event.objects.filter(pk=event_id, organizer=request.user).exists():
+                return Response(
+                    {'error': "You don't have permission to check in tickets for this event"},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        
+        if 'code' in data:
+            return Response(check_in_ticket_code(data['code'], event_id=event_id))
+        
+        results = check_in_tickets(
+            [(scan['code'], scan.get('scanned_at')) for scan in data['scans']],
+            event_id=event_id
+        )
+        return Response({
+            'checked_in': sum(result['result'] == 'checked_in' for result in results),
+            'results': results,
+        })
\ No newline at end of file
@@ -0,0 +1,398 @@
+# tickets/waitlist.py
+#
+# Waitlists for sold-out ticket types. Waiters queue first come, first
+# served on the (ticket_type, status, created_at, id) index. The
+# process_waitlist worker promotes the head of each queue whenever stock
+# has come back: one batch per ticket type claims the stock for every
+# waiter it can serve with a single reserve_tickets() call and turns them
+# into time-limited offers, which are then emailed in batches. Offers that
+# run out give their stock back and the next waiters move up. Only ticket
+# types with free stock and someone waiting are ever looked at, so a long
+# queue costs nothing until it can be served.
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+import logging
+
+from .inventory import InsufficientInventory, reserve_tickets, return_reserved
+from .models import TicketType, WaitlistEntry
+from .purchase import create_order_tickets
+from events.summary import adjust_event_summaries
+from payments.models import Payment
+
+logger = logging.getLogger(__name__)
+
+# Waitlist entries that still hold a place in the queue
+LIVE_STATUSES = ('waiting', 'offered')
+
+
+def get_offer_duration(minutes=None):
+    """Return how long a waitlist offer stays open as a timedelta"""
+    if minutes is None:
+        minutes = getattr(settings, 'WAITLIST_OFFER_MINUTES', 60)
+    return timedelta(minutes=minutes)
+
+
+def get_available(ticket_type):
+    """
+    Tickets of a type that can still be sold, under both its own stock and
+    its event's max_attendees
+
+    Args:
+        ticket_type: TicketType with its event loaded
+
+    Returns:
+        int or None: Tickets left, or None when neither is limited
+    """
+    limits = [
+        limit for limit in (ticket_type.quantity_remaining, ticket_type.event.places_remaining)
+        if limit is not None
+    ]
+    return min(limits) if limits else None
+
+
+def join_waitlist(user, ticket_type, quantity=1):
+    """
+    Put a user on the waitlist of a sold-out ticket type
+
+    Args:
+        user: The user waiting for tickets
+        ticket_type: The sold-out TicketType
+        quantity: Number of tickets wanted
+
+    Returns:
+        The WaitlistEntry object
+
+    Raises:
+        ValueError: If the ticket type is not sold out, the quantity is
+                    invalid or the user is already waiting for it
+    """
+    available = get_available(ticket_type)
+    if available is None:
+        raise ValueError(f"{ticket_type.name} tickets are not limited")
+
+    limits = [ticket_type.quantity_available, ticket_type.event.max_attendees]
+    if not 0 < quantity <= min(limit for limit in limits if limit):
+        raise ValueError(f"Invalid quantity for {ticket_type.name}")
+
+    if available:
+        raise ValueError(f"{ticket_type.name} tickets are still available")
+
+    try:
+        with transaction.atomic():
+            return WaitlistEntry.objects.create(user=user, ticket_type=ticket_type, quantity=quantity)
+    except IntegrityError:
+        raise ValueError(f"You are already on the waitlist for {ticket_type.name}")
+
+
+def leave_waitlist(entry):
+    """
+    Take an entry off the waitlist, giving back the stock of an open offer
+
+    Returns:
+        bool: True if the entry was still waiting or offered
+    """
+    with transaction.atomic():
+        if WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').update(status='left'):
+            return True
+
+        if WaitlistEntry.objects.filter(pk=entry.pk, status='offered').update(status='left'):
+            return_reserved(entry.ticket_type, entry.quantity)
+            adjust_event_summaries({entry.ticket_type.event_id: {'offered': -entry.quantity}})
+            return True
+
+    return False
+
+
+def get_queue_position(entry):
+    """Position of a waiting entry in its queue, starting at 1"""
+    ahead = WaitlistEntry.objects.filter(
+        Q(created_at__lt=entry.created_at) | Q(created_at=entry.created_at, pk__lt=entry.pk),
+        ticket_type_id=entry.ticket_type_id,
+        status='waiting'
+    ).count()
+    return ahead + 1
+
+
+def _claim(entries, from_status, **changes):
+    """
+    Move entries out of a status, counting the units of those really moved
+
+    Entries are updated per quantity so the row counts of the UPDATEs give
+    the exact stock involved, even if some entries changed in the meantime.
+
+    Args:
+        entries: Ids of the entries to move
+        from_status: The status they must still have
+        changes: Fields to set on them
+
+    Returns:
+        dict: ticket type id -> units moved
+    """
+    groups = list(
+        WaitlistEntry.objects.filter(pk__in=entries).order_by()
+        .values_list('ticket_type_id', 'quantity').distinct()
+    )
+
+    units = defaultdict(int)
+    for ticket_type_id, quantity in groups:
+        moved = WaitlistEntry.objects.filter(
+            pk__in=entries, ticket_type_id=ticket_type_id, quantity=quantity, status=from_status
+        ).update(**changes)
+        units[ticket_type_id] += moved * quantity
+
+    return units
+
+
+def _promote_batch(ticket_type_id, batch_size, now, expires_at):
+    """
+    Offer the free stock of one ticket type to the head of its queue
+
+    Returns:
+        tuple: (offers made, units offered)
+    """
+    with transaction.atomic():
+        ticket_type = TicketType.objects.select_related('event').get(pk=ticket_type_id)
+        # None when the type and its event stopped being limited; all can be served
+        free = get_available(ticket_type)
+        if free == 0:
+            return 0, 0
+
+        # Every waiter wants at least one ticket, so at most free of them can be served
+        queue = list(
+            WaitlistEntry.objects.select_for_update()
+            .filter(ticket_type_id=ticket_type_id, status='waiting')
+            .order_by('created_at', 'pk')
+            .values_list('pk', 'quantity')[:batch_size if free is None else min(batch_size, free)]
+        )
+
+        # Strictly first come, first served: stop at the first waiter who does not fit
+        chosen = []
+        wanted = 0
+        for pk, quantity in queue:
+            if free is not None and wanted + quantity > free:
+                break
+            chosen.append(pk)
+            wanted += quantity
+        if not chosen:
+            return 0, 0
+
+        units = _claim(chosen, 'waiting', status='offered', offered_at=now, offer_expires_at=expires_at)
+        units = units[ticket_type_id]
+        if units:
+            # One claim for the whole batch; rolls the offers back if stock went meanwhile
+            reserve_tickets(ticket_type, units)
+            adjust_event_summaries({ticket_type.event_id: {'offered': units}})
+
+        offered = WaitlistEntry.objects.filter(pk__in=chosen, status='offered', offered_at=now).count()
+
+    return offered, units
+
+
+def promote_waitlist(batch_size=500, now=None, ticket_types=None):
+    """
+    Turn the head of every queue that can be served into time-limited offers
+
+    Args:
+        batch_size: Maximum number of waiters promoted per ticket type and batch
+        now: Reference time (defaults to timezone.now())
+        ticket_types: Optional TicketType queryset to limit the promotion
+
+    Returns:
+        tuple: (offers made, tickets offered)
+    """
+    now = now or timezone.now()
+    expires_at = now + get_offer_duration()
+    if ticket_types is None:
+        ticket_types = TicketType.objects.all()
+
+    candidates = list(
+        ticket_types.filter(
+            Exists(WaitlistEntry.objects.filter(ticket_type=OuterRef('pk'), status='waiting')),
+            # Stock left and places left at the event, as in get_available()
+            Q(quantity_available=0) | Q(quantity_sold__lt=F('quantity_available')),
+            Q(event__max_attendees=0) | Q(event__attendee_count__lt=F('event__max_attendees')),
+            event__status='published',
+            event__end_date__gt=now,
+        ).order_by('pk').values_list('pk', flat=True)
+    )
+
+    offers = units = 0
+    for ticket_type_id in candidates:
+        while True:
+            try:
+                offered, offered_units = _promote_batch(ticket_type_id, batch_size, now, expires_at)
+            except InsufficientInventory:
+                # A buyer took the stock first; try again on the next run
+                break
+            offers += offered
+            units += offered_units
+            if not offered:
+                break
+
+    return offers, units
+
+
+def expire_offers(batch_size=500, now=None):
+    """
+    Close offers that were not taken up in time and give their stock back
+
+    Walks the (status, offer_expires_at) index one batch at a time.
+
+    Args:
+        batch_size: Maximum number of offers handled per batch
+        now: Reference time (defaults to timezone.now())
+
+    Returns:
+        int: Number of offers expired
+    """
+    now = now or timezone.now()
+    expired = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                WaitlistEntry.objects.select_for_update()
+                .filter(status='offered', offer_expires_at__lte=now)
+                .order_by('offer_expires_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+
+            units = _claim(batch, 'offered', status='expired')
+            ticket_types = TicketType.objects.in_bulk(list(units))
+            # Events before ticket types, in the same order as reserve_tickets()
+            returned = defaultdict(int)
+            for ticket_type in sorted(ticket_types.values(), key=lambda ticket_type: ticket_type.event_id):
+                return_reserved(ticket_type, units[ticket_type.pk])
+                returned[ticket_type.event_id] -= units[ticket_type.pk]
+            adjust_event_summaries({event_id: {'offered': change} for event_id, change in returned.items()})
+
+            expired += len(batch)
+
+    return expired
+
+
+def purchase_offer(entry, payment_method='pending', now=None):
+    """
+    Take up a waitlist offer: create the order for the stock it holds
+
+    Args:
+        entry: The offered WaitlistEntry
+        payment_method: The payment method of the order
+        now: Reference time (defaults to timezone.now())
+
+    Returns:
+        tuple: (payment_obj, created_tickets)
+
+    Raises:
+        ValueError: If the offer is no longer open
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        if not WaitlistEntry.objects.filter(
+            pk=entry.pk, status='offered', offer_expires_at__gt=now
+        ).update(status='purchased'):
+            raise ValueError("This waitlist offer is no longer available")
+
+        ticket_type = TicketType.objects.select_related('event').get(pk=entry.ticket_type_id)
+        payment = Payment.objects.create(
+            user=entry.user,
+            amount=ticket_type.price * entry.quantity,
+            payment_method=payment_method,
+            payment_status='pending'
+        )
+        created_tickets = create_order_tickets(
+            payment, {ticket_type: entry.quantity}, user=entry.user, stock_reserved=True
+        )
+
+    entry.status = 'purchased'
+    return payment, created_tickets
+
+
+def _render(entry):
+    event = entry.ticket_type.event
+    site_url = settings.SITE_URL.rstrip('/')
+    context = {
+        'entry': entry,
+        'user': entry.user,
+        'ticket_type': entry.ticket_type,
+        'event': event,
+        'site_url': site_url,
+        'offer_url': f"{site_url}{reverse('event_detail', kwargs={'event_id': event.pk})}#tickets",
+    }
+    return (
+        f"Tickets for {event.title} are available",
+        render_to_string('tickets/emails/waitlist_offer.txt', context),
+        render_to_string('tickets/emails/waitlist_offer.html', context),
+    )
+
+
+def send_offer_notifications(batch_size=100):
+    """
+    Email every offer that has not been announced yet
+
+    Each batch of offers shares one SMTP connection and is marked notified
+    in a single UPDATE. A failed email is logged and not retried; the offer
+    still shows on the event page.
+
+    Args:
+        batch_size: Offers emailed per batch and SMTP connection
+
+    Returns:
+        int: Emails sent
+    """
+    total_sent = 0
+
+    while True:
+        batch = list(
+            WaitlistEntry.objects.filter(status='offered', notified_at__isnull=True)
+            .select_related('user', 'ticket_type__event')
+            .order_by('offered_at', 'pk')[:batch_size]
+        )
+        if not batch:
+            break
+
+        with get_connection() as connection:
+            for entry in batch:
+                if not entry.user.email:
+                    continue
+                subject, text, html = _render(entry)
+                message = EmailMultiAlternatives(
+                    subject=subject,
+                    body=text,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[entry.user.email],
+                    connection=connection,
+                )
+                message.attach_alternative(html, 'text/html')
+                try:
+                    connection.send_messages([message])
+                    total_sent += 1
+                except Exception as e:
+                    logger.warning(f"Waitlist offer {entry.pk} to {entry.user.email} failed: {e}")
+
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in batch]).update(notified_at=timezone.now())
+
+    return total_sent
+
+
+def process_waitlist(batch_size=500):
+    """
+    Expire stale offers, promote waiters into the freed stock and email them
+
+    Returns:
+        tuple: (offers expired, offers made, emails sent)
+    """
+    expired = expire_offers(batch_size=batch_size)
+    offers, _ = promote_waitlist(batch_size=batch_size)
+    sent = send_offer_notifications()
+    return expired, offers, sent